@@ -2,6 +2,7 @@ from typing import List, Optional
 import time
 import serial
 import asyncio
+import argparse
 
 # ser = serial.Serial('/dev/ttyS0', 115200, timeout=0.01)
 # # BC    01  52  FF      65      03E8    FF DF
@@ -74,11 +75,16 @@ def set_configs(ser:serial.Serial, cmd:str, last_cmd:Optional[str]=None):
     return cmd_hex
 
 def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--port', type=str, default='/dev/ttyS0', help='serial device, e.g. the pty of vib_music.uartemu')
+    p.add_argument('--baudrate', type=int, default=115200)
+    opt = p.parse_args()
+
     print("Format: <CH1> <CH2> <CH3> <CH4> <Voltage> <FREQ> <DUTY>")
     print("Range: <CH1-4> 0|1|Z; <Voltage> 0-255; <FREQ> 1-65536; <DUTY> 0-100;")
     print("Press ENTER to REPEAT last command, Use Ctrl+C to exit")
 
-    ser = serial.Serial('/dev/ttyS0', 115200, timeout=0.01)
+    ser = serial.Serial(opt.port, opt.baudrate, timeout=0.01)
     time.sleep(0.1)
     last_cmd = ''
 
@@ -3,6 +3,7 @@
 # taofei@feathervibe.com
 # mapping approaches pool to map acoustic feature to vibration
 
+import wave
 import argparse
 import numpy as np
 from sigprocs.signal_separation import hrps
@@ -10,6 +11,7 @@ from sigprocs.wave_generator import periodic_rectangle_generator
 from sigprocs.signal_analysis import remove_harmonics, extract_peaks
 from sigprocs.ml_basic import extract_clustern
 from sigprocs.global_paras import PEAK_LIMIT
+from sigprocs.streaming import StreamingBandSelector
 import librosa
 import librosa.display
 import sys, copy, time
@@ -20,7 +22,7 @@ import sys
 sys.path.append('..')
 from vib_music import LiveVibrationStream, get_audio_process
 from vib_music import VibrationProcess, LiveStreamHandler
-from vib_music import UARTDriver
+from vib_music import PCF8591Driver
 from vib_editor import launch_vibration
 
 bin_levels = 255
@@ -51,7 +53,8 @@ DEFAULTS = {
 
 # dsp
 'len_window': 128,   # acoustic feature window length
-'len_hop': 128   # acoustic feature hop length
+'len_hop': 128,   # acoustic feature hop length
+'deadline_ratio': 0.5,   # share of the hop duration a streaming hop may take, harmonic removal is skipped after a miss
 }
 
 
@@ -192,38 +195,28 @@ def band_select_fast(stft:np.ndarray, duty=0.5, vib_extremefreq = [50,500], vib_
 class LingerVibrationStream(LiveVibrationStream):
     def __init__(self, configs:Dict) -> None:
         super().__init__()
-        self.len_window : int = configs['len_window']
-        self.hoplen : int = configs['len_hop']
-        self.remain : int = self.len_window - self.hoplen
         self.configs: Dict = configs
-
-        self.buffer : Optional[np.ndarray] = None
+        self.selector : Optional[StreamingBandSelector] = None
     
     def init_stream(self) -> None:
-        # init a buffer for audios? 
-        self.buffer = np.zeros((self.len_window,))
+        # NOTE: windows, buffers and waveforms are built once in the vibration process
+        if self.selector is None:
+            self.selector = StreamingBandSelector(**self.configs)
+        self.selector.reset()
 
     def readframe(self, what):
-        buffer = np.reshape(what, (-1, self.hoplen))
-        assert buffer.shape[1] == self.hoplen
-
-        self.buffer[:self.remain] = self.buffer[self.hoplen:]
-        self.buffer[self.remain:] = buffer[0]
-        stft = librosa.stft(self.buffer, n_fft=self.len_window, hop_length=self.hoplen, win_length=self.hoplen, window='hann',
-                     center=False)
-
-        vibration = band_select_fast(stft, DEFAULTS)
-
-        # return a dict like the follows based on the calculated vibration
-        # ret_dict = {
-        #     'CH': '1 0 Z Z',
-        #     'freq': 1000,
-        #     'duty': 50
-        # } 
-        # return ret_dict
+        # what: one hop of interleaved PCM from the audio tap
+        return self.selector.process(what)
     
     def clear_buffer(self) -> None:
-        self.init_stream()
+        if self.selector is not None:
+            self.selector.reset()
+
+    def mapping_stats(self) -> Dict:
+        # NOTE: band selection time per hop, reported by the status ack
+        if self.selector is None:
+            return {'num_hop': 0}
+        return self.selector.deadline_stats()
 
 
 def get_parser():
@@ -238,12 +231,23 @@ def main():
     opt = p.parse_args()
     print(opt)
 
-    music_proc = get_audio_process(opt.audio, opt.len_hop)
-
-    data = LingerVibrationStream(opt.len_hop, opt.len_window)
-    driver = UARTDriver()
-    handler = LiveStreamHandler(data, driver)
+    configs = dict(DEFAULTS)
+    with wave.open(opt.audio, 'rb') as f:
+        configs['sr'], configs['channels'] = f.getframerate(), f.getnchannels()
+        sampwidth = f.getsampwidth()
+    music_proc = get_audio_process(opt.audio, configs['len_hop'])
+    # NOTE: live mapping reads PCM from the audio tap, a slot holds one hop
+    audio_tap = music_proc.enable_audio_tap(configs['len_hop']*sampwidth*configs['channels'])
+
+    data = LingerVibrationStream(configs)
+    # NOTE: frames are waveform samples, the DAC plays vib_frame_len of them per hop
+    driver = PCF8591Driver()
+    driver.enable_pacing(configs['vib_frame_len']*configs['sr']/configs['len_hop'])
+    handler = LiveStreamHandler(data, driver, audio_tap)
     vib_proc = VibrationProcess(handler)
+    # NOTE: a hop is a few ms, freeze the GC so it never scans the imported modules between hops
+    music_proc.enable_realtime()
+    vib_proc.enable_realtime()
 
     launch_vibration(None, [music_proc, vib_proc])
 
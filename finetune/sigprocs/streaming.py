@@ -0,0 +1,290 @@
+# streaming band selection, a causal per-hop version of mappings.band_select_fast
+
+import time
+import numpy as np
+import librosa
+from math import log
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .signal_separation import convert_l_sec_to_frames, convert_l_hertz_to_bins, make_integer_odd
+from .wave_generator import periodic_rectangle_generator
+from .global_paras import PEAK_LIMIT
+
+
+class StreamingBandSelector(object):
+    """
+    Band selection for live audio, one hop of PCM in, one vibration frame out.
+    All state is kept between hops (sample ring, past spectrogram columns, waveform phase)
+    and all buffers, windows and waveforms are built once, so a hop costs one rfft and
+    a few vector operations.
+    Every hop is checked against its deadline (a share of the hop duration), after a miss
+    the harmonic removal is skipped for `recover_hops` hops.
+    """
+    def __init__(self, sr, len_window=128, len_hop=128, channels=2, duty=0.5, vib_extremefreq=[50, 500],
+                 vib_bias=80, vib_maxbin=255, peak_limit=-1, vib_frame_len=24, peak_globalth=20, peak_relativeth=4,
+                 stft_peak_movlen=19, hprs_harmonic_filt_len=0.1, hprs_percusive_filt_len=400, hprs_beta=4.0,
+                 deadline_ratio=0.5, recover_hops=8, peak_decay=0.999, **kwargs):
+        assert len_hop <= len_window, "hop must not be longer than the window"
+        self.sr = sr
+        self.len_window = len_window
+        self.len_hop = len_hop
+        self.channels = channels
+        self.vib_bias = vib_bias
+        self.peak_limit = peak_limit
+        self.vib_frame_len = vib_frame_len
+        self.peak_globalth = peak_globalth
+        self.peak_relativeth = peak_relativeth
+        self.hprs_beta = hprs_beta
+        self.peak_decay = peak_decay
+
+        # stft, same window as librosa.stft(n_fft=len_window, win_length=len_hop, window='hann')
+        window = librosa.filters.get_window('hann', len_hop, fftbins=True)
+        self.window = librosa.util.pad_center(window, size=len_window).astype(np.float32)
+        stft_freq = np.fft.rfftfreq(len_window, 1. / sr)
+        self.num_bin = int(np.sum(stft_freq <= 8000))    # select bins lower than 8k hz
+        self.stft_freq = stft_freq[:self.num_bin]
+        self.ring = np.zeros((2 * len_window,), dtype=np.float32)    # every sample written twice, a window is one slice
+        self.frame = np.empty((len_window,), dtype=np.float32)
+        self.mono = np.empty((len_hop,), dtype=np.float32)
+
+        # causal hrps, the harmonic median runs over the past columns only
+        len_h = convert_l_sec_to_frames(hprs_harmonic_filt_len, Fs=sr, N=len_window, H=len_hop)
+        len_p = convert_l_hertz_to_bins(hprs_percusive_filt_len, Fs=sr, N=len_window, H=len_hop)
+        self.len_h = make_integer_odd(len_h)
+        self.len_p = make_integer_odd(len_p)
+        self.history = np.zeros((self.len_h, self.num_bin), dtype=np.float32)
+        self.padded = np.zeros((self.num_bin + self.len_p - 1,), dtype=np.float32)
+        self.windows = sliding_window_view(self.padded, self.len_p)    # view of the padded column, built once
+
+        # peak extraction, moving average along frequency with 'nearest' edges
+        self.movlen = int(stft_peak_movlen)
+        self.kernel = np.full((self.movlen,), 1. / self.movlen, dtype=np.float32)
+        self.db_padded = np.empty((self.num_bin + self.movlen - 1,), dtype=np.float32)
+
+        # waveforms of every bin, generated once and read with a running phase
+        a = float((min(self.stft_freq) - max(self.stft_freq))) / (min(vib_extremefreq) - max(vib_extremefreq))
+        b = max(self.stft_freq) - a * max(vib_extremefreq)
+        frame_time = len_hop / float(sr)
+        periods = []
+        waves = []
+        for f in self.stft_freq:
+            vib_freq = round((f - b) / a)
+            period = max(int(round(vib_frame_len / frame_time / vib_freq)), 1) if vib_freq > 0 else 1
+            frame_num = period // vib_frame_len + 2
+            wave = periodic_rectangle_generator([1, 0.], duty=duty, freq=vib_freq, frame_num=frame_num,
+                                                frame_time=frame_time, frame_len=vib_frame_len)
+            periods.append(period)
+            waves.append(wave.ravel()[:period])
+        self.periods = np.array(periods)
+        self.waves = np.zeros((self.num_bin, self.periods.max()), dtype=np.float32)
+        for i, wave in enumerate(waves):
+            self.waves[i, :wave.shape[0]] = wave
+        self.steps = np.arange(vib_frame_len)
+        self.out = np.zeros((vib_frame_len,), dtype=np.uint8)    # one frame, filled again every hop
+        self.low = np.empty((vib_frame_len,), dtype=bool)
+
+        # digitizing, mu-law bins
+        bin_num = vib_maxbin - vib_bias
+        bins = np.linspace(0., 1., bin_num, endpoint=True)
+        self.mu_bins = np.array([x * (log(1 + bin_num * x) / log(1 + bin_num)) for x in bins])
+
+        # deadline
+        self.budget = deadline_ratio * len_hop / float(sr)
+        self.recover_hops = recover_hops
+        self.hop_time = np.zeros((4096,), dtype=np.float64)    # seconds spent on the latest hops
+        self.reset()
+
+    def reset(self):
+        """
+        drop the audio state, e.g. after a seek, waveforms and buffers are kept
+        """
+        self.ring[:] = 0
+        self.history[:] = 0
+        self.pos = 0    # next sample of the ring
+        self.column = 0    # next row of the column history
+        self.vib_pos = 0    # waveform phase in vibration samples
+        self.peak = 0.    # decaying maximum of the vibration level
+        self.floor = np.inf    # rising minimum of the selected peak power
+        self.num_hop = 0
+        self.num_missed = 0
+        self.num_degraded = 0
+        self.degraded = 0    # hops left without harmonic removal
+
+    def _push(self, pcm):
+        """
+        downmix one hop of interleaved PCM into the sample ring
+        """
+        x = np.reshape(pcm, (-1, self.channels))
+        n = min(x.shape[0], self.len_hop)
+        mono = self.mono[:n]
+        np.sum(x[:n], axis=1, dtype=np.float32, out=mono)
+        if np.issubdtype(pcm.dtype, np.integer):
+            mono *= 1. / (np.iinfo(pcm.dtype).max * self.channels)
+        else:
+            mono *= 1. / self.channels
+        N, i = self.len_window, self.pos
+        first = min(n, N - i)
+        self.ring[i:i + first] = mono[:first]
+        self.ring[i + N:i + N + first] = mono[:first]
+        if n > first:
+            self.ring[:n - first] = mono[first:]
+            self.ring[N:N + n - first] = mono[first:]
+        self.pos = (i + n) % N
+
+    def _power(self):
+        """
+        power spectrum of the latest window
+        """
+        np.multiply(self.ring[self.pos:self.pos + self.len_window], self.window, out=self.frame)
+        spec = np.fft.rfft(self.frame)[:self.num_bin]
+        return spec.real ** 2 + spec.imag ** 2
+
+    def _hrps(self, power):
+        """
+        harmonic, percussive and residual power of the latest column
+        """
+        self.history[self.column] = power
+        self.column = (self.column + 1) % self.len_h
+        # NOTE: odd lengths, the median is the middle element of a partition
+        y_h = np.partition(self.history, self.len_h // 2, axis=0)[self.len_h // 2]
+        if self.len_p > 1:
+            half = self.len_p // 2
+            self.padded[half:half + self.num_bin] = power
+            y_p = np.partition(self.windows, half, axis=1)[:, half]
+        else:
+            y_p = power
+        m_h = y_h >= self.hprs_beta * y_p
+        m_p = y_p > self.hprs_beta * y_h
+        m_r = ~(m_h | m_p)
+        return power * m_h, power * m_p, power * m_r
+
+    def _peaks(self, power):
+        """
+        peak mask of one column, see sigprocs.signal_analysis.extract_peaks
+        """
+        db = 10. * np.log10(np.maximum(power, 1e-10))
+        np.maximum(db, db.max() - 80., out=db)
+        mask = np.zeros(db.shape, dtype=bool)
+        db_max = db.max()
+        if db_max == db.min():
+            return mask    # all the same, no peak
+        half = self.movlen // 2
+        padded = self.db_padded
+        padded[:half] = db[0]
+        padded[half:half + self.num_bin] = db
+        padded[half + self.num_bin:] = db[-1]
+        ma = np.convolve(padded, self.kernel, mode='valid')
+        mask[1:-1] = (db[1:-1] > db[:-2]) & (db[1:-1] > db[2:])    # local maxima
+        mask &= db - ma >= self.peak_relativeth
+        mask &= db >= db_max - self.peak_globalth
+        return mask
+
+    def _bandwidth(self, ind, power):
+        """
+        width in hz where the power stays above half of the peak
+        """
+        th = 0.5 * power[ind]
+        lo, hi = ind, ind
+        while lo > 0 and power[lo] > th:
+            lo -= 1
+        while hi < power.shape[0] - 1 and power[hi] > th:
+            hi += 1
+        return self.stft_freq[hi] - self.stft_freq[lo]
+
+    def _count_fundamentals(self, peaks, power):
+        """
+        number of peaks left when harmonics of stronger peaks are removed, see remove_harmonics
+        """
+        mask = peaks.copy()
+        spacing = self.stft_freq[1] - self.stft_freq[0]
+        last = self.stft_freq[-1]
+        search = np.flatnonzero(peaks[:self.num_bin // 2 + 1])
+        for ind in search[np.argsort(power[search])[::-1]]:
+            freq = self.stft_freq[ind]
+            if freq <= 0:
+                continue
+            bw = self._bandwidth(ind, power)
+            k = 2
+            while freq * k < last:
+                start = int(round((freq * k - bw * k / 2) / spacing))
+                end = int(round((freq * k + bw * k / 2) / spacing))
+                mask[max(start, 0):end + 1] = False
+                k += 1
+        return int(np.sum(mask))
+
+    def _peak_limit(self, power, power_h, power_p, power_r, peaks):
+        if self.peak_limit > 0:
+            return self.peak_limit
+        total = power.sum()
+        h_ratio, p_ratio, r_ratio = power_h.sum() / total, power_p.sum() / total, power_r.sum() / total
+        if p_ratio >= 2 * r_ratio and p_ratio > 2 * h_ratio:
+            return 3
+        elif r_ratio > 2 * h_ratio and r_ratio > 2 * p_ratio:
+            return 2
+        elif h_ratio > 2 * p_ratio and h_ratio > 2 * r_ratio and self.degraded == 0:
+            return int(min(PEAK_LIMIT, self._count_fundamentals(peaks, power) + 1))
+        return PEAK_LIMIT
+
+    def process(self, pcm):
+        """
+        vibration frame (vib_frame_len,) of one hop of interleaved PCM,
+        the returned buffer is filled again by the next hop
+        """
+        start = time.perf_counter()
+        self._push(pcm)
+        power = self._power()
+        power_h, power_p, power_r = self._hrps(power)
+
+        out = self.out
+        out[:] = 0
+        peaks = self._peaks(power_h)
+        if power.sum() > 0 and peaks.any():
+            spec_masked = power * peaks
+            limit = self._peak_limit(power, power_h, power_p, power_r, peaks)
+            selected = np.flatnonzero(spec_masked)
+            selected = selected[np.argsort(spec_masked[selected])[::-1][:limit]]
+
+            # sum of the selected bins' waveforms at the running phase
+            index = (self.vib_pos + self.steps[None, :]) % self.periods[selected, None]
+            waves = np.take_along_axis(self.waves[selected], index, axis=1)
+            vibration = spec_masked[selected] @ waves / self.num_bin
+
+            # causal normalization, a decaying peak and a rising floor instead of the track extremes
+            self.peak = max(float(vibration.max()), self.peak * self.peak_decay)
+            self.floor = min(float(spec_masked[selected].min()), self.floor / self.peak_decay)
+            if self.peak > 0:
+                out[:] = np.digitize(vibration / self.peak, self.mu_bins)
+                out += self.vib_bias
+                threshold = np.digitize((PEAK_LIMIT // 2) * self.floor / self.peak, self.mu_bins)
+                np.less_equal(out, self.vib_bias + threshold, out=self.low)
+                out[self.low] = 0    # set zeros below threshold
+        self.vib_pos += self.vib_frame_len
+
+        elapsed = time.perf_counter() - start
+        self.hop_time[self.num_hop % self.hop_time.shape[0]] = elapsed
+        self.num_hop += 1
+        if self.degraded > 0:
+            self.degraded -= 1
+            self.num_degraded += 1
+        if elapsed > self.budget:
+            # NOTE: shed the harmonic removal until the hops are back within the budget
+            self.num_missed += 1
+            self.degraded = self.recover_hops
+        return out
+
+    def deadline_stats(self):
+        """
+        hop processing time in ms against the budget
+        """
+        hop_time = self.hop_time[:min(self.num_hop, self.hop_time.shape[0])] * 1000.
+        if hop_time.shape[0] == 0:
+            return {'num_hop': 0}
+        return {
+            'num_hop': self.num_hop,
+            'budget': self.budget * 1000.,
+            'mean': float(hop_time.mean()),
+            'p99': float(np.percentile(hop_time, 99)),
+            'max': float(hop_time.max()),
+            'missed': self.num_missed,
+            'degraded': self.num_degraded,
+        }
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music.capture import CaptureDriver, CaptureStream
+from vib_music.framecodec import rle_encode
+
+def capture_frames(path:str, frames, frame_bytes:int=16) -> CaptureDriver:
+    driver = CaptureDriver(path, frame_bytes=frame_bytes, capacity=64)
+    driver.on_init()
+    for f in frames:
+        driver.on_next_frame({'frame': f})
+    driver.on_close()
+    return driver
+
+def test_reused_buffer_is_copied():
+    # NOTE: streams hand out views of one buffer, refilled before the writer thread runs
+    buf = bytearray(8)
+    view = memoryview(buf)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'cap.bin')
+        driver = CaptureDriver(path, frame_bytes=16, capacity=64)
+        driver.on_init()
+        for k in range(10):
+            buf[:] = bytes([k]) * 8
+            driver.on_next_frame({'frame': view})
+        driver.on_close()
+
+        stream = CaptureStream(path)
+        stream.init_stream()
+        assert stream.getnframes() == 10
+        for k in range(10):
+            assert list(stream.readframe()) == [k] * 8
+        stream.close()
+
+def test_round_trip_frame_types():
+    frames = [
+        np.arange(8, dtype=np.uint8),
+        bytes(range(10, 15)),
+        rle_encode(np.array([7, 7, 7, 9], dtype=np.uint8)),
+        np.arange(20, dtype=np.uint8), # NOTE: longer than a record
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'cap.bin')
+        driver = capture_frames(path, frames)
+        assert driver.num_write == 4 and driver.num_truncated == 1
+
+        stream = CaptureStream(path)
+        stream.init_stream()
+        assert list(stream.readframe()) == list(range(8))
+        assert list(stream.readframe()) == list(range(10, 15))
+        assert list(stream.readframe()) == [7, 7, 7, 9]
+        assert list(stream.readframe()) == list(range(16))
+        stamps = stream.timestamps()
+        assert stamps.shape[0] == 4 and np.all(np.diff(stamps) >= 0)
+
+        stream.setpos(1)
+        assert list(stream.readframe(2)) == list(range(10, 15)) + [7, 7, 7, 9]
+        stream.close()
+
+def test_sessions_append():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'cap.bin')
+        capture_frames(path, [bytes([1]*4)] * 3)
+        capture_frames(path, [bytes([2]*4)] * 2)
+
+        assert CaptureStream(path).getnframes() == 5
+        second = CaptureStream(path, session=1)
+        assert second.getnframes() == 2
+        assert list(second.readframe()) == [2] * 4
+        second.close()
+
+if __name__ == '__main__':
+    test_reused_buffer_is_copied()
+    test_round_trip_frame_types()
+    test_sessions_append()
+    print('capture tests passed')
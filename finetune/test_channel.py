@@ -0,0 +1,133 @@
+import sys
+import time
+import threading
+import numpy as np
+sys.path.append('..')
+
+from vib_music import StreamChannel, StreamEvent, StreamEventType
+from vib_music import AudioStreamEvent, AudioStreamEventType
+from vib_music.core.StreamChannel import EVENT_HEADER, encode_event, decode_event
+
+def test_header_only_events():
+    for event in [
+        StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': 7}),
+        StreamEvent(StreamEventType.STREAM_SEEK, {'pos': -3, 'seq': 2**40}),
+        StreamEvent(StreamEventType.STREAM_CLOSE, {}),
+    ]:
+        buf = encode_event(event)
+        assert len(buf) == EVENT_HEADER.size
+        assert decode_event(buf) == event
+
+def test_payload_events():
+    event = StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'pos': 5, 'status': 'vib', 'latency': [1.5, 2.]})
+    assert decode_event(encode_event(event)) == event
+    # NOTE: a non-int pos goes to the payload
+    event = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 1.5})
+    assert decode_event(encode_event(event)).what == {'pos': 1.5}
+
+def test_audio_event_types():
+    decoded = decode_event(encode_event(AudioStreamEvent(AudioStreamEventType.AUDIO_RESUME)))
+    assert decoded.head is AudioStreamEventType.AUDIO_RESUME
+    # NOTE: shared values decode to the first registered enum
+    decoded = decode_event(encode_event(AudioStreamEvent(AudioStreamEventType.STREAM_SEEK, {'pos': 1})))
+    assert decoded.head is StreamEventType.STREAM_SEEK
+
+def test_channel_round_trip():
+    a, b = StreamChannel.pair()
+    event = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 3, 'seq': 1})
+    a.put(event)
+    a.put([StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'vib'})])
+    assert b.get(timeout=1.) == event
+    assert b.get(timeout=1.) == [StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'vib'})]
+    a.close()
+    b.close()
+
+def test_full_channel_never_blocks():
+    a, b = StreamChannel.pair()
+    frame = StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': 0})
+    num_sent = 0
+    while a.offer(frame):
+        num_sent += 1
+        assert num_sent < 10**6, 'pipe never filled'
+    # NOTE: control events wait in order, a later seek replaces a pending one
+    a.post(StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 1, 'seq': 1}))
+    a.post(StreamEvent(StreamEventType.STREAM_STATUS_ACQ))
+    a.post(StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 2, 'seq': 2}))
+    assert [e.head for e in a.backlog] == [StreamEventType.STREAM_STATUS_ACQ, StreamEventType.STREAM_SEEK]
+    assert not a.offer(frame)
+
+    received = []
+    while not a.flush() or b.conn.poll(0.):
+        while b.conn.poll(0.):
+            received.append(b.get_nowait())
+    assert len(received) == num_sent + 2
+    assert received[-2].head == StreamEventType.STREAM_STATUS_ACQ
+    assert received[-1] == StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 2, 'seq': 2})
+    a.close()
+    b.close()
+
+def test_large_payload_never_blocks():
+    a, b = StreamChannel.pair()
+    frame = StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': 0})
+    num_sent = 0
+    while a.offer(frame):
+        num_sent += 1
+    for _ in range(16):
+        b.get(timeout=1.)
+    # NOTE: a few frames of room, the pipe takes only the head of a 1 MB append
+    data = np.arange(2**20, dtype=np.uint8)
+    append = StreamEvent(StreamEventType.STREAM_APPEND, {'data': data, 'start': 5})
+    t = time.perf_counter()
+    a.post(append)
+    assert time.perf_counter() - t < 0.5
+    assert a.partial is not None and len(a.backlog) == 0
+    # NOTE: nothing is sent in the middle of the partial message
+    assert not a.offer(frame)
+    a.post(StreamEvent(StreamEventType.STREAM_CLOSE))
+    assert len(a.backlog) == 1
+
+    # NOTE: the reader blocks on the partial message, it is completed by later flushes
+    received = []
+    def drain():
+        while len(received) < num_sent - 16 + 2:
+            received.append(b.get(timeout=5.))
+    reader = threading.Thread(target=drain)
+    reader.start()
+    while not a.flush():
+        time.sleep(0.001)
+    reader.join()
+    assert len(received) == num_sent - 16 + 2
+    assert received[-2].head == StreamEventType.STREAM_APPEND and received[-2].what['start'] == 5
+    assert np.array_equal(received[-2].what['data'], data)
+    assert received[-1].head == StreamEventType.STREAM_CLOSE
+    a.close()
+    b.close()
+
+def test_blocking_put_keeps_the_order():
+    a, b = StreamChannel.pair()
+    frame = StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': 0})
+    num_sent = 0
+    while a.offer(frame):
+        num_sent += 1
+    a.post(StreamEvent(StreamEventType.STREAM_STATUS_ACQ))
+    received = []
+    def drain():
+        while len(received) < num_sent + 2:
+            received.append(b.get(timeout=5.))
+    reader = threading.Thread(target=drain)
+    reader.start()
+    a.put(StreamEvent(StreamEventType.STREAM_CLOSE))
+    reader.join()
+    assert [e.head for e in received[-2:]] == [StreamEventType.STREAM_STATUS_ACQ, StreamEventType.STREAM_CLOSE]
+    a.close()
+    b.close()
+
+if __name__ == '__main__':
+    test_header_only_events()
+    test_payload_events()
+    test_audio_event_types()
+    test_channel_round_trip()
+    test_full_channel_never_blocks()
+    test_large_payload_never_blocks()
+    test_blocking_put_keeps_the_order()
+    print('channel tests passed')
@@ -0,0 +1,50 @@
+import sys
+import time
+import numpy as np
+sys.path.append('..')
+
+from vib_music import FanoutDriver, LogDriver
+
+class SlowDriver(LogDriver):
+    '''keeps the first sample of every frame, slower than the frames arrive'''
+    def __init__(self, delay:float=0.005) -> None:
+        super(SlowDriver, self).__init__()
+        self.delay = delay
+        self.received = []
+
+    def on_init(self, what=None) -> None:
+        return
+
+    def on_next_frame(self, what=None) -> None:
+        time.sleep(self.delay)
+        self.received.append(int(what['frame'][0]))
+
+    def on_close(self, what=None) -> None:
+        return
+
+def drive_reused(fanout:FanoutDriver, num_frame:int=20) -> None:
+    # NOTE: one message dict and one frame buffer for all frames, like a stream filling its buffer again
+    fanout.on_init()
+    frame = np.zeros(8, dtype=np.uint8)
+    what = {'frame': frame}
+    for k in range(num_frame):
+        frame[:] = k
+        fanout.on_next_frame(what)
+    fanout.on_close()
+
+def test_fanout_reused_dict_slow_children():
+    children = [SlowDriver(), SlowDriver()]
+    drive_reused(FanoutDriver(children))
+    for child in children:
+        assert child.received == list(range(20)), child.received
+
+def test_fanout_routes_reused_dict_slow_children():
+    children = [SlowDriver(), SlowDriver()]
+    drive_reused(FanoutDriver.split_channels(children, num_channel=2))
+    for child in children:
+        assert child.received == list(range(20)), child.received
+
+if __name__ == '__main__':
+    test_fanout_reused_dict_slow_children()
+    test_fanout_routes_reused_dict_slow_children()
+    print('fanout tests passed')
@@ -0,0 +1,83 @@
+import sys
+import time
+import numpy as np
+sys.path.append('..')
+
+from vib_music import VibrationStream
+from vib_music.framecodec import RLEFrame, rle_encode, rle_encode_track
+from vib_music.simdrivers import SimPCF8591Driver
+
+def test_rle_round_trip():
+    rng = np.random.default_rng(0)
+    frames = [
+        np.zeros(0, dtype=np.uint8),
+        np.full(24, 80, dtype=np.uint8),
+        np.repeat(rng.integers(0, 256, size=6), rng.integers(1, 8, size=6)).astype(np.uint8),
+        rng.integers(0, 256, size=24).astype(np.uint8),
+    ]
+    for frame in frames:
+        runs = rle_encode(frame)
+        assert len(runs) == frame.shape[0]
+        assert np.array_equal(runs.decode(), frame)
+    assert len(rle_encode(np.full(24, 80, dtype=np.uint8)).values) == 1
+
+def test_track_runs_stay_in_frames():
+    len_frame = 24
+    rng = np.random.default_rng(1)
+    chunks = np.repeat(rng.integers(0, 4, size=40), rng.integers(1, 30, size=40)).astype(np.uint8)
+    values, lengths, frame_runs = rle_encode_track(chunks, len_frame)
+    num_frame = (chunks.shape[0] + len_frame - 1) // len_frame
+    assert frame_runs.shape[0] == num_frame + 1
+    for k in range(num_frame):
+        a, b = frame_runs[k], frame_runs[k+1]
+        frame = RLEFrame(values[a:b], lengths[a:b])
+        assert np.array_equal(frame.decode(), chunks[k*len_frame:(k+1)*len_frame]), k
+
+def step_track(len_frame:int=24, num_frame:int=20) -> np.ndarray:
+    # NOTE: long runs and a silent tail, like an rmse track
+    rng = np.random.default_rng(2)
+    chunks = np.repeat(rng.integers(80, 256, size=30), rng.integers(4, 20, size=30)).astype(np.uint8)
+    chunks = np.concatenate([chunks, np.zeros(len_frame*num_frame, dtype=np.uint8)])
+    return chunks[:len_frame*num_frame]
+
+def play_rle(driver:SimPCF8591Driver, chunks:np.ndarray, len_frame:int=24) -> None:
+    # NOTE: frames come at the sample rate like from the audio clock, a paced driver drops late frames
+    period = 0. if driver.sample_rate is None else len_frame / driver.sample_rate
+    stream = VibrationStream(chunks, len_frame)
+    stream.enable_rle()
+    stream.init_stream()
+    driver.on_init()
+    for _ in range(stream.getnframes()):
+        frame = stream.readframe()
+        assert isinstance(frame, RLEFrame)
+        driver.on_next_frame({'frame': frame})
+        time.sleep(period)
+    driver.on_close()
+
+def test_paced_dac_writes_only_changes():
+    chunks = step_track()
+    driver = SimPCF8591Driver(bus_hz=400000, sample_rate=8000)
+    play_rle(driver, chunks)
+    assert driver.num_error == 0
+    changes = chunks[np.flatnonzero(np.diff(chunks, prepend=-1))]
+    assert np.array_equal(driver.writes.written(), changes)
+    assert driver.num_skipped == chunks.shape[0] - changes.shape[0]
+
+def test_burst_skips_held_constant_frames():
+    chunks = step_track()
+    driver = SimPCF8591Driver(bus_hz=400000)
+    play_rle(driver, chunks)
+    # NOTE: a constant frame is skipped when the DAC holds its value from the last frame
+    frames = chunks.reshape((-1, 24))
+    held = np.all(frames[1:] == frames[:-1, -1:], axis=1)
+    assert np.sum(held) > 1
+    kept = np.concatenate([frames[:1], frames[1:][~held]]).ravel()
+    assert np.array_equal(driver.writes.written(), kept)
+    assert driver.num_skipped == np.sum(held) * 24
+
+if __name__ == '__main__':
+    test_rle_round_trip()
+    test_track_runs_stay_in_frames()
+    test_paced_dac_writes_only_changes()
+    test_burst_skips_held_constant_frames()
+    print('framecodec tests passed')
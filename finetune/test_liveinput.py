@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import wave
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import LiveInputStream, FileInputStream
+
+LEN_FRAME = 100
+
+def write_wave(path:str, num_sample:int, rate:int=8000) -> bytes:
+    data = (np.arange(num_sample) % 1000).astype('<i2').tobytes()
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(data)
+    return data
+
+def test_file_input_plays_to_the_end():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'a.wav')
+        data = write_wave(path, 250)
+        # NOTE: a lag of the whole ring, a slow test machine must not drop frames
+        stream = FileInputStream(path, LEN_FRAME, num_slot=8, max_lag=8)
+        stream.init_stream()
+        assert stream.getnframes() == 3
+
+        buf = bytearray(stream.frame_bytes())
+        frames = []
+        start = time.perf_counter()
+        while True:
+            n = stream.readinto(memoryview(buf))
+            if n == 0:
+                break
+            frames.append(bytes(buf[:n]))
+            assert stream.capture_stamp >= start
+        stream.close()
+
+        assert b''.join(frames) == data
+        assert [len(f) for f in frames] == [200, 200, 100] # NOTE: the last frame is short
+        stats = stream.input_stats()
+        assert stats['frames'] == 3 and stats['silent'] == 0 and stats['dropped'] == 0
+
+def test_stalled_source_plays_silence():
+    stream = LiveInputStream(LEN_FRAME, rate=8000, timeout=0.05)
+    stream.init_stream()
+    buf = bytearray(b'\xff' * stream.frame_bytes())
+
+    start = time.perf_counter()
+    assert stream.readinto(memoryview(buf)) == stream.frame_bytes()
+    assert time.perf_counter() - start >= 0.05
+    assert bytes(buf) == bytes(stream.frame_bytes())
+    assert stream.input_stats()['silent'] == 1
+
+    # NOTE: the input comes back after the stall
+    stream.push(np.full(LEN_FRAME, 3, dtype='<i2').tobytes(), time.perf_counter())
+    assert stream.readframe() == np.full(LEN_FRAME, 3, dtype='<i2').tobytes()
+
+    stream.end()
+    assert stream.readinto(memoryview(buf)) == 0
+    assert stream.input_stats()['frames'] == 2
+    stream.close()
+
+def test_backlog_is_dropped_to_max_lag():
+    stream = LiveInputStream(LEN_FRAME, rate=8000, num_slot=8, max_lag=2)
+    stream.init_stream()
+    for k in range(5):
+        stream.push(np.full(LEN_FRAME, k, dtype='<i2').tobytes(), float(k))
+    # NOTE: the newest two frames are kept, the first of them is played
+    assert stream.readframe() == np.full(LEN_FRAME, 3, dtype='<i2').tobytes()
+    assert stream.capture_stamp == 3.
+    assert stream.input_stats()['dropped'] == 3
+
+    stream.setpos(0) # NOTE: a seek drops the backlog
+    stream.end()
+    assert stream.readframe() == b''
+    stream.close()
+
+if __name__ == '__main__':
+    test_file_input_plays_to_the_end()
+    test_stalled_source_plays_silence()
+    test_backlog_is_dropped_to_max_lag()
+    print('liveinput tests passed')
@@ -0,0 +1,36 @@
+import sys
+import time
+import numpy as np
+sys.path.append('..')
+
+from vib_music import NetworkDriver, NetworkReceiver, NullDriver
+
+def send_sessions(protocol:str, num_session:int=2, num_frame:int=30) -> dict:
+    # NOTE: one long-running receiver, a new sender per session restarting at seq 0
+    receiver = NetworkReceiver(NullDriver(), protocol=protocol)
+    receiver.start()
+    for _ in range(num_session):
+        driver = NetworkDriver('127.0.0.1', receiver.port, protocol, redundancy=2, delay=0.01)
+        driver.on_init()
+        for i in range(num_frame):
+            driver.on_next_frame({'frame': np.full(24, i, dtype=np.uint8)})
+            time.sleep(0.002)
+        driver.on_close()
+        time.sleep(0.05)
+    receiver.stop()
+    return receiver.stats()
+
+def test_receiver_plays_later_sessions_udp():
+    stats = send_sessions('udp')
+    assert stats['sessions'] == 2, stats
+    assert stats['played'] == 60, stats
+
+def test_receiver_plays_later_sessions_tcp():
+    stats = send_sessions('tcp')
+    assert stats['sessions'] == 2, stats
+    assert stats['played'] == 60, stats
+
+if __name__ == '__main__':
+    test_receiver_plays_later_sessions_udp()
+    test_receiver_plays_later_sessions_tcp()
+    print('netdriver tests passed')
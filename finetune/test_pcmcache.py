@@ -0,0 +1,84 @@
+import os
+import sys
+import wave
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import PCMAudioStream, WaveAudioStream
+from vib_music.pcmcache import cache_path, load_pcm_header
+
+LEN_FRAME = 100
+
+def write_wave(path:str, num_sample:int, channels:int=2, rate:int=8000) -> bytes:
+    rng = np.random.default_rng(num_sample)
+    data = rng.integers(-2**15, 2**15, size=(num_sample, channels)).astype('<i2').tobytes()
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(data)
+    return data
+
+def test_frames_match_the_wave():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'a.wav')
+        write_wave(path, 250)
+        stream = PCMAudioStream(path, LEN_FRAME, cache_dir=folder)
+        assert os.path.exists(cache_path(path, folder))
+        assert stream.getnframes() == 3
+        assert (stream.getsampwidth(), stream.getnchannels(), stream.getframerate()) == (2, 2, 8000)
+
+        stream.init_stream()
+        wave_stream = WaveAudioStream(path, LEN_FRAME)
+        wave_stream.init_stream()
+        for _ in range(stream.getnframes()):
+            assert bytes(stream.readframe()) == wave_stream.readframe()
+        assert len(stream.readframe()) == 0 # NOTE: past the end
+        wave_stream.close()
+        stream.close()
+
+def test_readinto_and_setpos():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'a.wav')
+        data = write_wave(path, 250)
+        frame_bytes = LEN_FRAME * 4
+        stream = PCMAudioStream(path, LEN_FRAME, cache_dir=folder)
+        stream.init_stream()
+
+        buf = bytearray(frame_bytes)
+        stream.setpos(1)
+        assert stream.readinto(buf) == frame_bytes
+        assert bytes(buf) == data[frame_bytes:2*frame_bytes]
+        assert stream.tell() == 2
+        # NOTE: the last frame is short, the rest of the buffer is left as is
+        assert stream.readinto(buf) == len(data) - 2*frame_bytes
+        assert bytes(buf[:len(data)-2*frame_bytes]) == data[2*frame_bytes:]
+        assert stream.readinto(buf) == 0
+
+        stream.setpos(100)
+        assert stream.tell() == 3
+        stream.setpos(-1)
+        assert stream.tell() == 0
+        assert bytes(stream.readframe(3)) == data
+        stream.close()
+
+def test_cache_is_reused_until_the_audio_changes():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'a.wav')
+        write_wave(path, 250)
+        PCMAudioStream(path, LEN_FRAME, cache_dir=folder)
+        header = load_pcm_header(path, folder)
+        assert header['num_sample'] == 250
+
+        write_wave(path, 130)
+        os.utime(path, (0, header['source_mtime'] + 1))
+        assert load_pcm_header(path, folder) is None
+        stream = PCMAudioStream(path, LEN_FRAME, cache_dir=folder)
+        assert stream.getnframes() == 2
+
+if __name__ == '__main__':
+    test_frames_match_the_wave()
+    test_readinto_and_setpos()
+    test_cache_is_reused_until_the_audio_changes()
+    print('pcmcache tests passed')
@@ -0,0 +1,70 @@
+import os
+import sys
+import wave
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import PCMAudioStream, PlaylistAudioStream
+
+LEN_FRAME = 100
+
+def write_track(folder:str, name:str, samples:np.ndarray, channels:int=2) -> str:
+    path = os.path.join(folder, name)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(samples.astype('<i2').tobytes())
+    return path
+
+def make_playlist(folder:str):
+    # NOTE: track lengths are not frame multiples, frames 2 and 3 cross the boundaries
+    lengths = [250, 130, 75]
+    tracks, pcm, start = [], [], 0
+    for i, n in enumerate(lengths):
+        samples = np.arange(start, start+n*2).reshape((n, 2)) % 30000
+        start += n*2
+        pcm.append(samples.astype('<i2').tobytes())
+        path = write_track(folder, f'track{i}.wav', samples)
+        tracks.append(PCMAudioStream(path, LEN_FRAME, cache_dir=folder))
+    playlist = PlaylistAudioStream(tracks[:1], LEN_FRAME)
+    for t in tracks[1:]:
+        playlist.append(t)
+    playlist.init_stream()
+    return playlist, b''.join(pcm)
+
+def test_readinto_crosses_tracks():
+    with tempfile.TemporaryDirectory() as folder:
+        playlist, pcm = make_playlist(folder)
+        frame_bytes = LEN_FRAME * 4
+        assert playlist.getnframes() == 5
+        buf = bytearray(frame_bytes)
+        frames = []
+        while True:
+            n = playlist.readinto(buf)
+            if n == 0:
+                break
+            frames.append(bytes(buf[:n]))
+        assert [len(f) for f in frames] == [frame_bytes]*4 + [55*4]
+        assert b''.join(frames) == pcm
+        playlist.close()
+
+def test_readframe_matches_readinto():
+    with tempfile.TemporaryDirectory() as folder:
+        playlist, pcm = make_playlist(folder)
+        frame_bytes = LEN_FRAME * 4
+        for pos in range(playlist.getnframes()):
+            playlist.setpos(pos)
+            assert bytes(playlist.readframe()) == pcm[pos*frame_bytes:(pos+1)*frame_bytes], pos
+        # NOTE: several frames at once, across both boundaries
+        playlist.setpos(1)
+        assert bytes(playlist.readframe(3)) == pcm[frame_bytes:4*frame_bytes]
+        assert playlist.tell() == 4
+        assert playlist.track_of(2) == 0 and playlist.track_of(3) == 1 and playlist.track_of(4) == 2
+        playlist.close()
+
+if __name__ == '__main__':
+    test_readinto_crosses_tracks()
+    test_readframe_matches_readinto()
+    print('playlist tests passed')
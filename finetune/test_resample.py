@@ -0,0 +1,58 @@
+import sys
+import numpy as np
+sys.path.append('..')
+
+from vib_music import RateConverter, VibrationStream, MultiRateVibrationStream
+
+NUM_CHANNEL = 8
+
+def lockstep_and_control(num_frame:int=50, steps:int=3, seed:int=0):
+    # NOTE: like `rmse_mode`, `steps` time steps of `NUM_CHANNEL` channels per frame
+    rng = np.random.default_rng(seed)
+    chunks = rng.integers(0, 256, size=num_frame*steps*NUM_CHANNEL).astype(np.uint8)
+    return chunks, chunks.reshape((-1, NUM_CHANNEL))
+
+def test_native_rate_matches_lockstep():
+    frame_rate, steps = 86., 3
+    chunks, control = lockstep_and_control(steps=steps)
+    lockstep = VibrationStream(chunks, steps*NUM_CHANNEL)
+    lockstep.init_stream()
+    expected = [bytes(lockstep.readframe()) for _ in range(lockstep.getnframes())]
+    for method in ('hold', 'linear', 'polyphase'):
+        # NOTE: device rate == control rate, every method must reproduce the track byte for byte
+        stream = MultiRateVibrationStream(control, frame_rate*steps, frame_rate, frame_rate*steps, method)
+        stream.init_stream()
+        assert stream.getnframes() == len(expected), method
+        frames = [bytes(stream.readframe()) for _ in range(stream.getnframes())]
+        assert frames == expected, method
+
+def test_linear_midpoints():
+    control = np.array([[0.], [100.], [50.]])
+    out = RateConverter(control, 1., 2., 'linear').render(0, 6)
+    assert np.allclose(out[:, 0], [0., 50., 100., 75., 50., 50.]), out
+
+def test_hold_repeats_samples():
+    control = np.array([[1.], [2.], [3.]])
+    out = RateConverter(control, 1., 3., 'hold').render(0, 9)
+    assert np.array_equal(out[:, 0], [1., 1., 1., 2., 2., 2., 3., 3., 3.]), out
+
+def test_polyphase_keeps_constant():
+    # NOTE: unit DC gain, up and down sampling
+    control = np.full((40, 2), 77.)
+    for ratio in (1.7, 0.4):
+        out = RateConverter(control, 100., 100.*ratio, 'polyphase').render(0, 10)
+        assert np.allclose(out, 77., atol=1e-3), (ratio, out)
+
+def test_render_grows_blocks():
+    _, control = lockstep_and_control(num_frame=10)
+    converter = RateConverter(control, 10., 10., 'hold', max_block=4)
+    out = converter.render(0, control.shape[0])
+    assert np.array_equal(out, control)
+
+if __name__ == '__main__':
+    test_native_rate_matches_lockstep()
+    test_linear_midpoints()
+    test_hold_repeats_samples()
+    test_polyphase_keeps_constant()
+    test_render_grows_blocks()
+    print('resample tests passed')
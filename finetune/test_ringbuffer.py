@@ -0,0 +1,69 @@
+import sys
+import numpy as np
+from multiprocessing import Process
+sys.path.append('..')
+
+from vib_music import SharedRingBuffer, RingReader
+
+def frame(k:int) -> bytes:
+    return np.full(4, k, dtype=np.int16).tobytes()
+
+def test_read_in_order_with_format():
+    ring = SharedRingBuffer(8, num_slot=4)
+    ring.set_format(2, 2, 44100)
+    reader = ring.reader()
+    assert reader.read() is None
+    ring.write(frame(1), stamp=1.5)
+    ring.write(frame(2))
+    first = reader.read()
+    assert first.dtype == np.int16 and list(first) == [1]*4
+    assert reader.stamp == 1.5 and reader.is_valid()
+    assert list(reader.read()) == [2]*4
+    assert reader.read() is None
+    assert ring.get_format() == (2, 2, 44100)
+
+def test_overrun_jumps_to_the_oldest_frame():
+    ring = SharedRingBuffer(8, num_slot=4)
+    ring.set_format(2, 1, 8000)
+    reader = ring.reader()
+    for k in range(10):
+        ring.write(frame(k))
+    # NOTE: frames 0-5 were overwritten before the reader got to them
+    assert int(reader.read()[0]) == 6
+    assert reader.overruns == 6
+    assert [int(reader.read()[0]) for _ in range(3)] == [7, 8, 9]
+    assert reader.read() is None
+
+def test_skip_to_keeps_the_newest_frames():
+    ring = SharedRingBuffer(8, num_slot=8)
+    ring.set_format(2, 1, 8000)
+    reader = ring.reader()
+    for k in range(5):
+        ring.write(frame(k))
+    assert reader.skip_to(2) == 3
+    assert reader.available() == 2
+    assert int(reader.read()[0]) == 3
+    assert reader.skip_to(2) == 0
+    reader.seek_latest()
+    assert reader.read() is None and reader.overruns == 0
+
+def produce(ring:SharedRingBuffer, num_frame:int) -> None:
+    for k in range(num_frame):
+        ring.write(frame(k))
+
+def test_reader_in_another_process():
+    ring = SharedRingBuffer(8, num_slot=16)
+    ring.set_format(2, 1, 8000)
+    reader = RingReader(ring)
+    p = Process(target=produce, args=(ring, 10))
+    p.start()
+    p.join()
+    assert [int(reader.read()[0]) for _ in range(10)] == list(range(10))
+    assert ring.latest(np.int16)[0] == 9
+
+if __name__ == '__main__':
+    test_read_in_order_with_format()
+    test_overrun_jumps_to_the_oldest_frame()
+    test_skip_to_keeps_the_newest_frames()
+    test_reader_in_another_process()
+    print('ring buffer tests passed')
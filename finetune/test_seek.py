@@ -0,0 +1,61 @@
+import sys
+import numpy as np
+from multiprocessing import Value
+sys.path.append('..')
+
+from vib_music import StreamChannel, StreamEvent, StreamEventType
+from vib_music import VibrationProcess, StreamHandler, VibrationStream, NullDriver
+from vib_music.processes import coalesce_seeks
+
+class FrameRecorder(NullDriver):
+    '''keeps the first sample of every written frame'''
+    def __init__(self) -> None:
+        super(FrameRecorder, self).__init__()
+        self.frames = []
+
+    def on_next_frame(self, what=None) -> None:
+        self.frames.append(int(what['frame'][0]))
+
+def test_coalesce_seeks():
+    frame = StreamEvent(StreamEventType.STREAM_NEXT_FRAME)
+    status = StreamEvent(StreamEventType.STREAM_STATUS_ACQ)
+    seek1 = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 10})
+    seek2 = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 20})
+    tasks = [frame, seek1, frame, status, seek2, frame]
+    assert coalesce_seeks(tasks) == [status, seek2, frame]
+    assert coalesce_seeks([frame, status, frame]) == [frame, status, frame]
+    assert coalesce_seeks([]) == []
+
+def run_vibration(events, seek_seq:int):
+    # NOTE: frame k of the stream holds the value k
+    driver = FrameRecorder()
+    proc = VibrationProcess(StreamHandler(VibrationStream(np.repeat(np.arange(50), 4), 4), driver))
+    audio_conn, proc_conn = StreamChannel.pair()
+    proc.set_event_queues(proc_conn, proc_conn)
+    proc.set_seek_counter(Value('q', seek_seq, lock=False))
+    for e in events + [StreamEvent(StreamEventType.STREAM_CLOSE)]:
+        audio_conn.put(e)
+    proc.run() # NOTE: in this process, returns on STREAM_CLOSE
+    audio_conn.close()
+    proc_conn.close()
+    return driver.frames
+
+def next_frame(seq:int) -> StreamEvent:
+    return StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': seq})
+
+def test_frames_of_the_current_seek_are_played():
+    events = [StreamEvent(StreamEventType.STREAM_INIT), next_frame(0), next_frame(0),
+        StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 10, 'seq': 1}), next_frame(1), next_frame(1)]
+    assert run_vibration(events, seek_seq=1) == [10, 11]
+
+def test_stale_frames_are_dropped():
+    # NOTE: the audio has applied seek 2 already, its SEEK is still on the way
+    events = [StreamEvent(StreamEventType.STREAM_INIT),
+        StreamEvent(StreamEventType.STREAM_SEEK, {'pos': 10, 'seq': 1}), next_frame(1), next_frame(1), next_frame(2)]
+    assert run_vibration(events, seek_seq=2) == [10]
+
+if __name__ == '__main__':
+    test_coalesce_seeks()
+    test_frames_of_the_current_seek_are_played()
+    test_stale_frames_are_dropped()
+    print('seek tests passed')
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import wave
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import PlayerService, NullDriver, WaveAudioStream, VibrationStream
+
+LEN_FRAME = 128
+
+def write_wave(folder:str, num_frame:int) -> str:
+    path = os.path.join(folder, f'track{num_frame}.wav')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(np.zeros(num_frame*LEN_FRAME, dtype='<i2').tobytes())
+    return path
+
+def wait_position(service:PlayerService, pos:int, timeout:float=10.) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if service.tell() == pos:
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_service_reuses_processes_across_sessions():
+    with tempfile.TemporaryDirectory() as folder:
+        service = PlayerService.from_drivers(NullDriver(), [NullDriver()])
+        service.audio_proc.stream_handler.disable_bar()
+        service.start()
+        pids = [service.audio_proc.pid] + [p.pid for p in service.vib_procs]
+        try:
+            for num_frame in [40, 25]:
+                audio = WaveAudioStream(write_wave(folder, num_frame), LEN_FRAME)
+                vibration = VibrationStream(np.ones(24*num_frame, dtype=np.uint8), 24)
+                assert service.load_session(audio, [vibration], timeout=10) == num_frame
+                service.play()
+                # NOTE: a persistent service pauses at the end of a session instead of exiting
+                assert wait_position(service, num_frame), service.tell()
+                assert service.is_alive()
+                acks = service.status()
+                assert [a.what['status'] for a in acks] == ['NullDriver', 'NullDriver'], acks
+                service.stop()
+                assert wait_position(service, 0), service.tell()
+                assert [service.audio_proc.pid] + [p.pid for p in service.vib_procs] == pids
+        finally:
+            service.close()
+        assert not service.is_alive()
+        assert all(not p.is_alive() for p in service.vib_procs)
+
+if __name__ == '__main__':
+    test_service_reuses_processes_across_sessions()
+    print('service tests passed')
@@ -0,0 +1,89 @@
+import sys
+import time
+import numpy as np
+import librosa
+sys.path.append('..')
+
+from finetune.sigprocs.streaming import StreamingBandSelector
+from vib_music import SimPCF8591Driver
+
+SR = 8000
+LEN_HOP = 128
+VIB_FRAME_LEN = 12
+
+def stereo_hops(signal:np.ndarray) -> list:
+    '''interleaved int16 hops of a mono signal in [-1, 1], as read from the audio tap'''
+    pcm = np.repeat((signal * 32767).astype(np.int16)[:, None], 2, axis=1)
+    return [pcm[i:i+LEN_HOP].ravel() for i in range(0, pcm.shape[0] - LEN_HOP + 1, LEN_HOP)]
+
+def kicks(num_hop:int) -> np.ndarray:
+    '''80Hz hits decaying in 30ms, every 160ms'''
+    t = np.arange(num_hop * LEN_HOP) / SR
+    return np.sin(2 * np.pi * 80 * t) * np.exp(-(t % 0.16) / 0.03)
+
+def test_stft_matches_librosa():
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-2**15, 2**15, size=(LEN_HOP * 10, 2)).astype(np.int16)
+    mono = pcm.astype(np.float64).sum(axis=1) / (32767 * 2)
+    for len_window in [128, 256]:
+        sel = StreamingBandSelector(SR, len_window=len_window, len_hop=LEN_HOP, channels=2)
+        ref = librosa.stft(mono, n_fft=len_window, hop_length=LEN_HOP, win_length=LEN_HOP,
+            window='hann', center=False)
+        lag = len_window // LEN_HOP - 1 # NOTE: hops pushed before the first full window
+        for j in range(10):
+            sel._push(pcm[j*LEN_HOP:(j+1)*LEN_HOP].ravel())
+            if j < lag:
+                continue
+            power = np.abs(ref[:sel.num_bin, j-lag]) ** 2
+            # NOTE: the sample ring is float32
+            assert np.abs(sel._power() - power).max() <= 1e-6 * power.max()
+
+def play_burst(hops:list) -> np.ndarray:
+    sel = StreamingBandSelector(SR, len_hop=LEN_HOP, channels=2, vib_frame_len=VIB_FRAME_LEN, vib_extremefreq=[30, 200])
+    driver = SimPCF8591Driver(bus_hz=400000)
+    driver.on_init()
+    for hop in hops:
+        driver.on_next_frame({'frame': sel.process(hop)})
+    driver.on_close()
+    return driver.writes.written().reshape((-1, VIB_FRAME_LEN))
+
+def test_dac_output_follows_the_input():
+    silent = play_burst(stereo_hops(np.zeros(20 * LEN_HOP)))
+    assert silent.shape == (20, VIB_FRAME_LEN) and not silent.any()
+
+    played = play_burst(stereo_hops(kicks(20)))
+    assert played.shape == (20, VIB_FRAME_LEN)
+    assert played.max() > 80 # NOTE: above the zero-feeling bias
+    assert len(set(map(bytes, played.astype(np.uint8)))) > 1
+
+    # NOTE: the hits stop, the output falls back to silence
+    hops = stereo_hops(np.concatenate([kicks(20), np.zeros(20 * LEN_HOP)]))
+    stopped = play_burst(hops)
+    assert stopped[:20].any() and not stopped[-5:].any()
+
+def test_paced_dac_at_the_vibration_rate():
+    sel = StreamingBandSelector(SR, len_hop=LEN_HOP, channels=2, vib_frame_len=VIB_FRAME_LEN, vib_extremefreq=[30, 200])
+    driver = SimPCF8591Driver(bus_hz=400000)
+    driver.enable_pacing(VIB_FRAME_LEN * SR / LEN_HOP) # NOTE: as mappings.main
+    driver.on_init()
+    frames = []
+    for hop in stereo_hops(kicks(20)):
+        # NOTE: copied, the selector fills the same frame every hop
+        frames.append(sel.process(hop).copy())
+        driver.on_next_frame({'frame': frames[-1]})
+        time.sleep(LEN_HOP / SR)
+    driver.on_close()
+
+    samples = np.concatenate(frames)
+    changes = samples[np.flatnonzero(np.diff(samples.astype(np.int64), prepend=-1))]
+    assert driver.num_error == 0
+    assert np.array_equal(driver.writes.written(), changes)
+    stamps = driver.writes.timestamps()
+    # NOTE: 20 hops of 16ms, the last samples are held by the DAC
+    assert 0.15 < stamps[-1] - stamps[0] < 0.5
+
+if __name__ == '__main__':
+    test_stft_matches_librosa()
+    test_dac_output_follows_the_input()
+    test_paced_dac_at_the_vibration_rate()
+    print('streaming tests passed')
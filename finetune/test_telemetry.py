@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import wave
+import tempfile
+import numpy as np
+from multiprocessing import Process
+sys.path.append('..')
+
+from vib_music import TelemetryRing, PlayerService, NullDriver, WaveAudioStream, VibrationStream
+
+class TelemetryDriver(NullDriver):
+    '''publishes its write count after every frame'''
+    def __init__(self) -> None:
+        super(TelemetryDriver, self).__init__()
+        self.enable_telemetry()
+
+    def on_next_frame(self, what=None) -> None:
+        super(TelemetryDriver, self).on_next_frame(what)
+        self.telemetry.publish(time.time(), self.num_write, 0, [0.5, 1., 0., 0.])
+
+def publish(ring:TelemetryRing, num:int) -> None:
+    for k in range(num):
+        ring.publish(float(k), k+1, 1, [k, 0., 0., 2.])
+
+def test_snapshot_of_the_latest_record():
+    ring = TelemetryRing()
+    assert ring.snapshot() is None
+    p = Process(target=publish, args=(ring, 100))
+    p.start()
+    p.join()
+    snapshot = ring.snapshot()
+    assert list(snapshot.keys()) == list(TelemetryRing.FIELDS)
+    assert snapshot['last_write'] == 99. and snapshot['writes'] == 100 and snapshot['errors'] == 1
+    assert [snapshot[c] for c in ('CH0', 'CH1', 'CH2', 'CH3')] == [99., 0., 0., 2.]
+
+def test_service_reads_driver_telemetry():
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'track.wav')
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(np.zeros(30*128, dtype='<i2').tobytes())
+
+        service = PlayerService.from_drivers(NullDriver(), [TelemetryDriver()])
+        service.audio_proc.stream_handler.disable_bar()
+        try:
+            assert service.telemetry() == [None]
+            num_frame = service.load_session(WaveAudioStream(path, 128), [VibrationStream(np.ones(24*30), 24)], timeout=10)
+            service.play()
+            deadline = time.perf_counter() + 10.
+            while service.tell() < num_frame and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            # NOTE: read from shared memory, no round trip through the processes
+            snapshot = service.telemetry()[0]
+            assert snapshot is not None and snapshot['writes'] >= 1 and snapshot['CH1'] == 1.
+        finally:
+            service.close()
+
+if __name__ == '__main__':
+    test_snapshot_of_the_latest_record()
+    test_service_reads_driver_telemetry()
+    print('telemetry tests passed')
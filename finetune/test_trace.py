@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import wave
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import PlayerService, NullDriver, WaveAudioStream, VibrationStream
+from vib_music import load_trace, replay_trace
+from vib_music.trace import TRACE_IN, TRACE_OUT
+
+NUM_FRAME = 400
+
+def write_wave(folder:str) -> str:
+    path = os.path.join(folder, 'track.wav')
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes(np.zeros(NUM_FRAME*128, dtype='<i2').tobytes())
+    return path
+
+def new_service() -> PlayerService:
+    service = PlayerService.from_drivers(NullDriver(), [NullDriver()])
+    service.audio_proc.stream_handler.disable_bar()
+    return service
+
+def load(service:PlayerService, path:str) -> int:
+    return service.load_session(WaveAudioStream(path, 128), [VibrationStream(np.ones(24*NUM_FRAME), 24)], timeout=10)
+
+def record(folder:str, path:str) -> str:
+    trace = os.path.join(folder, 'trace.jsonl')
+    service = new_service()
+    service.audio_proc.enable_trace(trace)
+    try:
+        assert load(service, path) == NUM_FRAME
+        service.play()
+        # NOTE: a burst of seeks is coalesced by the audio process, but every one is traced
+        for pos in range(10, 110, 10):
+            service.seek(pos)
+        service.status()
+        service.pause()
+        time.sleep(0.1)
+    finally:
+        service.close()
+    return trace
+
+def test_record_every_control_event():
+    with tempfile.TemporaryDirectory() as folder:
+        trace = load_trace(record(folder, write_wave(folder)))
+        received = [r['head'] for r in trace if r['dir'] == TRACE_IN]
+        assert received[:2] == ['STREAM_LOAD', 'AUDIO_START'], received
+        assert received.count('STREAM_SEEK') == 10, received
+        assert 'STREAM_STATUS_ACQ' in received and received[-1] == 'STREAM_CLOSE'
+        seeks = [r['what']['pos'] for r in trace if r['head'] == 'STREAM_SEEK']
+        assert seeks == list(range(10, 110, 10))
+        # NOTE: the new session is kept as its type name, the num_frame ack is traced too
+        assert trace[0]['what']['data'] == 'WaveAudioStream'
+        assert any(r['dir'] == TRACE_OUT and r['what'].get('num_frame') == NUM_FRAME for r in trace)
+        assert all(a['t'] <= b['t'] for a, b in zip(trace, trace[1:]))
+
+def test_replay_with_and_without_loader():
+    with tempfile.TemporaryDirectory() as folder:
+        path = write_wave(folder)
+        trace = load_trace(record(folder, path))
+        num_event = len([r for r in trace if r['dir'] == TRACE_IN])
+
+        service = new_service()
+        loads = []
+        try:
+            report = replay_trace(trace, service, speed=None, loader=lambda r: loads.append(r) or load(service, path))
+            assert report['num_event'] == num_event and report['skipped_loads'] == 0
+            assert len(loads) == 1 and 'status_rtt' in report
+            # NOTE: the traced CLOSE ends the session only, the service is still ours
+            assert service.is_alive()
+        finally:
+            service.close()
+
+        service = new_service()
+        try:
+            assert load(service, path) == NUM_FRAME
+            report = replay_trace(trace, service, speed=None)
+            assert report['skipped_loads'] == 1
+        finally:
+            service.close()
+
+if __name__ == '__main__':
+    test_record_every_control_event()
+    test_replay_with_and_without_loader()
+    print('trace tests passed')
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.append('..')
+
+from vib_music import UARTDriver, UARTCommandStream
+from vib_music.uartcommands import CMD_SIZE, make_params, compile_commands, save_commands, load_commands
+
+def random_track(num_frame:int=200):
+    rng = np.random.default_rng(0)
+    # NOTE: out of range values are clipped like the driver does
+    return {'voltage': rng.integers(-20, 300, num_frame), 'duty': rng.integers(-5, 110, num_frame),
+        'freq': rng.integers(0, 70000, num_frame)}
+
+def test_compiled_commands_match_the_driver():
+    track = random_track()
+    driver = UARTDriver()
+    for CH in ['1 0 Z Z', 'Z Z 1 1', '0 1 0 1']:
+        cmds = compile_commands(make_params(200, CH, **track))
+        assert len(cmds) == 200 * CMD_SIZE
+        for k in range(200):
+            what = {'CH': CH, 'voltage': int(track['voltage'][k]), 'duty': int(track['duty'][k]), 'freq': int(track['freq'][k])}
+            assert cmds[k*CMD_SIZE:(k+1)*CMD_SIZE] == driver.encode_command(what), (CH, what)
+
+def test_commands_match_the_hex_protocol():
+    # NOTE: the f-string hex command the driver wrote before commands were struct-encoded
+    cmd = compile_commands(make_params(1, '1 0 Z Z', voltage=180, duty=50, freq=1000))
+    assert cmd == bytes.fromhex(f'BC01{0b01010010:02X}{180:02X}{50*2+1:02X}{1000:04X}AFAAFFDF')
+
+def test_command_stream_frames():
+    cmds = compile_commands(make_params(10, voltage=np.arange(10)))
+    stream = UARTCommandStream(cmds)
+    stream.init_stream()
+    assert stream.getnframes() == 10
+    frame = stream.readframe()
+    assert isinstance(frame, memoryview) and bytes(frame) == cmds[:CMD_SIZE]
+    stream.setpos(8)
+    assert bytes(stream.readframe(2)) == cmds[8*CMD_SIZE:]
+    assert len(stream.readframe()) == 0 and stream.tell() == 10
+
+def test_command_cache():
+    cmds = compile_commands(make_params(10))
+    with tempfile.TemporaryDirectory() as folder:
+        assert load_commands(folder, 'rmse_uart_mode') is None
+        save_commands(folder, 'rmse_uart_mode', cmds)
+        assert load_commands(folder, 'rmse_uart_mode') == cmds
+        # NOTE: a bundle saved after the commands makes the cache stale
+        meta = os.path.join(folder, 'meta.pkl')
+        open(meta, 'wb').close()
+        later = os.path.getmtime(os.path.join(folder, 'rmse_uart_mode.uart')) + 10
+        os.utime(meta, (later, later))
+        assert load_commands(folder, 'rmse_uart_mode') is None
+
+if __name__ == '__main__':
+    test_compiled_commands_match_the_driver()
+    test_commands_match_the_hex_protocol()
+    test_command_stream_frames()
+    test_command_cache()
+    print('uart command tests passed')
@@ -9,12 +9,19 @@ from multiprocessing import Process
 
 sys.path.append('..')
 
+from vib_music.autotune import tuned_defaults
+
 def _base_arg_parser():
+    # NOTE: frame options saved by `python -m vib_music autotune`, 512/24 at the audio frame rate if none
+    tuned = tuned_defaults()
     p = argparse.ArgumentParser(conflict_handler='resolve')
     p.add_argument('--audio', type=str)
     p.add_argument('--task', type=str, default='run', choices=['run', 'build', 'play'])
-    p.add_argument('--len-hop', type=int, default=512)
-    p.add_argument('--len-hop-vib', type=int, default=24)
+    p.add_argument('--len-hop', type=int, default=tuned['len_frame'])
+    p.add_argument('--len-hop-vib', type=int, default=tuned['len_vib_frame'])
+    p.add_argument('--device-rate', type=float, default=tuned['device_rate'])
+    p.add_argument('--resample', type=str, default=tuned['resample'])
+    p.add_argument('--num-channel', type=int, default=tuned['num_channel'])
     p.add_argument('--vib-mode', type=str, default='rmse_mode')
 
     return p
@@ -52,13 +59,18 @@ def _init_features(audio:str, len_hop:int, recipes:Optional[dict]=None) -> Audio
     return fb
 
 from vib_music import get_audio_process
-from vib_music import VibrationStream, PCF8591Driver, StreamHandler
+from vib_music import VibrationStream, MultiRateVibrationStream, PCF8591Driver, StreamHandler
 from vib_music import LogDriver
 from vib_music import VibrationProcess
 
 def _init_processes(audio:str, len_hop:int,
-    fb:AudioFeatureBundle, len_vib_frame:int, mode:str='rmse_mode') -> List[Process]:
-    sdata = VibrationStream.from_feature_bundle(fb, len_vib_frame, mode)
+    fb:AudioFeatureBundle, len_vib_frame:int, mode:str='rmse_mode',
+    device_rate:float=0., resample:str='linear', num_channel:int=8) -> List[Process]:
+    if device_rate > 0:
+        # NOTE: the autotuned vibration frame is converted to the device rate it was measured at
+        sdata = MultiRateVibrationStream.from_feature_bundle(fb, mode, device_rate, resample, num_channel)
+    else:
+        sdata = VibrationStream.from_feature_bundle(fb, len_vib_frame, mode)
     sdriver = PCF8591Driver()
     # sdriver = LogDriver()
     shandler = StreamHandler(sdata, sdriver)
@@ -71,9 +83,13 @@ def _init_processes(audio:str, len_hop:int,
 from vib_editor import launch_vibration
 def _main(opt:Namespace, feat_recipes:Optional[dict]=None) -> None:
     fb = _init_features(opt.audio, opt.len_hop, feat_recipes)
+    if fb.frame_len() != opt.len_hop:
+        # NOTE: a saved bundle keeps the hop it was built with
+        print(f'bundle hop {fb.frame_len()} differs from --len-hop {opt.len_hop}, audio frames follow the bundle')
+        opt.len_hop = fb.frame_len()
 
     if opt.task == 'run' or opt.task == 'play':
         procs = _init_processes(opt.audio, opt.len_hop, fb, 
-            opt.len_hop_vib, opt.vib_mode)
+            opt.len_hop_vib, opt.vib_mode, opt.device_rate, opt.resample, opt.num_channel)
         # master = None -> run vibration in an independent window
         launch_vibration(master=None, process=procs)
@@ -4,11 +4,11 @@ import tkinter.ttk as ttk
 from .backends import VibPlayBackend
 
 class VibPlayFrame(LabelFrame):
-    def __init__(self, master=None, processes=[], **args):
+    def __init__(self, master=None, processes=[], service=None, **args):
         LabelFrame.__init__(self, master, text='Vib Play Frame', **args)
 
         self.nextFrame = IntVar(value=0)
-        self.backend = VibPlayBackend(self.nextFrame, processes)
+        self.backend = VibPlayBackend(self.nextFrame, processes, service)
         self.btns = {}
 
         # status text
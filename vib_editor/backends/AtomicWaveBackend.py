@@ -113,7 +113,9 @@ class AtomicWaveBackend(object):
 
 class MonoFrameAudioStream(AudioStreamI):
     def __init__(self, num_frame:int, len_frame: int) -> None:
-        super().__init__(np.zeros((len_frame,), dtype=np.uint16), len_frame)
+        super().__init__()
+        self.chunks = np.zeros((len_frame,), dtype=np.uint16)
+        self.len_frame = len_frame
         self.next_frame = 0
         self.num_frame = num_frame
     
@@ -128,7 +130,7 @@ class MonoFrameAudioStream(AudioStreamI):
             return ''
         else:
             self.next_frame += 1
-            return self.chunks.tostring()
+            return self.chunks.tobytes()
     
     def tell(self) -> int:
         return self.next_frame
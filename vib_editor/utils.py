@@ -23,13 +23,13 @@ sys.path.append('..')
 
 from .VibPlayFrame import VibPlayFrame
 
-def launch_vibration(master=None, process=[]) -> None:
+def launch_vibration(master=None, process=[], service=None) -> None:
     if master is None:
         root = Tk()
     else:
         print('init Vib Play in TopLevel')
         root = Toplevel(master)
-    frame = VibPlayFrame(root, process)
+    frame = VibPlayFrame(root, process, service=service)
     frame.pack()
 
     def on_closing():
@@ -41,13 +41,24 @@ def launch_vibration(master=None, process=[]) -> None:
     if master is None:
         root.mainloop()
 
+import atexit
 from .backends import MonoFrameAudioStream
 
 from vib_music import AudioFeatureBundle
-from vib_music import VibrationStream
+from vib_music import VibrationStream, WaveAudioStream
 from vib_music import AudioDriver, LogDriver
-from vib_music import AudioProcess, VibrationProcess
-from vib_music import AudioStreamHandler, StreamHandler
+from vib_music import PlayerService
+
+_player_service = None
+
+def get_player_service() -> PlayerService:
+    # NOTE: processes and drivers are created once and reused by every play
+    global _player_service
+    if _player_service is None or not _player_service.is_alive():
+        _player_service = PlayerService.from_drivers(AudioDriver(), [LogDriver()])
+        _player_service.start()
+        atexit.register(_player_service.close)
+    return _player_service
 
 def launch_vib_with_atomicwave(master, atomicwave:np.ndarray,
     duration:float, scale:int=1) -> None:
@@ -56,21 +67,18 @@ def launch_vib_with_atomicwave(master, atomicwave:np.ndarray,
     num_frame = int(duration / FRAME_TIME)
 
     audiodata = MonoFrameAudioStream(num_frame, 512)
-    audiodriver = AudioDriver()
-    audiohandler = AudioStreamHandler(audiodata, audiodriver)
-    audioproc = AudioProcess(audiohandler)
 
     vibdata= np.stack([atomicwave] * num_frame, axis=0).astype(np.uint8)
     vibdata = VibrationStream(vibdata, 24)
-    vibdriver = LogDriver()
-    vibhandler = StreamHandler(vibdata, vibdriver)
-    vibproc = VibrationProcess(vibhandler)
 
-    launch_vibration(master=master, process=[audioproc, vibproc]) 
+    service = get_player_service()
+    if service.load_session(audiodata, [vibdata], timeout=5.0) < 0:
+        print('initial audio session failed. exit...')
+        return
+
+    launch_vibration(master=master, service=service)
 
 from .backends import TransformQueue
-from vib_music import get_audio_process
-from multiprocessing import Queue
 def launch_vib_with_rmse_transforms(master, audio:str, fb:AudioFeatureBundle,
     transforms:TransformQueue, atomicwave:np.ndarray) -> None:
     # update vibration mode
@@ -86,26 +94,18 @@ def launch_vib_with_rmse_transforms(master, audio:str, fb:AudioFeatureBundle,
         vib_seq = (vib_seq * wave).round().astype(np.uint8)
         return vib_seq
 
+    # NOTE: vibrations are rendered here and shipped to the warm processes
     sdata = VibrationStream.from_feature_bundle(fb, 24, 'rmse_transform_mode')
-    # sdriver = PCF8591Driver()
-    sdriver = LogDriver()
-    shandler = StreamHandler(sdata, sdriver)
-    vib_proc = VibrationProcess(shandler)
+    adata = WaveAudioStream(audio, 512)
 
-    audio_proc = get_audio_process(audio, 512)
-    if audio_proc is None:
-        print('initial audio process failed. exit...')
+    service = get_player_service()
+    if service.load_session(adata, [sdata], timeout=5.0) < 0:
+        print('initial audio session failed. exit...')
         return
 
-    results, commands = Queue(), Queue()
-    audio_proc.set_event_queues(commands, results)
-    audio_proc.attach_vibration_proc(vib_proc)
-
-    launch_vibration(master=master, process=[audio_proc, vib_proc])
+    launch_vibration(master=master, service=service)
 
 if __name__ == '__main__':
-    from multiprocessing import Queue
-    
     from vib_music import AudioFeatureBundle
     from vib_music import VibrationStream
     from vib_music import LogDriver
@@ -123,8 +123,4 @@ if __name__ == '__main__':
     len_hop = 512
     music_proc = get_audio_process(audio, len_hop)
 
-    results, commands = Queue(), Queue()
-    music_proc.set_event_queues(commands, results)
-    music_proc.attach_vibration_proc(vib_proc)
-
     launch_vibration(process=[music_proc, vib_proc])
\ No newline at end of file
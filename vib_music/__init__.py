@@ -1,14 +1,28 @@
 from .core import *
 
 from .processes import StreamProcess, AudioProcess, VibrationProcess
-from .drivers import PCF8591Driver, AudioDriver, LogDriver, UARTDriver
+from .drivers import PCF8591Driver, AudioDriver, LogDriver, UARTDriver, NullDriver, FanoutDriver
+from .simdrivers import SimPCF8591Driver, SimUARTDriver, SimAudioDriver, WriteRecorder
 from .streamhandler import StreamHandler, AudioStreamHandler
 from .streamhandler import AudioStreamEvent, AudioStreamEventType
 from .streamhandler import StreamState, LiveStreamHandler
-from .streams import WaveAudioStream, VibrationStream, LiveVibrationStream
+from .streams import WaveAudioStream, VibrationStream, LiveVibrationStream, UARTCommandStream
+from .streams import MultiRateVibrationStream, PCMAudioStream, LiveModeVibrationStream
+from .resample import RateConverter
+
+from .service import PlayerService
+from .progress import ProgressSampler
+from .realtime import FrameTimer, FrameClock, LatencyProbe, StageTimer, apply_realtime
+from .ringbuffer import SharedRingBuffer, RingReader
+from .telemetry import TelemetryRing
+from .trace import TraceRecorder, load_trace, replay_trace
+from .netdriver import NetworkDriver, NetworkReceiver
+from .capture import CaptureDriver, CaptureStream
+from .playlist import PlaylistSession, PlaylistAudioStream, PlaylistVibrationStream
+from .liveinput import LiveInputStream, PyAudioInputStream, FileInputStream
 
 from .utils import launch_vibration
-from .utils import get_audio_process, get_vib_process
+from .utils import get_audio_process, get_vib_process, get_standalone_vib_process
 
 from .features import *
 from .vibrations import *
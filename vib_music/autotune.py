@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import numpy as np
+from typing import Dict, List, Optional
+
+# NOTE: recommended frame sizes, read by the command line and finetune scripts as defaults
+CONFIG_PATH = os.path.join(os.path.expanduser('~'), '.vib_music', 'autotune.json')
+DEFAULT_LEN_FRAME = 512
+DEFAULT_LEN_VIB_FRAME = 24
+# NOTE: a tuned vibration frame only holds with the device rate of its trial
+TUNED_DEFAULTS = {'len_frame': DEFAULT_LEN_FRAME, 'len_vib_frame': DEFAULT_LEN_VIB_FRAME,
+    'device_rate': 0., 'resample': 'linear', 'num_channel': 8}
+
+def av_offsets(audio_stamps:np.ndarray, vib_stamps:np.ndarray, audio_latency:float=0.) -> np.ndarray:
+    '''
+    vibration output minus audio output of every frame in ms, positive when the
+    vibration comes late; audio is heard `audio_latency` after its write returns
+    '''
+    n = min(audio_stamps.shape[0], vib_stamps.shape[0])
+    return (vib_stamps[:n] - audio_stamps[:n] - audio_latency) * 1000.
+
+def frame_jitter(stamps:np.ndarray, period:float, skip:int=0) -> float:
+    '''99th percentile of the frame interval error in ms, `skip` frames fill the device buffer'''
+    stamps = stamps[skip:]
+    if stamps.shape[0] < 2:
+        return 0.
+    return float(np.percentile(np.abs(np.diff(stamps) - period), 99) * 1000.)
+
+def score_trial(len_frame:int, len_vib_frame:int, sample_rate:int, report:Dict,
+    audio_stamps:np.ndarray, vib_stamps:np.ndarray, audio_latency:float=0.) -> Dict:
+    '''
+    metrics of one run, `report` of `cli.run_bench`; `audio_latency` is the sound
+    card buffer, audio frames are heard that long minus a frame after the write returns
+    '''
+    period = len_frame / sample_rate
+    skip = int(np.ceil(audio_latency / period)) + 1 # NOTE: writes return at once until the buffer is full
+    offsets = av_offsets(audio_stamps, vib_stamps, audio_latency - period)
+    trial = {
+        'len_frame': len_frame,
+        'len_vib_frame': len_vib_frame,
+        'frame_ms': period * 1000.,
+        'cpu_per_frame': report['cpu_per_frame'],
+        'jitter': max(frame_jitter(audio_stamps, period, skip), frame_jitter(vib_stamps, period, skip)),
+        'underruns': report.get('underruns', None),
+        'av_mean': float(offsets.mean()) if offsets.shape[0] > 0 else 0.,
+        'av_p99': float(np.percentile(np.abs(offsets), 99)) if offsets.shape[0] > 0 else 0.,
+    }
+    # NOTE: a vibration frame is known one frame period after its audio, plus the a/v offset
+    trial['latency'] = trial['frame_ms'] + abs(trial['av_mean'])
+    return trial
+
+def recommend(trials:List[Dict], jitter_budget:float) -> Optional[Dict]:
+    '''lowest latency trial within the jitter budget, without underruns and with cpu to spare'''
+    valid = [t for t in trials if t['jitter'] <= jitter_budget and not t['underruns']
+        and t['cpu_per_frame'] < t['frame_ms']]
+    if len(valid) == 0:
+        return None
+    return min(valid, key=lambda t: t['latency'])
+
+def save_config(config:Dict, path:str=CONFIG_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(config, f, indent=2)
+
+def load_config(path:str=CONFIG_PATH) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def tuned_defaults(path:str=CONFIG_PATH) -> Dict:
+    '''frame options of the autotuned trial if any, announced since they change the defaults'''
+    config = load_config(path)
+    if config is None:
+        return dict(TUNED_DEFAULTS)
+    tuned = {k: type(v)(config.get(k, v)) for k, v in TUNED_DEFAULTS.items()}
+    print('autotuned defaults from ' + path + ': ' + ' '.join(f'--{k.replace("_", "-")} {v}' for k, v in tuned.items()),
+        file=sys.stderr)
+    return tuned
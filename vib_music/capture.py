@@ -0,0 +1,197 @@
+import os
+import mmap
+import time
+import queue
+import struct
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+from .core import StreamEvent, StreamEventType
+from .core import StreamDriverBase, StreamDataI
+from .framecodec import RLEFrame
+
+# NOTE: file = header + `capacity` fixed-size records, preallocated and memory-mapped
+CAPTURE_MAGIC = b'VIBCAP01'
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('frame_bytes', '<u4'), ('capacity', '<u4'), ('count', '<u8')])
+HEADER_SIZE = 64
+RECORD_HEAD = struct.Struct('<dII')
+COUNT_OFFSET = 16
+
+def record_dtype(frame_bytes:int) -> np.dtype:
+    '''monotonic timestamp (perf_counter), frame length in bytes and the frame, zero padded'''
+    return np.dtype([('stamp', '<f8'), ('length', '<u4'), ('session', '<u4'), ('data', 'u1', (frame_bytes,))])
+
+def open_capture(path:str, mode:str='r'):
+    '''header and records of a capture file, `mode` as `np.memmap`'''
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+    if header['magic'][0] != CAPTURE_MAGIC:
+        raise ValueError(f'{path} is not a vibration capture')
+    records = np.memmap(path, dtype=record_dtype(int(header['frame_bytes'][0])), mode=mode,
+        offset=HEADER_SIZE, shape=(int(header['capacity'][0]),))
+    return header, records
+
+def create_capture(path:str, frame_bytes:int, capacity:int) -> None:
+    size = HEADER_SIZE + record_dtype(frame_bytes).itemsize * capacity
+    with open(path, 'wb') as f:
+        f.truncate(size) # NOTE: sparse file, pages are allocated as records are written
+    header = np.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+    header[0] = (CAPTURE_MAGIC, frame_bytes, capacity, 0)
+    header.flush()
+
+class CaptureDriver(StreamDriverBase):
+    '''
+    Record every frame with a monotonic timestamp into a preallocated memory-mapped
+    file, the copy into the file is done by a background thread.
+    Frames longer than `frame_bytes` are truncated; sessions append to the file.
+    '''
+    def __init__(self, path:str, frame_bytes:int=256, capacity:int=1<<18, max_pending:int=4096) -> None:
+        super(CaptureDriver, self).__init__()
+        self.path = path
+        self.frame_bytes = frame_bytes
+        self.capacity = capacity
+        self.max_pending = max_pending
+
+        self.file = None
+        self.buf = None
+        self.record_size = None
+        self.num_record = 0
+        self.session = 0
+        self.pending = None
+        self.writer = None
+        self.num_write, self.num_dropped, self.num_truncated = 0, 0, 0
+
+    def on_init(self, what:Optional[Dict]=None) -> None:
+        if self.buf is None:
+            if not os.path.exists(self.path):
+                create_capture(self.path, self.frame_bytes, self.capacity)
+            header, records = open_capture(self.path)
+            self.frame_bytes = records.dtype['data'].shape[0]
+            self.record_size = records.dtype.itemsize
+            self.num_record = records.shape[0]
+            count = int(header['count'][0])
+            if count > 0:
+                self.session = int(records['session'][count-1]) + 1 # NOTE: appending to an earlier capture
+            # NOTE: the writer packs records into the raw mapping, no numpy per record
+            self.file = open(self.path, 'r+b')
+            self.buf = mmap.mmap(self.file.fileno(), 0)
+        else:
+            self.session += 1
+        if self.writer is None:
+            self.pending = queue.Queue(maxsize=self.max_pending)
+            self.writer = threading.Thread(target=self._write_records, daemon=True)
+            self.writer.start()
+
+    def _write_records(self) -> None:
+        buf = self.buf
+        count = struct.unpack_from('<Q', buf, COUNT_OFFSET)[0]
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            stamp, data = item
+            if count >= self.num_record:
+                self.num_dropped += 1 # NOTE: file is full
+                continue
+            n = min(len(data), self.frame_bytes)
+            self.num_truncated += int(n < len(data))
+            offset = HEADER_SIZE + count * self.record_size
+            RECORD_HEAD.pack_into(buf, offset, stamp, n, self.session)
+            offset += RECORD_HEAD.size
+            buf[offset:offset+n] = data[:n]
+            count += 1
+            struct.pack_into('<Q', buf, COUNT_OFFSET, count) # NOTE: a record is visible once counted
+            self.num_write += 1
+        buf.flush()
+
+    def on_next_frame(self, what:Optional[Dict]=None) -> None:
+        stamp = time.perf_counter()
+        frame = what['frame']
+        if isinstance(frame, RLEFrame):
+            frame = frame.decode()
+        # NOTE: copied, the writer thread must not see a buffer the stream reuses
+        data = frame if isinstance(frame, bytes) else np.asarray(frame, dtype=np.uint8).tobytes()
+        try:
+            self.pending.put_nowait((stamp, data))
+        except queue.Full:
+            self.num_dropped += 1 # NOTE: never block the frame loop on the disk
+
+    def on_pulse(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_resume(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_close(self, what:Optional[Dict]=None) -> None:
+        if self.writer is not None:
+            self.pending.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.buf is not None:
+            self.buf.close()
+            self.file.close()
+        self.file, self.buf = None, None
+
+    def on_status_acq(self, what:Optional[Dict]=None) -> Optional[StreamEvent]:
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'Capture', 'path': self.path,
+            'writes': self.num_write, 'dropped': self.num_dropped, 'truncated': self.num_truncated})
+
+class CaptureStream(StreamDataI):
+    '''
+    Replay a capture of `CaptureDriver`, one captured frame per frame;
+    `session` selects a single session of the file.
+    '''
+    def __init__(self, path:str, session:Optional[int]=None) -> None:
+        super(CaptureStream, self).__init__()
+        self.path = path
+        self.session = session
+        self.records = None # NOTE: memmap opened in the playing process
+        self.index = None
+        self.pos = 0
+
+        header, records = open_capture(path)
+        self.num_frame = self._select(records[:int(header['count'][0])]).shape[0]
+
+    def _select(self, records:np.ndarray) -> np.ndarray:
+        if self.session is None:
+            return np.arange(records.shape[0])
+        return np.flatnonzero(records['session'] == self.session)
+
+    def init_stream(self) -> None:
+        self._open()
+        self.rewind()
+
+    def _open(self) -> None:
+        header, records = open_capture(self.path)
+        self.records = records
+        self.index = self._select(records[:int(header['count'][0])])[:self.num_frame]
+
+    def getnframes(self) -> int:
+        return self.num_frame
+
+    def readframe(self, n:int=1) -> np.ndarray:
+        if self.records is None:
+            self._open()
+        recs = self.records[self.index[self.pos:self.pos+n]]
+        self.pos = min(self.num_frame, self.pos+n)
+        if recs.shape[0] == 1:
+            return recs['data'][0, :recs['length'][0]]
+        return np.concatenate([r['data'][:r['length']] for r in recs]) if recs.shape[0] > 0 else np.zeros(0, dtype=np.uint8)
+
+    def timestamps(self) -> np.ndarray:
+        '''capture time of every frame, seconds of `time.perf_counter`'''
+        if self.records is None:
+            self._open()
+        return np.asarray(self.records['stamp'][self.index])
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = min(self.num_frame, pos)
+
+    def close(self) -> None:
+        self.records, self.index = None, None
@@ -0,0 +1,565 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from multiprocessing import Queue
+from queue import Empty
+from typing import Dict, List, Optional, Tuple
+
+from .core import AudioFeatureBundle, FeatureBuilder
+from .core import StreamEvent, StreamEventType
+from .streams import WaveAudioStream, PCMAudioStream, VibrationStream, UARTCommandStream, MultiRateVibrationStream
+from .streams import LiveVibrationStream
+from .drivers import AudioDriver, LogDriver, PCF8591Driver, UARTDriver, NullDriver, FanoutDriver
+from .simdrivers import SimAudioDriver, SimPCF8591Driver, SimUARTDriver
+from .streamhandler import StreamHandler, AudioStreamHandler, LiveStreamHandler
+from .streamhandler import AudioStreamEvent, AudioStreamEventType
+from .processes import AudioProcess, VibrationProcess
+from .service import PlayerService
+from .trace import load_trace, replay_trace
+from .uartemu import UARTBoardEmulator
+from .netdriver import NetworkDriver, NetworkReceiver
+from .capture import CaptureDriver
+from .resample import RESAMPLE_METHODS
+from .playlist import PlaylistSession
+from .pcmcache import cache_pcm
+from .liveinput import PyAudioInputStream, FileInputStream
+from .autotune import score_trial, recommend, save_config, tuned_defaults, CONFIG_PATH
+
+AUDIO_DRIVERS = {'pyaudio': AudioDriver, 'null': NullDriver, 'sim': SimAudioDriver}
+VIB_DRIVERS = {
+    'pcf8591': PCF8591Driver, 'uart': UARTDriver, 'log': LogDriver, 'null': NullDriver,
+    # NOTE: simulated hardware timing, no board attached
+    'sim-pcf8591': SimPCF8591Driver,
+    'sim-pcf8591-fast': lambda: SimPCF8591Driver(bus_hz=400000),
+    'sim-uart': SimUARTDriver,
+    'net': NetworkDriver,
+    'capture': CaptureDriver,
+}
+
+PLAY_HELP = '''commands (type and press enter):
+    p          pause
+    r          resume
+    s <frame>  seek to audio frame
+    i          status of all devices
+    t          driver telemetry
+    q          quit
+end of input lets the track play to its end'''
+
+def load_bundle(opt) -> AudioFeatureBundle:
+    '''load a saved feature bundle, or build one from the audio with the given recipe'''
+    if opt.features is not None:
+        fb = AudioFeatureBundle.from_folder(opt.features)
+    else:
+        recipe = {name: {} for name in opt.recipe.split(',')}
+        # NOTE: one feature frame per audio frame
+        fb = FeatureBuilder(opt.audio, None, opt.len_frame).build_features(recipe)
+        if opt.save is not None:
+            fb.save(opt.save)
+    if fb.frame_len() != opt.len_frame:
+        # NOTE: audio frames must match the feature frames, e.g. a bundle saved before autotuning
+        print(f'bundle hop {fb.frame_len()} differs from --len-frame {opt.len_frame}, audio frames follow the bundle')
+        opt.len_frame = fb.frame_len()
+
+    # NOTE: vibration samples per second, used by paced drivers
+    opt.sample_rate = opt.len_vib_frame * fb.sample_rate() / fb.frame_len()
+    if opt.device_rate > 0:
+        opt.sample_rate = opt.device_rate * opt.num_channel
+    return fb
+
+def _audio_stream(opt):
+    if opt.pcm_cache:
+        # NOTE: decoded once into <audio>.pcm, frames are slices of the mapped cache
+        return PCMAudioStream(opt.audio, opt.len_frame)
+    return WaveAudioStream(opt.audio, opt.len_frame)
+
+def _vibrations(opt, fb:AudioFeatureBundle) -> List[VibrationStream]:
+    if opt.uart_mode is not None:
+        # NOTE: commands compiled once and cached next to the bundle
+        cache_dir = opt.features if opt.features is not None else opt.save
+        return [UARTCommandStream.from_feature_bundle(fb, opt.uart_mode, cache_dir) for _ in range(opt.num_vib)]
+    if opt.device_rate > 0:
+        # NOTE: the mode is rendered once at its control rate, converted per frame
+        return [MultiRateVibrationStream.from_feature_bundle(fb, opt.mode, opt.device_rate, opt.resample, opt.num_channel)
+            for _ in range(opt.num_vib)]
+    vibrations = [VibrationStream.from_feature_bundle(fb, opt.len_vib_frame, opt.mode) for _ in range(opt.num_vib)]
+    if opt.rle:
+        for v in vibrations:
+            v.enable_rle()
+    return vibrations
+
+def _vib_driver(opt):
+    if opt.devices > 1:
+        # NOTE: several devices in one vibration process, channels split among them
+        return FanoutDriver.split_channels([_device(opt) for _ in range(opt.devices)], opt.num_channel)
+    return _device(opt)
+
+def _device(opt):
+    if opt.driver == 'net':
+        return _net_device(opt)
+    if opt.driver == 'capture':
+        # NOTE: one file per driver, <capture>.<k> after the first
+        path = opt.capture if opt.num_capture == 0 else f'{opt.capture}.{opt.num_capture}'
+        opt.num_capture += 1
+        return CaptureDriver(path, frame_bytes=max(opt.len_vib_frame, 256))
+    if opt.driver != 'uart':
+        driver = VIB_DRIVERS[opt.driver]()
+        if opt.paced and hasattr(driver, 'enable_pacing'):
+            driver.enable_pacing(opt.sample_rate)
+        return driver
+    if opt.port != 'emu':
+        return UARTDriver(port=opt.port)
+    # NOTE: one virtual board per driver, the real pyserial path without hardware
+    emu = UARTBoardEmulator()
+    emu.start()
+    opt.emulators.append(emu)
+    return UARTDriver(port=emu.port)
+
+def _net_device(opt):
+    host, port = opt.host, opt.net_port
+    if host == 'local':
+        # NOTE: reference receiver in this process, plays into a null driver
+        receiver = NetworkReceiver(NullDriver(), '127.0.0.1', 0, opt.protocol)
+        receiver.start()
+        opt.emulators.append(receiver)
+        host, port = '127.0.0.1', receiver.port
+    return NetworkDriver(host, port, opt.protocol, opt.redundancy, opt.net_delay, opt.net_loss)
+
+def _stop_emulators(opt) -> List[Dict]:
+    for emu in opt.emulators:
+        emu.stop() # NOTE: network receivers play the frames still in flight first
+    return [emu.stats() for emu in opt.emulators]
+
+def _build_service(opt) -> PlayerService:
+    service = PlayerService.from_drivers(AUDIO_DRIVERS[opt.audio_driver](),
+        [_vib_driver(opt) for _ in range(opt.num_vib)])
+    if opt.realtime:
+        service.audio_proc.enable_realtime()
+        for p in service.vib_procs:
+            p.enable_realtime()
+    return service
+
+def _wait_end(service:PlayerService, idle:float=0.5) -> None:
+    # NOTE: a service pauses at the end of a track, wait until the position stops moving
+    last_pos, last_move = service.tell(), time.perf_counter()
+    while time.perf_counter() - last_move < idle:
+        time.sleep(0.05)
+        pos = service.tell()
+        if pos != last_pos:
+            last_pos, last_move = pos, time.perf_counter()
+
+def play(opt) -> int:
+    fb = load_bundle(opt)
+    service = _build_service(opt)
+    if opt.trace is not None:
+        service.audio_proc.enable_trace(opt.trace)
+    service.start()
+
+    num_frame = service.load_session(_audio_stream(opt), _vibrations(opt, fb), timeout=opt.timeout)
+    if num_frame < 0:
+        print('load session failed. exit...')
+        service.close()
+        return 1
+
+    print(PLAY_HELP)
+    service.play()
+    for line in sys.stdin:
+        cmd = line.split()
+        if len(cmd) == 0:
+            continue
+        if cmd[0] == 'q':
+            break
+        elif cmd[0] == 'p':
+            service.pause()
+        elif cmd[0] == 'r':
+            service.resume()
+        elif cmd[0] == 's' and len(cmd) > 1:
+            service.seek(min(max(int(cmd[1]), 0), num_frame))
+        elif cmd[0] == 'i':
+            for ack in service.status():
+                print(ack.what)
+        elif cmd[0] == 't':
+            print(service.telemetry())
+        else:
+            print(PLAY_HELP)
+    else:
+        _wait_end(service)
+
+    service.close()
+    for stats in _stop_emulators(opt):
+        print(stats)
+    return 0
+
+def _print_report(report:Dict, as_json:bool=False) -> None:
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f'{"setup stage":<12}{"ms":>12}')
+    for k, v in report['stages'].items():
+        print(f'{k:<12}{v:>12.2f}')
+    print(f'audio frames {report["num_frame"]}, {report["fps"]:.1f} fps ({report["speedup"]:.1f}x realtime), '
+        f'cpu {report["cpu_per_frame"]:.3f} ms/frame' + (f', {report["underruns"]} underruns' if report['underruns'] is not None else '')
+        + (f', {report["dropped_frames"]} NEXT_FRAME dropped for full vibration pipes' if report.get('dropped_frames') else ''))
+    for name, stats in report['jitter'].items():
+        if 'mean' not in stats:
+            print(f'{name}: {stats["num_frame"]} frames')
+            continue
+        print(f'{name}: {stats["num_frame"]} frames, interval ms mean {stats["mean"]:.3f} '
+            f'std {stats["std"]:.3f} p50 {stats["p50"]:.3f} p99 {stats["p99"]:.3f} max {stats["max"]:.3f}')
+    if len(report.get('frame_stages', {})) > 0:
+        print(f'{"per frame ms":<24}{"mean":>9}{"p50":>9}{"p99":>9}{"max":>9}')
+    for name, stages in report.get('frame_stages', {}).items():
+        for stage, stats in stages.items():
+            print(f'{name + " " + stage:<24}{stats["mean"]:>9.3f}{stats["p50"]:>9.3f}{stats["p99"]:>9.3f}{stats["max"]:>9.3f}')
+    for name, stats in report.get('writes', {}).items():
+        if 'mean' not in stats:
+            continue
+        print(f'{name} writes: {stats["num_write"]} in {stats["duration"]:.1f} ms, interval ms '
+            f'mean {stats["mean"]:.3f} p99 {stats["p99"]:.3f} max {stats["max"]:.3f}')
+    for i, stats in enumerate(report.get('boards', [])):
+        print(f'board{i}:', ', '.join(f'{k} {v:.3f}' if isinstance(v, float) else f'{k} {v}' for k, v in stats.items()))
+
+def bench(opt) -> int:
+    '''full pipeline, with the default null audio driver frames are not paced by a sound card'''
+    report, _, _ = run_bench(opt)
+    if report is None:
+        return 1
+    _print_report(report, opt.json)
+    return 0
+
+def run_bench(opt) -> Tuple[Optional[Dict], Dict, Dict]:
+    '''one pipeline run, returns the report, the frame timers and the write recorders'''
+    stages = {}
+    def stage(name, t):
+        stages[name] = (time.perf_counter() - t) * 1000.
+        return time.perf_counter()
+
+    t = time.perf_counter()
+    fb = load_bundle(opt)
+    t = stage('features', t)
+    vibrations = _vibrations(opt, fb)
+    audio = _audio_stream(opt)
+    t = stage('streams', t)
+
+    audio_handler = AudioStreamHandler(audio, AUDIO_DRIVERS[opt.audio_driver]())
+    audio_handler.disable_bar()
+    audio_proc = AudioProcess(audio_handler)
+    vib_procs = [VibrationProcess(StreamHandler(v, _vib_driver(opt))) for v in vibrations]
+    commands, results = Queue(), Queue()
+    audio_proc.set_event_queues(commands, results)
+    for p in vib_procs:
+        audio_proc.attach_vibration_proc(p)
+    timers = {'audio': audio_proc.enable_frame_timer()}
+    for i, p in enumerate(vib_procs):
+        timers[f'vibration{i}'] = p.enable_frame_timer()
+    # NOTE: where the time of every frame goes, per process
+    stage_timers = {'audio': audio_proc.enable_stage_timer()}
+    for i, p in enumerate(vib_procs):
+        stage_timers[f'vibration{i}'] = p.enable_stage_timer()
+    # NOTE: simulated drivers also record every bus write
+    writes = {}
+    for name, handler in [('audio', audio_handler)] + [(f'vibration{i}', p.get_handler()) for i, p in enumerate(vib_procs)]:
+        driver = handler.stream_driver
+        if hasattr(driver, 'writes'):
+            writes[name] = driver.writes
+        for j, child in enumerate(getattr(driver, 'drivers', [])):
+            if hasattr(child, 'writes'):
+                writes[f'{name}.{j}'] = child.writes
+    if opt.realtime:
+        for p in [audio_proc] + vib_procs:
+            p.enable_realtime()
+
+    cpu = os.times()
+    for p in vib_procs:
+        p.start()
+    audio_proc.start()
+    t = stage('spawn', t)
+
+    commands.put(StreamEvent(head=StreamEventType.STREAM_INIT))
+    try:
+        num_frame = results.get(timeout=opt.timeout).what['num_frame']
+    except Empty:
+        print('init session failed. exit...')
+        commands.put(StreamEvent(head=StreamEventType.STREAM_CLOSE))
+        return None, timers, writes
+    t = stage('init', t)
+
+    commands.put(AudioStreamEvent(head=AudioStreamEventType.AUDIO_START))
+    while audio_proc.is_alive():
+        audio_proc.join(timeout=0.1)
+    t = stage('playback', t)
+    for p in vib_procs:
+        p.join()
+    t = stage('drain', t)
+
+    playback = stages['playback'] / 1000.
+    fps = num_frame / playback if playback > 0 else 0.
+    # NOTE: cpu time of the joined worker processes, sleeping in drivers is not counted
+    cpu = os.times().children_user + os.times().children_system - cpu.children_user - cpu.children_system
+    report = {
+        'stages': stages,
+        'num_frame': num_frame,
+        'fps': fps,
+        'speedup': fps * opt.len_frame / fb.sample_rate(),
+        'cpu_per_frame': cpu * 1000. / max(num_frame, 1),
+        # NOTE: only a simulated sound card knows when its buffer ran dry
+        'underruns': audio_handler.stream_driver.underruns.value if hasattr(audio_handler.stream_driver, 'underruns') else None,
+        'dropped_frames': audio_proc.dropped_frames.value,
+        'jitter': {k: v.stats() for k, v in timers.items()},
+        'frame_stages': {k: v.stats() for k, v in stage_timers.items()},
+        'writes': {k: v.stats() for k, v in writes.items()},
+        'boards': _stop_emulators(opt),
+    }
+    return report, timers, writes
+
+def replay(opt) -> int:
+    fb = load_bundle(opt)
+    service = _build_service(opt)
+    service.audio_proc.stream_handler.disable_bar()
+    service.start()
+
+    def loader(record:Optional[Dict]=None) -> int:
+        return service.load_session(_audio_stream(opt), _vibrations(opt, fb), timeout=opt.timeout)
+    if loader() < 0:
+        print('load session failed. exit...')
+        service.close()
+        return 1
+
+    report = replay_trace(load_trace(opt.trace), service, opt.speed, loader)
+    service.close()
+    _stop_emulators(opt)
+    if opt.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for k, v in report.items():
+            if k != 'skipped_loads':
+                print(f'{k:<12}{v:>12.2f}')
+        if report['skipped_loads'] > 0:
+            print(f'{report["skipped_loads"]} STREAM_LOAD skipped, replay needs a loader for new sessions')
+    return 0
+
+def playlist(opt) -> int:
+    '''play tracks back to back, the next track is prepared while the current one plays'''
+    tracks = [opt.audio] + opt.tracks
+    header = cache_pcm(opt.audio)
+    opt.sample_rate = opt.len_vib_frame * header['rate'] / opt.len_frame
+    if opt.device_rate > 0:
+        opt.sample_rate = opt.device_rate * opt.num_channel
+    recipe = {name: {} for name in opt.recipe.split(',')}
+
+    service = _build_service(opt)
+    service.audio_proc.stream_handler.disable_bar()
+    # NOTE: bundles are built per track, --features only applies to the first one
+    session = PlaylistSession(service, [(a, opt.features if i == 0 else None) for i, a in enumerate(tracks)],
+        opt.len_frame, lambda fb: _vibrations(opt, fb), recipe)
+    if session.start(timeout=opt.timeout) < 0:
+        print('load session failed. exit...')
+        service.close()
+        return 1
+    t = time.perf_counter()
+    session.wait()
+    wall = time.perf_counter() - t
+    session.stop()
+
+    driver = service.audio_proc.stream_handler.stream_driver
+    stamps = driver.writes.timestamps() if hasattr(driver, 'writes') else None
+    service.close()
+    _stop_emulators(opt)
+
+    duration = session.num_sample / header['rate']
+    print(f'{len(session.starts)} tracks, {duration:.2f} s of audio played in {wall:.2f} s')
+    print('prepare ms:', ', '.join(f'{t*1000.:.1f}' for t in session.prepare_time))
+    if stamps is not None and stamps.shape[0] > 1:
+        # NOTE: write intervals around each track boundary, a gap shows as a long interval
+        intervals = np.diff(stamps) * 1000.
+        for start in session.starts[1:]:
+            k = start // opt.len_frame
+            print(f'boundary at frame {k}: write interval ms max {intervals[max(k-3, 0):k+3].max():.3f} '
+                f'(track mean {intervals.mean():.3f})')
+    return 0
+
+def autotune(opt) -> int:
+    '''run the pipeline for every hop and vibration frame size, persist the best one'''
+    native = opt.len_vib_frame
+    opt.features, opt.save = None, None # NOTE: the bundle is rebuilt for every hop
+    stream = _audio_stream(opt)
+    stream.init_stream()
+    sr = stream.getframerate()
+    stream.close()
+    trials = []
+    for len_frame in [int(h) for h in opt.hops.split(',')]:
+        for len_vib_frame in [int(v) for v in opt.vib_frames.split(',')]:
+            opt.len_frame, opt.len_vib_frame = len_frame, len_vib_frame
+            # NOTE: other vibration frame sizes than the mode renders are converted to the device rate
+            opt.device_rate = 0. if len_vib_frame == native else len_vib_frame / opt.num_channel * sr / len_frame
+            report, timers, writes = run_bench(opt)
+            if report is None:
+                print(f'hop {len_frame} vibration frame {len_vib_frame}: session failed')
+                continue
+
+            # NOTE: a blocking write returns when `latency` seconds are queued, this frame included
+            latency = getattr(AUDIO_DRIVERS[opt.audio_driver](), 'latency', 0.)
+            trial = score_trial(len_frame, len_vib_frame, sr, report, timers['audio'].timestamps(),
+                timers['vibration0'].timestamps(), latency)
+            # NOTE: the pair is replayed with the device rate it was measured at
+            trial.update(device_rate=opt.device_rate, resample=opt.resample, num_channel=opt.num_channel)
+            trials.append(trial)
+            print(', '.join(f'{k} {v:.3f}' if isinstance(v, float) else f'{k} {v}' for k, v in trial.items()))
+
+    best = recommend(trials, opt.jitter_budget)
+    if best is None:
+        print(f'no configuration meets the jitter budget of {opt.jitter_budget} ms')
+        steady = [t for t in trials if not t['underruns']]
+        if len(steady) > 0:
+            closest = min(steady, key=lambda t: t['jitter'])
+            print(f'closest: --len-frame {closest["len_frame"]} --len-vib-frame {closest["len_vib_frame"]} '
+                f'(jitter {closest["jitter"]:.2f} ms), try --jitter-budget or --realtime')
+        return 1
+    print(f'recommended: --len-frame {best["len_frame"]} --len-vib-frame {best["len_vib_frame"]} '
+        f'--device-rate {best["device_rate"]:.2f} (latency {best["latency"]:.2f} ms, jitter {best["jitter"]:.2f} ms)')
+    if not opt.dry_run:
+        save_config(dict(best, driver=opt.driver, audio_driver=opt.audio_driver, trials=trials), opt.config)
+        print(f'saved to {opt.config}')
+    return 0
+
+def live(opt) -> int:
+    '''vibration from a live input, the capture clock paces the pipeline'''
+    if opt.audio == 'mic':
+        source = PyAudioInputStream(opt.len_frame, opt.input_rate, opt.input_channels, opt.input_device, max_lag=opt.max_lag)
+    else:
+        # NOTE: a file captured at its sample rate stands in for the microphone
+        source = FileInputStream(opt.audio, opt.len_frame, opt.loop, max_lag=opt.max_lag)
+    opt.sample_rate = opt.len_vib_frame * source.getframerate() / opt.len_frame
+
+    audio_proc = AudioProcess(AudioStreamHandler(source, AUDIO_DRIVERS[opt.audio_driver]()))
+    audio_proc.stream_handler.disable_bar()
+    tap = audio_proc.enable_audio_tap(source.frame_bytes())
+    vib_procs, probes = [], []
+    for _ in range(opt.num_vib):
+        handler = LiveStreamHandler(LiveVibrationStream.from_live_mode(opt.live_mode, opt.len_vib_frame),
+            _vib_driver(opt), tap)
+        probes.append(handler.enable_latency_probe())
+        vib_procs.append(VibrationProcess(handler))
+    service = PlayerService(audio_proc, vib_procs)
+    if opt.realtime:
+        for p in [audio_proc] + vib_procs:
+            p.enable_realtime()
+
+    if service.init_session(timeout=opt.timeout) < 0:
+        print('init session failed. exit...')
+        service.close()
+        return 1
+    service.play()
+    if opt.duration > 0:
+        time.sleep(opt.duration)
+    else:
+        _wait_end(service)
+    acks = service.status()
+    service.close()
+    _stop_emulators(opt)
+
+    report = {'input': acks[0].what if len(acks) > 0 else {}}
+    for i, probe in enumerate(probes):
+        report[f'vibration{i}'] = dict(probe.stats(opt.latency_budget), **(acks[i+1].what if len(acks) > i+1 else {}))
+    if opt.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print('input:', ', '.join(f'{k} {v}' for k, v in report['input'].items()))
+    for i in range(opt.num_vib):
+        stats = report[f'vibration{i}']
+        if stats['num_frame'] == 0:
+            print(f'vibration{i}: no frames')
+            continue
+        print(f'vibration{i}: {stats["num_frame"]} frames, capture to actuator ms mean {stats["mean"]:.3f} '
+            f'p50 {stats["p50"]:.3f} p99 {stats["p99"]:.3f} max {stats["max"]:.3f}, '
+            f'{stats["over_budget"]} over the {opt.latency_budget} ms budget, '
+            f'{stats.get("tap_skipped", 0)} skipped, {stats.get("tap_overruns", 0)} overruns')
+    return 0
+
+def get_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog='python -m vib_music', description='headless vibration music player')
+    sub = p.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('audio', type=str, help='wave file, or any format librosa reads with --pcm-cache')
+    common.add_argument('--pcm-cache', action='store_true', help='play from a decoded and memory-mapped PCM cache')
+    common.add_argument('--features', type=str, default=None, help='saved feature bundle folder')
+    common.add_argument('--recipe', type=str, default='rmse', help='features to build if no bundle is given, comma separated')
+    common.add_argument('--save', type=str, default=None, help='save the built bundle to this folder')
+    common.add_argument('--mode', type=str, default='rmse_mode', help='vibration mode')
+    common.add_argument('--uart-mode', type=str, default=None, help='precompiled uart command mode, e.g. rmse_uart_mode')
+    tuned = tuned_defaults()
+    common.add_argument('--len-frame', type=int, default=tuned['len_frame'], help='audio samples per frame (feature hop), autotuned if saved')
+    common.add_argument('--len-vib-frame', type=int, default=tuned['len_vib_frame'], help='vibration samples per frame, autotuned if saved')
+    common.add_argument('--device-rate', type=float, default=tuned['device_rate'],
+        help='vibration samples per second per channel, 0 follows the audio frames, autotuned if saved')
+    common.add_argument('--resample', choices=RESAMPLE_METHODS, default=tuned['resample'], help='conversion to the device rate, autotuned if saved')
+    common.add_argument('--num-vib', type=int, default=1, help='number of vibration processes')
+    common.add_argument('--realtime', action='store_true', help='apply realtime settings to all processes')
+    common.add_argument('--timeout', type=float, default=10., help='session load timeout in seconds')
+    common.add_argument('--json', action='store_true', help='print reports as json')
+    common.add_argument('--devices', type=int, default=1, help='devices driven by each vibration process (fan-out)')
+    common.add_argument('--num-channel', type=int, default=tuned['num_channel'], help='channels interleaved in a vibration frame, autotuned if saved')
+    common.add_argument('--rle', action='store_true', help='run-length encoded vibration frames, drivers write only changes')
+    common.add_argument('--paced', action='store_true', help='pcf8591 drivers emit samples at the vibration sample rate')
+    common.add_argument('--port', type=str, default='/dev/ttyS0', help='serial device of the uart driver, "emu" starts a virtual board')
+    common.add_argument('--capture', type=str, default='vib.cap', help='capture file of the capture driver')
+    common.add_argument('--host', type=str, default='local', help='receiver of the net driver, "local" starts one per driver')
+    common.add_argument('--net-port', type=int, default=9000, help='receiver port of the net driver')
+    common.add_argument('--protocol', choices=['udp', 'tcp'], default='udp', help='transport of the net driver')
+    common.add_argument('--redundancy', type=int, default=0, help='previous frames repeated in every udp packet')
+    common.add_argument('--net-delay', type=float, default=0.02, help='seconds between sending and playing a frame')
+    common.add_argument('--net-loss', type=float, default=0., help='simulated packet loss of the net driver')
+
+    pp = sub.add_parser('play', parents=[common], help='play with stdin control')
+    pp.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='pcf8591')
+    pp.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='pyaudio')
+    pp.add_argument('--trace', type=str, default=None, help='record an event trace to this file')
+
+    bp = sub.add_parser('bench', parents=[common], help='run the pipeline faster than realtime')
+    bp.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='null')
+    bp.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='null')
+
+    rp = sub.add_parser('replay', parents=[common], help='replay a recorded event trace')
+    rp.add_argument('trace', type=str)
+    rp.add_argument('--speed', type=float, default=1.0, help='0 replays as fast as possible')
+    rp.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='null')
+    rp.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='null')
+
+    lp = sub.add_parser('playlist', parents=[common], help='gapless playback of several tracks')
+    lp.add_argument('tracks', type=str, nargs='*', help='tracks played after the first one')
+    lp.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='null')
+    lp.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='sim')
+
+    ap = sub.add_parser('autotune', parents=[common], help='find the lowest latency frame sizes within a jitter budget')
+    ap.add_argument('--hops', type=str, default='256,512,1024', help='candidate audio hops, comma separated')
+    ap.add_argument('--vib-frames', type=str, default='24', help='candidate vibration frame lengths, comma separated')
+    ap.add_argument('--jitter-budget', type=float, default=3.0, help='p99 frame interval error in ms')
+    ap.add_argument('--config', type=str, default=CONFIG_PATH, help='where the recommendation is saved')
+    ap.add_argument('--dry-run', action='store_true', help='do not save the recommendation')
+    ap.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='sim-pcf8591-fast')
+    ap.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='sim')
+
+    vp = sub.add_parser('live', parents=[common], help='vibration from a live input, audio is "mic" or a file captured in realtime')
+    vp.add_argument('--driver', choices=VIB_DRIVERS.keys(), default='pcf8591')
+    vp.add_argument('--audio-driver', choices=AUDIO_DRIVERS.keys(), default='null', help='monitor output of the input')
+    vp.add_argument('--input-device', type=int, default=None, help='pyaudio input device index')
+    vp.add_argument('--input-rate', type=int, default=44100)
+    vp.add_argument('--input-channels', type=int, default=1)
+    vp.add_argument('--max-lag', type=int, default=2, help='captured frames kept when the pipeline falls behind')
+    vp.add_argument('--loop', action='store_true', help='loop the file input')
+    vp.add_argument('--duration', type=float, default=0., help='seconds to run, 0 until the input ends')
+    vp.add_argument('--latency-budget', type=float, default=20., help='capture to actuator latency in ms')
+    vp.add_argument('--live-mode', type=str, default='live_rmse_mode', help='live vibration mode')
+
+    return p
+
+def main(argv:Optional[List[str]]=None) -> int:
+    opt = get_parser().parse_args(argv)
+    opt.emulators = []
+    opt.num_capture = 0
+    return {'play': play, 'bench': bench, 'replay': replay, 'playlist': playlist,
+        'autotune': autotune, 'live': live}[opt.command](opt)
@@ -0,0 +1,174 @@
+import os
+import struct
+import pickle
+import socket
+from queue import Empty
+from collections import deque
+from enum import IntEnum
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional, Tuple, Type
+
+from .StreamEvent import StreamEventType, StreamEvent
+
+# NOTE: head, flags, pos, seq; most control events fit the header only
+EVENT_HEADER = struct.Struct('<BBqq')
+HAS_POS = 0x01
+HAS_SEQ = 0x02
+HAS_EXTRA = 0x04
+# NOTE: message length prefix of `Connection.send_bytes`
+MSG_LENGTH = struct.Struct('!i')
+
+EVENT_TYPES:Dict[int, IntEnum] = {}
+
+def register_event_types(event_types:Type[IntEnum]) -> None:
+    # NOTE: first registered enum wins for shared values, e.g. STREAM_SEEK
+    for e in event_types:
+        EVENT_TYPES.setdefault(int(e), e)
+
+register_event_types(StreamEventType)
+
+def encode_event(event:StreamEvent) -> bytes:
+    flags, pos, seq = 0, 0, 0
+    extra = {}
+    for k, v in event.what.items():
+        if k == 'pos' and type(v) is int:
+            flags, pos = flags | HAS_POS, v
+        elif k == 'seq' and type(v) is int:
+            flags, seq = flags | HAS_SEQ, v
+        else:
+            extra[k] = v
+
+    header = EVENT_HEADER.pack(int(event.head), flags | (HAS_EXTRA if extra else 0), pos, seq)
+    if not extra:
+        return header
+    # NOTE: rare large payloads (new session, status) are pickled after the header
+    return header + pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode_event(buf:bytes) -> StreamEvent:
+    head, flags, pos, seq = EVENT_HEADER.unpack_from(buf)
+    what = {}
+    if flags & HAS_POS:
+        what['pos'] = pos
+    if flags & HAS_SEQ:
+        what['seq'] = seq
+    if flags & HAS_EXTRA:
+        what.update(pickle.loads(buf[EVENT_HEADER.size:]))
+    return StreamEvent(EVENT_TYPES.get(head, head), what)
+
+class StreamChannel(object):
+    '''
+    One end of a duplex pipe carrying encoded stream events.
+
+    Mirrors the `put`/`get` interface of `multiprocessing.Queue` without a
+    feeder thread, and exposes `fileno` for `multiprocessing.connection.wait`.
+    `put` blocks while the pipe is full, the frame loop sends with `post` and
+    `offer` instead, which never wait for a slow reader.
+    '''
+    def __init__(self, conn:Connection) -> None:
+        super(StreamChannel, self).__init__()
+        self.conn = conn
+        # NOTE: control events waiting for room in the pipe, in sending order
+        self.backlog = deque()
+        # NOTE: unsent rest of a message the pipe took only in part, goes out first
+        self.partial:Optional[memoryview] = None
+        self.sock:Optional[socket.socket] = None
+
+    @classmethod
+    def pair(cls) -> Tuple['StreamChannel', 'StreamChannel']:
+        a, b = Pipe(duplex=True)
+        return cls(a), cls(b)
+
+    def put(self, event) -> None:
+        if self.partial is not None or len(self.backlog) > 0:
+            self.flush(block=True) # NOTE: keep the order of events sent without waiting
+        if isinstance(event, list):
+            # NOTE: collected acks, not a single event
+            self.conn.send(event)
+        else:
+            self.conn.send_bytes(encode_event(event))
+
+    def _send_partial(self) -> bool:
+        '''send the rest of a partly sent message while the pipe has room, True when it is out'''
+        while self.partial is not None:
+            try:
+                n = self.sock.send(self.partial, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return False
+            self.partial = self.partial[n:] if n < len(self.partial) else None
+        return True
+
+    def _send_nowait(self, buf:bytes) -> bool:
+        '''write a message unless the pipe is full, framed like `Connection.send_bytes`'''
+        if self.sock is None:
+            # NOTE: duplex pipes are unix socket pairs, the duplicate is created in the sending process
+            self.sock = socket.socket(fileno=os.dup(self.conn.fileno()))
+        if not self._send_partial():
+            return False
+        msg = MSG_LENGTH.pack(len(buf)) + buf
+        try:
+            n = self.sock.send(msg, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return False
+        if n < len(msg):
+            # NOTE: a large payload (LOAD, APPEND) is sent by later flushes, nothing else goes in between
+            self.partial = memoryview(msg)[n:]
+        return True
+
+    def flush(self, block:bool=False) -> bool:
+        '''send the backlog while the pipe has room, or all of it when `block`; True when nothing is left'''
+        if self.partial is not None:
+            if block:
+                self.sock.sendall(self.partial)
+                self.partial = None
+            elif not self._send_partial():
+                return False
+        backlog = self.backlog
+        while len(backlog) > 0:
+            if block:
+                self.conn.send_bytes(encode_event(backlog[0]))
+            elif not self._send_nowait(encode_event(backlog[0])):
+                break
+            backlog.popleft()
+        return len(backlog) == 0
+
+    def post(self, event:StreamEvent) -> None:
+        '''send without waiting, kept in the backlog while the pipe is full'''
+        if self.flush() and self._send_nowait(encode_event(event)):
+            return
+        if event.head == StreamEventType.STREAM_SEEK:
+            # NOTE: seeks are absolute, a pending one is out of date
+            self.backlog = deque(e for e in self.backlog if e.head != StreamEventType.STREAM_SEEK)
+        self.backlog.append(event)
+
+    def offer(self, event:StreamEvent) -> bool:
+        '''send if nothing is pending and the pipe has room, False when the event is dropped'''
+        return self.flush() and self._send_nowait(encode_event(event))
+
+    def get(self, block:bool=True, timeout:Optional[float]=None):
+        if not block:
+            timeout = 0.
+        if timeout is not None and not self.conn.poll(timeout):
+            raise Empty
+        buf = self.conn.recv_bytes()
+        if buf[:1] == b'\x80':
+            return pickle.loads(buf) # NOTE: pickled list sent by `put`, event heads are < 0x80
+        return decode_event(buf)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def fileno(self) -> int:
+        return self.conn.fileno()
+
+    def close(self) -> None:
+        self.partial = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.conn.close()
+
+def wait_channels(channels:List[StreamChannel], timeout:Optional[float]=None) -> List[StreamChannel]:
+    '''channels ready to `get`, see `multiprocessing.connection.wait`'''
+    ready = wait([c.conn for c in channels], timeout)
+    return [c for c in channels if c.conn in ready]
@@ -10,6 +10,7 @@ class StreamDriverBase(abc.ABC):
     def __init__(self) -> None:
         super(StreamDriverBase, self).__init__()
         self.stream = None
+        self.telemetry = None # shared ring of device status, see `enable_telemetry`
 
         # stream handlers
         self.handlers = {
@@ -38,12 +39,28 @@ class StreamDriverBase(abc.ABC):
     
     @abc.abstractmethod
     def on_next_frame(self, what:Optional[Dict]=None) -> None:
+        '''
+        `what` is a new dict for every frame, but `what['frame']` may be a buffer
+        the stream fills again for a later frame (`readinto`, `MultiRateVibrationStream`);
+        a driver keeping the frame past this call (writer threads, queues) copies it
+        '''
         raise NotImplementedError()
     
     @abc.abstractmethod
     def on_close(self, what:Optional[Dict]=None) -> None:
         raise NotImplementedError()
     
+    def enable_telemetry(self, num_slot:int=64):
+        # NOTE: create before the driver process starts, so both sides share the ring
+        from ..telemetry import TelemetryRing
+        self.telemetry = TelemetryRing(num_slot)
+        return self.telemetry
+
+    def telemetry_snapshot(self) -> Optional[Dict]:
+        if self.telemetry is None:
+            return None
+        return self.telemetry.snapshot()
+
     def on_event(self, event:StreamEvent) -> Optional[StreamEvent]:
         return self.handlers[event.header](event.what)
     
\ No newline at end of file
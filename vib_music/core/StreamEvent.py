@@ -9,9 +9,12 @@ class StreamEventType(IntEnum):
     STREAM_CLOSE = auto()
     # event handled by a stream data
     STREAM_SEEK = auto()
+    STREAM_LOAD = auto()
     # events handled by a stream handler?
     STREAM_STATUS_ACQ = auto()
     STREAM_STATUS_ACK = auto()
+    # NOTE: next track of a playlist, fixed value so later types keep theirs
+    STREAM_APPEND = 16
 
 class StreamEvent(NamedTuple):
     head: StreamEventType 
@@ -3,4 +3,5 @@ from .FeatureBuilder import FeatureBuilder
 from .FeaturePlotter import FeaturePlotter
 from .StreamData import StreamDataI, AudioStreamI
 from .StreamEvent import StreamEventType, StreamEvent 
-from .StreamDriver import StreamError, StreamDriverBase
\ No newline at end of file
+from .StreamDriver import StreamError, StreamDriverBase
+from .StreamChannel import StreamChannel, register_event_types, wait_channels
@@ -1,11 +1,17 @@
 import time
+import queue
+import struct
 import logging
-from typing import Optional, Dict
+import threading
+import numpy as np
+from typing import Optional, Dict, List
 
 from vib_music.core.StreamEvent import StreamEvent
 
 from .core import StreamEvent, StreamEventType
 from .core import StreamDriverBase, StreamError
+from .realtime import sleep_until
+from .framecodec import RLEFrame, rle_encode
 
 class LogDriver(StreamDriverBase):
     def __init__(self) -> None:
@@ -14,6 +20,10 @@ class LogDriver(StreamDriverBase):
         self.use_logger = True
     
     def on_init(self, what:Optional[Dict]=None) -> None:
+        if self.stream is not None:
+            self.stream.info('LogDriver New Session!')
+            return
+
         self.stream = logging.getLogger('LogDriver')
         self.stream.setLevel(logging.DEBUG)
 
@@ -42,12 +52,39 @@ class LogDriver(StreamDriverBase):
     
     
     def on_close(self, what: Optional[Dict] = None) -> None:
+        if self.stream is None:
+            return
         self.stream.info('LogDriver Is Closing...')
         handlers = self.stream.handlers[:]
         for h in handlers:
             self.stream.removeHandler(h)
             h.close()
         logging.shutdown()
+        self.stream = None
+
+class NullDriver(StreamDriverBase):
+    '''discard every frame, stream engine runs as fast as it can (benchmarks)'''
+    def __init__(self) -> None:
+        super(NullDriver, self).__init__()
+        self.num_write = 0
+
+    def on_init(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_next_frame(self, what:Optional[Dict]=None) -> None:
+        self.num_write += 1
+
+    def on_pulse(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_resume(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_close(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_status_acq(self, what:Optional[Dict]=None) -> Optional[StreamEvent]:
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'NullDriver', 'writes': self.num_write})
 
 class AudioDriver(StreamDriverBase):
     def __init__(self) -> None:
@@ -55,21 +92,39 @@ class AudioDriver(StreamDriverBase):
 
         self.audio = None # PyAudio object
         self.stream = None
+        self.stream_format = None
     
     def on_init(self, what: Dict) -> None:
         from .dependency import PyAudio
-        self.audio = PyAudio()
+        if self.audio is None:
+            self.audio = PyAudio()
+
+        stream_format = (what['format'], what['channels'], what['rate'])
+        if self.stream is not None and self.stream_format == stream_format:
+            # NOTE: a new session with the same format reuses the opened stream
+            if self.stream.is_stopped():
+                self.stream.start_stream()
+            return
+
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
         self.stream = self.audio.open(
             format=self.audio.get_format_from_width(what['format']),
             channels=what['channels'],
             rate = what['rate'],
             output=True
         )
+        self.stream_format = stream_format
     
     def on_close(self, what: Optional[Dict] = None) -> None:
-        self.stream.stop_stream()
-        self.stream.close()
+        if self.audio is None:
+            return # NOTE: no session was ever loaded
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
         self.audio.terminate()
+        self.stream, self.audio, self.stream_format = None, None, None
     
     def on_pulse(self, what:Optional[Dict]=None) -> None:
         self.stream.stop_stream()
@@ -90,82 +145,387 @@ class AudioDriver(StreamDriverBase):
         return None
 
 class PCF8591Driver(StreamDriverBase):
-    def __init__(self) -> None:
+    ADDR = 0x48
+    DAC_ENABLE = 0x40 # control byte, every following data byte updates the DAC
+    MAX_BLOCK = 32 # SMBus block write limit
+
+    def __init__(self, sample_rate:Optional[float]=None) -> None:
         super(PCF8591Driver, self).__init__()
         self.stream = None
+        self.num_write, self.num_error, self.last_write = 0, 0, 0.
+        self.enable_telemetry()
+
+        # NOTE: samples per second of the vibration signal, None writes each frame in a burst
+        self.sample_rate = sample_rate
+        self.frames, self.pacer, self.pacer_exit = None, None, None
+        # NOTE: the DAC holds its last value, samples equal to it need no write
+        self.dac_value, self.num_skipped = None, 0
+
+    def enable_pacing(self, sample_rate:float) -> None:
+        '''emit samples from a thread at `sample_rate`, e.g. len_vib_frame * sr / len_hop'''
+        self.sample_rate = sample_rate
 
     def on_init(self, what: Optional[Dict] = None) -> None:
-        from .dependency import smbus
-        self.stream = smbus.SMBus(1)
+        if self.stream is None:
+            self.stream = self.open_bus() # NOTE: keep the bus opened between sessions
         # raise StreamError('Init PCF8591 failed. SMBus not installed.')
 
+        if self.sample_rate is not None and self.pacer is None:
+            self.frames = queue.Queue(maxsize=4)
+            self.pacer_exit = threading.Event()
+            self.pacer = threading.Thread(target=self._paced_output, daemon=True)
+            self.pacer.start()
+
+    def open_bus(self):
+        from .dependency import smbus
+        return smbus.SMBus(1)
+
+    def _write_block(self, samples:List[int]) -> None:
+        # NOTE: one transaction per 32 samples instead of one per sample
+        for i in range(0, len(samples), self.MAX_BLOCK):
+            try:
+                self.stream.write_i2c_block_data(self.ADDR, self.DAC_ENABLE, samples[i:i+self.MAX_BLOCK])
+            except OSError:
+                self.num_error += 1 # NOTE: a lost sample should not stop the stream
+
+    def _write_sample(self, sample:int) -> None:
+        try:
+            self.stream.write_byte_data(self.ADDR, self.DAC_ENABLE, sample)
+        except OSError:
+            self.num_error += 1
+
+    def _frame_written(self) -> None:
+        self.num_write += 1
+        self.last_write = time.time()
+        # NOTE: no feedback from the chip, publish write statistics of each frame
+        if self.telemetry is not None:
+            self.telemetry.publish(self.last_write, self.num_write, self.num_error)
+
+    def _paced_output(self) -> None:
+        period = 1. / self.sample_rate
+        deadline = None
+        # NOTE: frames queued before closing are still played
+        while not (self.pacer_exit.is_set() and self.frames.empty()):
+            try:
+                runs = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                deadline = None # NOTE: paused or starved, restart the sample clock
+                continue
+            num_sample = len(runs)
+            # NOTE: one write per run, the DAC holds the value for the rest of it
+            for a, n in zip(runs.values.tolist(), runs.lengths.tolist()):
+                now = time.perf_counter()
+                if deadline is None or now - deadline > period * num_sample:
+                    deadline = now # NOTE: a frame late, restart instead of bursting to catch up
+                if a == self.dac_value:
+                    self.num_skipped += n
+                else:
+                    sleep_until(deadline, spin=min(period, 0.0005))
+                    self._write_sample(a)
+                    self.dac_value = a
+                    self.num_skipped += n - 1
+                deadline += period * n
+            self._frame_written()
+
     def on_next_frame(self, what: Optional[Dict] = None) -> None:
-        for a in what['frame']:
-            self.stream.write_byte_data(0x48, 0x40, a)
+        frame = what['frame']
+        if self.pacer is None:
+            if isinstance(frame, RLEFrame):
+                if frame.values.shape[0] == 1 and frame.values[0] == self.dac_value:
+                    # NOTE: constant frame the DAC already holds, e.g. silence
+                    self.num_skipped += len(frame)
+                    self._frame_written()
+                    return
+                frame = frame.decode()
+            samples = frame.tolist() if hasattr(frame, 'tolist') else [int(a) for a in frame]
+            self._write_block(samples)
+            self.dac_value = samples[-1]
+            self._frame_written()
+            return
+
+        runs = frame if isinstance(frame, RLEFrame) else rle_encode(frame)
+        try:
+            # NOTE: at most one frame period of backpressure, then drop the frame
+            self.frames.put(runs, timeout=len(runs) / self.sample_rate)
+        except queue.Full:
+            self.num_error += 1
 
     def on_close(self, what: Optional[Dict] = None) -> None:
         # close the device?
+        if self.pacer is not None:
+            self.pacer_exit.set()
+            self.pacer.join()
+            self.pacer = None
         return
 
-    # TODO: return vibration hardware status
     def on_status_acq(self, what: Optional[Dict] = None) -> Optional[StreamEvent]:
-        return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'PCF8591'})
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK,
+            {'status': 'PCF8591', 'telemetry': self.telemetry_snapshot(), 'skipped': self.num_skipped})
+
 
+class FanoutDriver(StreamDriverBase):
+    '''
+    Drive several devices from one vibration process, each child driver runs
+    in its own worker thread and gets its channel slice of every frame.
+
+    drivers: child drivers, e.g. mixed PCF8591/UART drivers
+    routes: channel indices of each child, None sends every child the whole frame
+    num_channel: channels interleaved in a frame, e.g. 8 for `rmse_mode`
+    '''
+    def __init__(self, drivers:List[StreamDriverBase], routes:Optional[List[List[int]]]=None,
+        num_channel:int=8, max_pending:int=2, capacity:int=1024) -> None:
+        super(FanoutDriver, self).__init__()
+        if routes is not None and len(routes) != len(drivers):
+            raise ValueError(f'expect {len(drivers)} routes, got {len(routes)}')
+        self.drivers = drivers
+        self.routes = None if routes is None else [np.asarray(r) for r in routes]
+        self.num_channel = num_channel
+        self.max_pending = max_pending
+
+        # NOTE: enqueue to written latency of the last `capacity` frames of each device
+        self.latency = np.zeros((len(drivers), capacity))
+        self.num_frame = [0] * len(drivers)
+        self.num_error = [0] * len(drivers)
+        self.queues, self.workers = None, None
+
+    @classmethod
+    def split_channels(cls, drivers:List[StreamDriverBase], num_channel:int=8, **kwargs):
+        '''split `num_channel` channels evenly among the drivers'''
+        routes = [r.tolist() for r in np.array_split(np.arange(num_channel), len(drivers))]
+        return cls(drivers, routes, num_channel, **kwargs)
+
+    def on_init(self, what:Optional[Dict]=None) -> None:
+        for d in self.drivers:
+            d.on_init(what)
+        if self.workers is not None:
+            return
+        self.queues = [queue.Queue(maxsize=self.max_pending) for _ in self.drivers]
+        self.workers = [threading.Thread(target=self._drive, args=(i,), daemon=True)
+            for i in range(len(self.drivers))]
+        for w in self.workers:
+            w.start()
+
+    def _drive(self, i:int) -> None:
+        driver, frames = self.drivers[i], self.queues[i]
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            enqueued, what = item
+            try:
+                driver.on_next_frame(what)
+            except Exception:
+                self.num_error[i] += 1 # NOTE: a failing device should not stop the others
+            n = self.num_frame[i]
+            self.latency[i, n % self.latency.shape[1]] = time.perf_counter() - enqueued
+            self.num_frame[i] = n + 1
+
+    def on_next_frame(self, what:Optional[Dict]=None) -> None:
+        frame = what.get('frame') if what is not None else None
+        if isinstance(frame, RLEFrame):
+            frame = frame.decode()
+        if self.routes is not None and frame is not None:
+            frame = np.asarray(frame)
+            # NOTE: a partial last frame is cut to whole time steps
+            steps = frame[:frame.shape[0] // self.num_channel * self.num_channel].reshape((-1, self.num_channel))
+
+        # NOTE: workers write later, children get a snapshot and never a buffer the stream fills again
+        snapshot = {} if what is None else dict(what)
+        if self.routes is None and frame is not None:
+            if isinstance(frame, memoryview):
+                snapshot['frame'] = bytes(frame)
+            elif isinstance(frame, np.ndarray):
+                snapshot['frame'] = frame.copy()
+
+        now = time.perf_counter()
+        for i, frames in enumerate(self.queues):
+            child_what = snapshot
+            if self.routes is not None and frame is not None:
+                child_what = dict(snapshot)
+                child_what['frame'] = steps[:, self.routes[i]].ravel()
+            # NOTE: blocks only when a device is `max_pending` frames behind
+            frames.put((now, child_what))
+
+    def _stop_workers(self) -> None:
+        if self.workers is None:
+            return
+        for frames in self.queues:
+            frames.put(None) # NOTE: pending frames are written first
+        for w in self.workers:
+            w.join()
+        self.queues, self.workers = None, None
+
+    def on_pulse(self, what:Optional[Dict]=None) -> None:
+        for d in self.drivers:
+            d.on_pulse(what)
+
+    def on_resume(self, what:Optional[Dict]=None) -> None:
+        for d in self.drivers:
+            d.on_resume(what)
+
+    def on_close(self, what:Optional[Dict]=None) -> None:
+        self._stop_workers()
+        for d in self.drivers:
+            d.on_close(what)
+
+    def latency_stats(self) -> List[Dict]:
+        '''per-device latency in ms, from frame routing to the child write returning'''
+        stats = []
+        for i, n in enumerate(self.num_frame):
+            lat = self.latency[i, :min(n, self.latency.shape[1])] * 1000.
+            if lat.shape[0] == 0:
+                stats.append({'num_frame': n})
+                continue
+            stats.append({'num_frame': n, 'errors': self.num_error[i], 'mean': float(lat.mean()),
+                'p99': float(np.percentile(lat, 99)), 'max': float(lat.max())})
+        return stats
+
+    def on_status_acq(self, what:Optional[Dict]=None) -> Optional[StreamEvent]:
+        devices = []
+        for d in self.drivers:
+            ack = d.on_status_acq(what)
+            devices.append(None if ack is None else ack.what)
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK,
+            {'status': 'Fanout', 'devices': devices, 'latency': self.latency_stats()})
 
 class PWMDriver(StreamDriverBase):
     pass
 
 import serial
+from .uartcommands import CHANNEL_MAP, encode_channels
 class UARTDriver(StreamDriverBase):
-    CHANNEL_MAP = {'Z': 0b01, '0': 0b00, '1': 0b10}
-    def __init__(self) -> None:
+    CHANNEL_MAP = CHANNEL_MAP
+    # NOTE: BC 01 <channels> <voltage> <duty> <freq> AF AA FF DF
+    CMD_STRUCT = struct.Struct('>BBBBBH4s')
+    CMD_TAIL = bytes.fromhex('AFAAFFDF')
+    CMD_OFF = bytes.fromhex('BC0100000000000000FFFFFFDF')
+
+    def __init__(self, port:str='/dev/ttyS0', baudrate:int=115200, min_interval:float=0.,
+        max_pending:int=4) -> None:
         super(UARTDriver, self).__init__()
+        self.port = port # e.g. the pty of `uartemu.UARTBoardEmulator`
+        self.baudrate = baudrate
+        self.min_interval = min_interval # NOTE: board spec between commands, the baud rate is always respected
+        self.max_pending = max_pending
         self.stream = None
         self.last_cmd = None
         self.last_feedback = None
+        self.channel_controls = {} # NOTE: encoded channel byte of each 'CH' string
+
+        self.num_write, self.num_error, self.last_write = 0, 0, 0.
+        self.num_suppressed, self.num_dropped = 0, 0
+        self.enable_telemetry()
+        self.reader, self.reader_exit = None, None
+        self.commands, self.writer = None, None
     
     def on_init(self, what: Optional[Dict] = None) -> None:
-        self.stream = serial.Serial('/dev/ttyS0', 115200, timeout=0.01)
+        if self.stream is not None and self.stream.is_open:
+            return # NOTE: keep the port opened between sessions
+        self.stream = self.open_port()
         # send init signals?
+
+        # NOTE: feedback is read in background, frame loop and status never wait for it
+        self.reader_exit = threading.Event()
+        self.reader = threading.Thread(target=self._read_feedback, daemon=True)
+        self.reader.start()
+        # NOTE: commands are written in background, the frame loop only encodes them
+        self.commands = queue.Queue(maxsize=self.max_pending)
+        self.writer = threading.Thread(target=self._write_commands, daemon=True)
+        self.writer.start()
+
+    def open_port(self):
+        return serial.Serial(self.port, self.baudrate, timeout=0.01)
+
+    def _read_feedback(self) -> None:
+        while not self.reader_exit.is_set():
+            try:
+                feedback = self.stream.read(7)
+            except Exception:
+                self.num_error += 1
+                continue
+            if len(feedback) != 7:
+                continue # NOTE: read timeout, no command sent recently
+            self.last_feedback = feedback
+            self.telemetry.publish(self.last_write, self.num_write, self.num_error,
+                [int(x)/255*16 for x in feedback[1:5]])
+
+    def _write_commands(self) -> None:
+        byte_time = 10. / self.baudrate # NOTE: 8N1
+        next_write = 0.
+        while True:
+            cmd = self.commands.get()
+            if cmd is None:
+                return
+            sleep_until(next_write, spin=0.0002)
+            try:
+                self.stream.write(cmd)
+            except Exception:
+                self.num_error += 1
+                continue
+            self.num_write += 1
+            self.last_write = time.time()
+            # NOTE: do not queue up in the OS buffer, the latest command should go out next
+            next_write = time.perf_counter() + max(len(cmd) * byte_time, self.min_interval)
+
+    def encode_command(self, what:Dict) -> bytes:
+        CH = what.get('CH', '1 0 Z Z')
+        channel_control = self.channel_controls.get(CH)
+        if channel_control is None:
+            channel_control = encode_channels(CH)
+            self.channel_controls[CH] = channel_control
+
+        volt = min(max(int(what.get('voltage', 180)), 0), 255)
+        freq = min(max(int(what.get('freq', 1000)), 0), 0xFFFF)
+        duty = min(max(int(what.get('duty', 50)), 0), 100)
+        return self.CMD_STRUCT.pack(0xBC, 0x01, channel_control, volt, duty*2+1, freq, self.CMD_TAIL)
     
     def on_next_frame(self, what: Optional[Dict] = None) -> None:
         if what is None:
             return
 
-        CH0, CH1, CH2, CH3 = what.get('CH', '1 0 Z Z').split(' ')
-        channel_control = 0
-        for c in [CH3, CH2, CH1, CH0]:
-            channel_control = (channel_control << 2) | self.CHANNEL_MAP[c]
-
-        volt = what.get('voltage', 180)
-        freq = what.get('freq', 1000)
-        duty = what.get('duty', 50)
+        cmd = what.get('frame')
+        if not isinstance(cmd, (bytes, memoryview)):
+            cmd = self.encode_command(what)
+        # NOTE: else a command compiled ahead of time (`UARTCommandStream`), written as is
+        if cmd == self.last_cmd:
+            self.num_suppressed += 1 # NOTE: the board keeps its last setting
+            return
+        self.last_cmd = cmd
 
-        self.last_cmd = f'BC01{channel_control:02X}{int(volt):02X}{duty*2+1:02X}{int(freq):04X}AFAAFFDF'
-        bytes = bytearray.fromhex(self.last_cmd)
-        self.stream.write(bytes)
-        time.sleep(0.1)
-        self.last_feedback = self.stream.read(7) # collect feed back
+        try:
+            self.commands.put_nowait(cmd)
+        except queue.Full:
+            # NOTE: the port is behind, replace the oldest pending command
+            try:
+                self.commands.get_nowait()
+                self.num_dropped += 1
+            except queue.Empty:
+                pass
+            self.commands.put_nowait(cmd)
     
     def on_close(self, what: Optional[Dict] = None) -> None:
-        self.stream.write(bytearray.fromhex('BC0100000000000000FFFFFFDF'))
+        if self.stream is None:
+            return
+        if self.writer is not None:
+            self.commands.put(None) # NOTE: pending commands are written first
+            self.writer.join()
+            self.writer = None
+        if self.reader is not None:
+            self.reader_exit.set()
+            self.reader.join()
+            self.reader = None
+        self.stream.write(self.CMD_OFF)
         self.stream.close()
+        self.stream = None
+        self.last_cmd = None
     
     def _translate_current(self, current:bytearray) -> str:
-        return ' '.join([f'{int(x)/255*16:.2f}' for x in bytes[1:5]])
+        return ' '.join([f'{int(x)/255*16:.2f}' for x in current[1:5]])
     
     def on_status_acq(self, what: Optional[Dict] = None) -> Optional[StreamEvent]:
-        if self.last_cmd is None:
-            return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {})
-
-        # need to repeat last command to get feed back
-        self.stream.write(bytearray.fromhex(self.last_cmd))
-        time.sleep(0.1)
-        try:
-            feedback = self.stream.read(7) # read a feed back
-            current = self._translate_current(feedback)
-        except Exception:
-            return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'current': self._translate_current(self.last_feedback)})
-        else:
-            self.last_feedback = feedback
-            return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'current': current})
\ No newline at end of file
+        # NOTE: latest feedback from the reader thread, never write or wait here
+        status = {'telemetry': self.telemetry_snapshot(),
+            'suppressed': self.num_suppressed, 'dropped': self.num_dropped}
+        if self.last_feedback is not None:
+            status['current'] = self._translate_current(self.last_feedback)
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK, status)
\ No newline at end of file
@@ -0,0 +1,40 @@
+import numpy as np
+from typing import Tuple
+
+class RLEFrame(object):
+    '''run-length encoded vibration frame, `values[i]` repeated `lengths[i]` times'''
+    __slots__ = ('values', 'lengths')
+    def __init__(self, values:np.ndarray, lengths:np.ndarray) -> None:
+        self.values = values
+        self.lengths = lengths
+
+    def __len__(self) -> int:
+        return int(self.lengths.sum())
+
+    def decode(self) -> np.ndarray:
+        return np.repeat(self.values, self.lengths)
+
+def rle_encode(frame:np.ndarray) -> RLEFrame:
+    frame = np.asarray(frame).ravel()
+    if frame.shape[0] == 0:
+        return RLEFrame(frame, np.zeros(0, dtype=np.int64))
+    starts = np.flatnonzero(np.concatenate(([True], frame[1:] != frame[:-1])))
+    lengths = np.diff(np.append(starts, frame.shape[0]))
+    return RLEFrame(frame[starts], lengths)
+
+def rle_encode_track(chunks:np.ndarray, len_frame:int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    encode a whole track at once, runs never cross a frame boundary
+    returns run values, run lengths and the first run of each frame (plus the end)
+    '''
+    chunks = chunks.ravel()
+    num_sample = chunks.shape[0]
+    change = np.ones(num_sample, dtype=bool)
+    change[1:] = chunks[1:] != chunks[:-1]
+    change[::len_frame] = True # NOTE: every frame starts a new run
+
+    starts = np.flatnonzero(change)
+    lengths = np.diff(np.append(starts, num_sample))
+    frame_starts = np.arange(0, num_sample, len_frame)
+    frame_runs = np.searchsorted(starts, frame_starts)
+    return chunks[starts], lengths, np.append(frame_runs, starts.shape[0])
@@ -0,0 +1,264 @@
+import time
+import wave
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+from .core import AudioStreamI
+from .ringbuffer import SharedRingBuffer, RingReader
+from .realtime import sleep_until
+from .pcmcache import decode_audio
+
+class LiveInputStream(AudioStreamI):
+    '''
+    Audio captured as it arrives, the source (a device callback or a thread)
+    writes frames of `len_frame` samples into a ring of `num_slot` frames and the
+    playing process reads them, so the pipeline is paced by the capture clock.
+
+    max_lag: frames kept when the reader falls behind, older ones are dropped
+    timeout: seconds without input before a silent frame is played
+    Subclasses open, start and close the source, see `PyAudioInputStream`.
+    '''
+    def __init__(self, len_frame:int, rate:int=44100, channels:int=1, sampwidth:int=2,
+        num_slot:int=32, max_lag:int=2, timeout:float=0.5) -> None:
+        super(LiveInputStream, self).__init__()
+        self.len_frame = len_frame
+        self.rate = rate
+        self.channels = channels
+        self.sampwidth = sampwidth
+        self.num_slot = num_slot
+        self.max_lag = max_lag
+        self.timeout = timeout
+
+        # NOTE: created in the playing process by `init_stream`
+        self.ring:Optional[SharedRingBuffer] = None
+        self.reader:Optional[RingReader] = None
+        self.arrived:Optional[threading.Event] = None
+        self.ended = False
+
+        self.pos = 0
+        self.capture_stamp:Optional[float] = None # capture time of the last read frame
+        self.num_dropped = 0 # frames dropped to catch up with the source
+        self.num_overflow = 0 # frames lost by the source, e.g. device overflow
+        self.num_silent = 0 # silent frames played while the source stalled
+
+    def frame_bytes(self) -> int:
+        return self.len_frame * self.sampwidth * self.channels
+
+    def open_source(self) -> None:
+        return
+
+    def start_source(self) -> None:
+        return
+
+    def close_source(self) -> None:
+        return
+
+    def init_stream(self) -> None:
+        if self.ring is None:
+            self.open_source()
+            self.ring = SharedRingBuffer(self.frame_bytes(), self.num_slot)
+            self.ring.set_format(self.sampwidth, self.channels, self.rate)
+            self.reader = self.ring.reader(np.uint8)
+            self.arrived = threading.Event()
+            self.silence = bytes(self.frame_bytes())
+            self.start_source()
+        self.rewind()
+
+    def push(self, frame, stamp:float) -> None:
+        '''called by the source with every captured frame and the capture time of its last sample'''
+        self.ring.write(frame, stamp)
+        self.arrived.set()
+
+    def end(self) -> None:
+        '''called by the source when no more input will come'''
+        self.ended = True
+        self.arrived.set()
+
+    def _wait(self) -> Optional[bool]:
+        '''True when a frame is captured, False if the source stalled, None at its end'''
+        while self.reader.available() == 0:
+            if self.ended:
+                return None
+            self.arrived.clear()
+            if self.reader.available() > 0:
+                break
+            if not self.arrived.wait(self.timeout):
+                return False
+        return True
+
+    def readinto(self, buf) -> int:
+        while True:
+            state = self._wait()
+            if state is None:
+                return 0
+            n = self.frame_bytes()
+            if not state:
+                # NOTE: keep the vibration loop alive, the input may come back
+                buf[:n] = self.silence
+                self.capture_stamp = time.perf_counter()
+                self.num_silent += 1
+                break
+            # NOTE: live output favours latency, a backlog is dropped instead of played late
+            self.num_dropped += self.reader.skip_to(self.max_lag)
+            frame = self.reader.read()
+            if frame is None:
+                continue # NOTE: slot overwritten while reading, counted by the reader
+            n = frame.shape[0]
+            buf[:n] = frame
+            self.capture_stamp = self.reader.stamp
+            break
+        self.pos += 1
+        return n
+
+    def readframe(self, n:int=1) -> bytes:
+        buf = bytearray(self.frame_bytes())
+        num_bytes = self.readinto(memoryview(buf))
+        return bytes(buf[:num_bytes])
+
+    def input_stats(self) -> Dict:
+        return {
+            'frames': self.pos,
+            'dropped': self.num_dropped,
+            'overflow': self.num_overflow,
+            'silent': self.num_silent,
+            'overruns': self.reader.overruns if self.reader is not None else 0,
+        }
+
+    def getnframes(self) -> int:
+        return 0 # NOTE: unbounded
+
+    def tell(self) -> int:
+        return self.pos
+
+    # cannot seek a live input, drop the backlog instead
+    def setpos(self, pos:int) -> None:
+        if self.reader is not None:
+            self.reader.seek_latest()
+
+    def rewind(self) -> None:
+        self.pos = 0
+        self.setpos(0)
+
+    def close(self) -> None:
+        self.close_source()
+        self.ended = True
+
+    def getsampwidth(self) -> int:
+        return self.sampwidth
+
+    def getnchannels(self) -> int:
+        return self.channels
+
+    def getframerate(self) -> int:
+        return self.rate
+
+class PyAudioInputStream(LiveInputStream):
+    '''
+    Microphone or line-in through PyAudio, frames are pushed by its callback.
+    device: input device index, None for the default input
+    '''
+    def __init__(self, len_frame:int, rate:int=44100, channels:int=1, device:Optional[int]=None, **kwargs) -> None:
+        super(PyAudioInputStream, self).__init__(len_frame, rate, channels, 2, **kwargs)
+        self.device = device
+        self.audio = None
+        self.stream = None
+
+    def open_source(self) -> None:
+        from .dependency import PyAudio
+        import pyaudio
+        self.pa_continue, self.pa_overflow = pyaudio.paContinue, pyaudio.paInputOverflow
+        self.audio = PyAudio()
+        self.stream = self.audio.open(
+            format=self.audio.get_format_from_width(self.sampwidth),
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device,
+            frames_per_buffer=self.len_frame,
+            stream_callback=self.on_capture,
+            start=False
+        )
+
+    def start_source(self) -> None:
+        self.stream.start_stream()
+
+    def on_capture(self, in_data, frame_count, time_info, status):
+        stamp = time.perf_counter()
+        adc = time_info.get('input_buffer_adc_time', 0.)
+        if adc > 0:
+            # NOTE: the buffer may wait in the driver, stamp its last sample at the adc
+            stamp -= time_info['current_time'] - adc - frame_count / self.rate
+        if status & self.pa_overflow:
+            self.num_overflow += 1
+        self.push(in_data, stamp)
+        return (None, self.pa_continue)
+
+    def close_source(self) -> None:
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+        if self.audio is not None:
+            self.audio.terminate()
+        self.stream, self.audio = None, None
+
+class FileInputStream(LiveInputStream):
+    '''
+    Fake input capturing an audio file at its sample rate, a live source for tests
+    and benchmarks without a sound card; a frame is pushed, and stamped, when its
+    last sample would have been captured.
+    loop: restart at the end of the file, otherwise the stream ends with it
+    '''
+    def __init__(self, audiofile:str, len_frame:int, loop:bool=False, **kwargs) -> None:
+        # NOTE: only the format is read here, the file is decoded by the playing process
+        if audiofile.lower().endswith('.wav'):
+            with wave.open(audiofile, 'rb') as f:
+                rate, channels, sampwidth = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        else:
+            import soundfile
+            info = soundfile.info(audiofile)
+            rate, channels, sampwidth = info.samplerate, info.channels, 2
+        super(FileInputStream, self).__init__(len_frame, rate, channels, sampwidth, **kwargs)
+        self.audiofile = audiofile
+        self.loop = loop
+        self.pcm:Optional[bytes] = None
+        self.capturer:Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    def open_source(self) -> None:
+        pcm, _ = decode_audio(self.audiofile)
+        self.pcm = np.ascontiguousarray(pcm).tobytes()
+
+    def start_source(self) -> None:
+        self.stop_event.clear()
+        self.capturer = threading.Thread(target=self._capture, daemon=True)
+        self.capturer.start()
+
+    def _capture(self) -> None:
+        view = memoryview(self.pcm)
+        n = self.frame_bytes()
+        num_frame = (len(view) + n - 1) // n
+        period = self.len_frame / self.rate
+        start = time.perf_counter()
+        k = 0
+        while not self.stop_event.is_set():
+            if k >= num_frame and not self.loop:
+                self.end()
+                return
+            deadline = start + (k + 1) * period
+            sleep_until(deadline, spin=0.) # NOTE: a late wake up shows as capture latency
+            i = k % num_frame
+            self.push(view[i*n:(i+1)*n], deadline)
+            k += 1
+
+    def getnframes(self) -> int:
+        if self.loop:
+            return 0
+        num_sample = len(self.pcm) // (self.sampwidth * self.channels) if self.pcm is not None else 0
+        return (num_sample + self.len_frame - 1) // self.len_frame
+
+    def close_source(self) -> None:
+        self.stop_event.set()
+        if self.capturer is not None:
+            self.capturer.join()
+            self.capturer = None
@@ -0,0 +1,357 @@
+import time
+import heapq
+import random
+import socket
+import struct
+import argparse
+import threading
+import numpy as np
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .core import StreamEvent, StreamEventType
+from .core import StreamDriverBase
+from .framecodec import RLEFrame
+from .realtime import sleep_until
+
+# NOTE: magic, kind, number of frames; then per frame: seq, send time, play time, length, samples
+PACKET_HEADER = struct.Struct('<2sBB')
+FRAME_HEADER = struct.Struct('<IddH')
+CLOCK = struct.Struct('<dd')
+MAGIC = b'VB'
+KIND_FRAME, KIND_PING, KIND_PONG, KIND_CLOSE = 0, 1, 2, 3
+MAX_DATAGRAM = 65507
+
+def pack_frames(frames:List[Tuple[int, float, float, bytes]]) -> bytes:
+    parts = [PACKET_HEADER.pack(MAGIC, KIND_FRAME, len(frames))]
+    for seq, send_time, play_time, data in frames:
+        parts.append(FRAME_HEADER.pack(seq, send_time, play_time, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+def unpack_frames(buf:bytes) -> List[Tuple[int, float, float, bytes]]:
+    _, _, num = PACKET_HEADER.unpack_from(buf)
+    offset, frames = PACKET_HEADER.size, []
+    for _ in range(num):
+        seq, send_time, play_time, n = FRAME_HEADER.unpack_from(buf, offset)
+        offset += FRAME_HEADER.size
+        frames.append((seq, send_time, play_time, buf[offset:offset+n]))
+        offset += n
+    return frames
+
+def _recv_exact(sock:socket.socket, n:int) -> Optional[bytes]:
+    buf = b''
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if len(chunk) == 0:
+            return None
+        buf += chunk
+    return buf
+
+class NetworkDriver(StreamDriverBase):
+    '''
+    Send timestamped vibration frames to a `NetworkReceiver` on another host.
+
+    udp: every packet also carries the last `redundancy` frames, a lost packet
+        is recovered from the next one
+    tcp: length prefixed packets, Nagle disabled
+    Frames are stamped in the receiver clock (offset measured by ping at init)
+    and played `delay` seconds after sending.
+    '''
+    def __init__(self, host:str='127.0.0.1', port:int=9000, protocol:str='udp',
+        redundancy:int=0, delay:float=0.02, loss:float=0.) -> None:
+        super(NetworkDriver, self).__init__()
+        if protocol not in ('udp', 'tcp'):
+            raise ValueError(f'unknown protocol {protocol}')
+        self.address = (host, port)
+        self.protocol = protocol
+        self.redundancy = redundancy if protocol == 'udp' else 0
+        self.delay = delay
+        self.loss = loss # NOTE: drop probability of sent packets, to test loss handling
+
+        self.stream = None
+        self.seq = 0
+        self.recent = deque(maxlen=self.redundancy + 1)
+        self.clock_offset, self.rtt = 0., None
+        self.num_write, self.num_dropped, self.num_bytes = 0, 0, 0
+
+    def on_init(self, what:Optional[Dict]=None) -> None:
+        if self.stream is not None:
+            return # NOTE: keep the connection between sessions
+        if self.protocol == 'udp':
+            self.stream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.stream.connect(self.address)
+        else:
+            self.stream = socket.create_connection(self.address)
+            self.stream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sync_clock()
+
+    def _send(self, packet:bytes) -> None:
+        if self.protocol == 'udp':
+            self.stream.send(packet)
+        else:
+            self.stream.sendall(struct.pack('<I', len(packet)) + packet)
+
+    def _recv(self, timeout:float) -> Optional[bytes]:
+        self.stream.settimeout(timeout)
+        try:
+            if self.protocol == 'udp':
+                return self.stream.recv(MAX_DATAGRAM)
+            size = _recv_exact(self.stream, 4)
+            return None if size is None else _recv_exact(self.stream, struct.unpack('<I', size)[0])
+        except (socket.timeout, ConnectionRefusedError):
+            return None
+        finally:
+            self.stream.settimeout(None)
+
+    def sync_clock(self, num_ping:int=5, timeout:float=0.2) -> None:
+        '''receiver clock offset from the ping with the shortest round trip'''
+        best = None
+        for _ in range(num_ping):
+            t0 = time.time()
+            self._send(PACKET_HEADER.pack(MAGIC, KIND_PING, 0) + CLOCK.pack(t0, 0.))
+            reply = self._recv(timeout)
+            t2 = time.time()
+            if reply is None or len(reply) < PACKET_HEADER.size + CLOCK.size:
+                continue
+            _, t1 = CLOCK.unpack_from(reply, PACKET_HEADER.size)
+            if best is None or t2 - t0 < best[0]:
+                best = (t2 - t0, t1 - (t0 + t2) / 2)
+        if best is None:
+            print('no clock reply from the receiver, assume a shared clock')
+            return
+        self.rtt, self.clock_offset = best
+
+    def on_next_frame(self, what:Optional[Dict]=None) -> None:
+        frame = what['frame']
+        if isinstance(frame, RLEFrame):
+            frame = frame.decode()
+        data = frame if isinstance(frame, (bytes, memoryview)) else np.asarray(frame, dtype=np.uint8).tobytes()
+
+        send_time = time.time() + self.clock_offset
+        self.recent.append((self.seq, send_time, send_time + self.delay, bytes(data)))
+        self.seq += 1
+
+        if self.loss > 0 and random.random() < self.loss:
+            self.num_dropped += 1
+            return
+        packet = pack_frames(list(self.recent))
+        try:
+            self._send(packet)
+        except OSError:
+            self.num_dropped += 1 # NOTE: e.g. receiver not up yet, udp is best effort
+            return
+        self.num_write += 1
+        self.num_bytes += len(packet)
+
+    def on_pulse(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_resume(self, what:Optional[Dict]=None) -> None:
+        return
+
+    def on_close(self, what:Optional[Dict]=None) -> None:
+        if self.stream is None:
+            return
+        try:
+            self._send(PACKET_HEADER.pack(MAGIC, KIND_CLOSE, 0))
+        except OSError:
+            pass
+        self.stream.close()
+        self.stream = None
+
+    def on_status_acq(self, what:Optional[Dict]=None) -> Optional[StreamEvent]:
+        return StreamEvent(StreamEventType.STREAM_STATUS_ACK, {'status': 'Network', 'sent': self.num_write,
+            'dropped': self.num_dropped, 'bytes': self.num_bytes, 'clock_offset': self.clock_offset, 'rtt': self.rtt})
+
+class NetworkReceiver(object):
+    '''
+    Reference receiver, plays frames from `NetworkDriver` into any driver at
+    their play time; late frames are dropped, redundant copies de-duplicated.
+    '''
+    def __init__(self, driver:StreamDriverBase, host:str='127.0.0.1', port:int=0,
+        protocol:str='udp', late_limit:float=0.005, capacity:int=100000) -> None:
+        super(NetworkReceiver, self).__init__()
+        self.driver = driver
+        self.protocol = protocol
+        self.late_limit = late_limit
+
+        kind = socket.SOCK_DGRAM if protocol == 'udp' else socket.SOCK_STREAM
+        self.sock = socket.socket(socket.AF_INET, kind)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        if protocol == 'tcp':
+            self.sock.listen(1)
+        self.port = self.sock.getsockname()[1]
+
+        self.pending = [] # NOTE: heap of (play time, session, seq, send time, data)
+        self.lock = threading.Condition()
+        self.next_seq = 0 # NOTE: frames before it are played or given up
+        self.queued = set()
+        self.end_event = threading.Event()
+
+        # NOTE: a sender (address) plays one session, its CLOSE or a new sender restarts the sequence
+        self.session = 0
+        self.sender = None
+        self.closed_sender = None
+        self.num_session = 0
+
+        self.latency = np.zeros(capacity) # NOTE: send to play, in ms
+        self.transit = np.zeros(capacity) # NOTE: send to arrival, in ms
+        self.num_packet = 0
+        self.num_played, self.num_late, self.num_dup, self.num_recovered, self.num_lost = 0, 0, 0, 0, 0
+
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.player = threading.Thread(target=self._play, daemon=True)
+
+    def start(self) -> None:
+        self.driver.on_init()
+        self.receiver.start()
+        self.player.start()
+
+    def _new_session(self, sender) -> None:
+        # NOTE: frames of the last session still pending are played, they no longer move `next_seq`
+        with self.lock:
+            self.session += 1
+            self.next_seq = 0
+            self.queued = set()
+            self.sender = sender
+            self.num_session += int(sender is not None)
+
+    def _handle(self, packet:bytes, reply, sender=None) -> None:
+        magic, kind, _ = PACKET_HEADER.unpack_from(packet)
+        if magic != MAGIC:
+            return
+        if kind == KIND_PING:
+            t0, _ = CLOCK.unpack_from(packet, PACKET_HEADER.size)
+            reply(PACKET_HEADER.pack(MAGIC, KIND_PONG, 0) + CLOCK.pack(t0, time.time()))
+            return
+        if kind == KIND_CLOSE:
+            if sender == self.sender:
+                self.closed_sender = sender
+                self._new_session(None)
+            return
+        if kind != KIND_FRAME:
+            return
+        if sender != self.sender:
+            if sender == self.closed_sender:
+                return # NOTE: a late redundant copy from the closed session
+            self._new_session(sender)
+
+        frames = unpack_frames(packet)
+        if self.num_packet < self.transit.shape[0] and len(frames) > 0:
+            self.transit[self.num_packet] = (time.time() - frames[-1][1]) * 1000.
+        self.num_packet += 1
+        with self.lock:
+            session = self.session
+            for i, (seq, send_time, play_time, data) in enumerate(frames):
+                if seq < self.next_seq or seq in self.queued:
+                    self.num_dup += 1
+                    continue
+                if i < len(frames) - 1:
+                    self.num_recovered += 1 # NOTE: its own packet was lost, a redundant copy arrived
+                self.queued.add(seq)
+                heapq.heappush(self.pending, (play_time, session, seq, send_time, data))
+            self.lock.notify()
+
+    def _receive(self) -> None:
+        self.sock.settimeout(0.1)
+        while not self.end_event.is_set():
+            if self.protocol == 'udp':
+                try:
+                    packet, addr = self.sock.recvfrom(MAX_DATAGRAM)
+                except socket.timeout:
+                    continue
+                self._handle(packet, lambda p: self.sock.sendto(p, addr), addr)
+                continue
+
+            try:
+                conn, addr = self.sock.accept()
+            except socket.timeout:
+                continue
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            reply = lambda p: conn.sendall(struct.pack('<I', len(p)) + p)
+            while not self.end_event.is_set():
+                size = _recv_exact(conn, 4)
+                if size is None:
+                    break
+                packet = _recv_exact(conn, struct.unpack('<I', size)[0])
+                if packet is None:
+                    break
+                self._handle(packet, reply, addr)
+            conn.close()
+
+    def _play(self) -> None:
+        while not self.end_event.is_set():
+            with self.lock:
+                if len(self.pending) == 0:
+                    self.lock.wait(0.1)
+                    continue
+                play_time, session, seq, send_time, data = self.pending[0]
+                wait = play_time - time.time()
+                if wait > 0.002:
+                    self.lock.wait(wait - 0.002) # NOTE: an earlier frame may arrive meanwhile
+                    continue
+                heapq.heappop(self.pending)
+                if session == self.session:
+                    self.queued.discard(seq)
+                    if seq > self.next_seq:
+                        self.num_lost += seq - self.next_seq # NOTE: missing frames are due, give up on them
+                    self.next_seq = seq + 1
+
+            sleep_until(time.perf_counter() + play_time - time.time(), spin=0.002)
+            late = time.time() - play_time
+            if late > self.late_limit:
+                self.num_late += 1
+                continue
+            self.driver.on_next_frame({'frame': np.frombuffer(data, dtype=np.uint8)})
+            if self.num_played < self.latency.shape[0]:
+                self.latency[self.num_played] = (time.time() - send_time) * 1000.
+            self.num_played += 1
+
+    def stats(self) -> Dict:
+        report = {'sessions': self.num_session, 'packets': self.num_packet, 'played': self.num_played, 'late': self.num_late, 'lost': self.num_lost,
+            'recovered': self.num_recovered, 'duplicates': self.num_dup}
+        transit = self.transit[:min(self.num_packet, self.transit.shape[0])]
+        if transit.shape[0] > 0:
+            report.update({'transit_mean': float(transit.mean()), 'transit_p99': float(np.percentile(transit, 99))})
+        latency = self.latency[:min(self.num_played, self.latency.shape[0])]
+        if latency.shape[0] > 0:
+            report.update({'latency_mean': float(latency.mean()),
+                'latency_p99': float(np.percentile(latency, 99)), 'latency_max': float(latency.max())})
+        return report
+
+    def stop(self, timeout:float=1.) -> None:
+        deadline = time.time() + timeout
+        while len(self.pending) > 0 and time.time() < deadline:
+            time.sleep(0.01) # NOTE: let the frames still in flight play
+        self.end_event.set()
+        for t in (self.receiver, self.player):
+            if t.is_alive():
+                t.join()
+        self.sock.close()
+        self.driver.on_close()
+
+def main() -> None:
+    from .drivers import LogDriver, NullDriver, PCF8591Driver, UARTDriver
+    drivers = {'null': NullDriver, 'log': LogDriver, 'pcf8591': PCF8591Driver, 'uart': UARTDriver}
+
+    p = argparse.ArgumentParser(prog='python -m vib_music.netdriver', description='network vibration receiver')
+    p.add_argument('--host', type=str, default='0.0.0.0')
+    p.add_argument('--port', type=int, default=9000)
+    p.add_argument('--protocol', choices=['udp', 'tcp'], default='udp')
+    p.add_argument('--driver', choices=drivers.keys(), default='log')
+    opt = p.parse_args()
+
+    receiver = NetworkReceiver(drivers[opt.driver](), opt.host, opt.port, opt.protocol)
+    receiver.start()
+    print(f'receiving {opt.protocol} on {opt.host}:{receiver.port}, use Ctrl+C to exit')
+    try:
+        while True:
+            time.sleep(1.)
+            print(receiver.stats())
+    except KeyboardInterrupt:
+        receiver.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import os
+import json
+import wave
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+# NOTE: raw interleaved PCM next to a json header, `<audio>.pcm` and `<audio>.pcm.json`
+PCM_SUFFIX = '.pcm'
+
+def cache_path(audio:str, cache_dir:Optional[str]=None) -> str:
+    if cache_dir is None:
+        return audio + PCM_SUFFIX
+    return os.path.join(cache_dir, os.path.basename(audio) + PCM_SUFFIX)
+
+def decode_audio(audio:str) -> Tuple[np.ndarray, Dict]:
+    '''interleaved PCM `(num_sample, channels)` and its format, wav as is, other formats to 16 bit'''
+    if audio.lower().endswith('.wav'):
+        with wave.open(audio, 'rb') as f:
+            fmt = {'sampwidth': f.getsampwidth(), 'channels': f.getnchannels(), 'rate': f.getframerate()}
+            data = np.frombuffer(f.readframes(f.getnframes()), dtype=np.uint8)
+        return data.reshape((-1, fmt['sampwidth'] * fmt['channels'])), fmt
+
+    import librosa
+    y, sr = librosa.load(audio, sr=None, mono=False)
+    y = np.atleast_2d(y).T # NOTE: librosa is channel first
+    pcm = (np.clip(y, -1., 1.) * 32767).astype('<i2')
+    return pcm, {'sampwidth': 2, 'channels': pcm.shape[1], 'rate': int(sr)}
+
+def load_pcm_header(audio:str, cache_dir:Optional[str]=None) -> Optional[Dict]:
+    '''format of a cached decode, None if missing or older than the audio file'''
+    path = cache_path(audio, cache_dir)
+    if not os.path.exists(path) or not os.path.exists(path + '.json'):
+        return None
+    with open(path + '.json', 'r') as f:
+        header = json.load(f)
+    stat = os.stat(audio)
+    if header.get('source_mtime') != stat.st_mtime or header.get('source_size') != stat.st_size:
+        return None
+    return header
+
+def cache_pcm(audio:str, cache_dir:Optional[str]=None) -> Dict:
+    '''decode `audio` once into raw PCM, returns the header of the cache'''
+    header = load_pcm_header(audio, cache_dir)
+    if header is not None:
+        return header
+
+    pcm, header = decode_audio(audio)
+    stat = os.stat(audio)
+    header.update({'num_sample': pcm.shape[0], 'source_mtime': stat.st_mtime, 'source_size': stat.st_size})
+
+    path = cache_path(audio, cache_dir)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    # NOTE: header written last, a half written cache is never used
+    with open(path, 'wb') as f:
+        f.write(pcm.tobytes())
+    with open(path + '.json', 'w') as f:
+        json.dump(header, f)
+    return header
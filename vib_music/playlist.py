@@ -0,0 +1,272 @@
+import time
+import bisect
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .core import StreamDataI, AudioStreamI
+from .core import AudioFeatureBundle, FeatureBuilder
+from .core import StreamEvent, StreamEventType
+from .streams import PCMAudioStream, VibrationStream
+
+class PlaylistAudioStream(AudioStreamI):
+    '''
+    Tracks of the same format played as one continuous sample stream, the frame
+    crossing a track boundary takes the tail of one track and the head of the next.
+    Tracks are `PCMAudioStream`s, appended while playing.
+    '''
+    def __init__(self, tracks:List[PCMAudioStream], len_frame:int) -> None:
+        super(PlaylistAudioStream, self).__init__()
+        self.len_frame = len_frame
+        self.tracks = []
+        self.starts = [] # first sample of each track
+        self.num_sample = 0
+        self.header = None
+        self.boundary = None # NOTE: buffer of frames crossing a track boundary
+        self.pos = 0
+        for t in tracks:
+            self.append(t)
+
+    def append(self, track:PCMAudioStream, start:Optional[int]=None) -> None:
+        header = track.header
+        if self.header is None:
+            self.header = header
+            self.sample_bytes = header['sampwidth'] * header['channels']
+        elif any(header[k] != self.header[k] for k in ('sampwidth', 'channels', 'rate')):
+            raise ValueError(f'{track.audiofile} format differs from the playlist')
+        if self.boundary is not None:
+            track.init_stream() # NOTE: appended in the playing process
+        self.tracks.append(track)
+        self.starts.append(self.num_sample)
+        self.num_sample += header['num_sample']
+
+    def init_stream(self) -> None:
+        for t in self.tracks:
+            t.init_stream()
+        self.boundary = bytearray(self.len_frame * self.sample_bytes)
+        self.rewind()
+
+    def getnframes(self) -> int:
+        return (self.num_sample+self.len_frame-1) // self.len_frame
+
+    def _copy(self, start:int, end:int, out:memoryview) -> int:
+        '''samples `[start, end)` of the playlist into `out`, returns bytes copied'''
+        k = bisect.bisect_right(self.starts, start) - 1
+        n = 0
+        while start < end:
+            track = self.tracks[k]
+            a = (start - self.starts[k]) * self.sample_bytes
+            b = (min(end, self.starts[k] + track.header['num_sample']) - self.starts[k]) * self.sample_bytes
+            out[n:n+b-a] = track.view[a:b]
+            n += b - a
+            start = self.starts[k] + track.header['num_sample']
+            k += 1
+        return n
+
+    def _range(self, n:int) -> Tuple[int, int]:
+        start = self.pos * self.len_frame
+        end = min(self.num_sample, start + n*self.len_frame)
+        self.pos = min(self.getnframes(), self.pos+n)
+        return start, max(start, end)
+
+    def readframe(self, n:int=1) -> memoryview:
+        start, end = self._range(n)
+        k = bisect.bisect_right(self.starts, start) - 1
+        if k < 0 or start >= end:
+            return memoryview(b'')
+        if end <= self.starts[k] + self.tracks[k].header['num_sample']:
+            # NOTE: inside one track, zero-copy slice of its cache
+            a, b = start - self.starts[k], end - self.starts[k]
+            return self.tracks[k].view[a*self.sample_bytes:b*self.sample_bytes]
+        if (end - start) * self.sample_bytes > len(self.boundary):
+            self.boundary = bytearray((end - start) * self.sample_bytes)
+        view = memoryview(self.boundary)
+        return view[:self._copy(start, end, view)]
+
+    def readinto(self, buf) -> int:
+        start, end = self._range(1)
+        if start >= end:
+            return 0
+        return self._copy(start, end, memoryview(buf))
+
+    def track_of(self, pos:int) -> int:
+        '''index of the track playing at frame `pos`'''
+        return max(bisect.bisect_right(self.starts, pos * self.len_frame) - 1, 0)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = min(self.getnframes(), max(pos, 0))
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def close(self) -> None:
+        for t in self.tracks:
+            t.close()
+
+    def getsampwidth(self) -> int:
+        return self.header['sampwidth']
+
+    def getnchannels(self) -> int:
+        return self.header['channels']
+
+    def getframerate(self) -> int:
+        return self.header['rate']
+
+class PlaylistVibrationStream(StreamDataI):
+    '''
+    Vibration streams of the playlist tracks on the audio frame timeline, a track
+    starting at sample `start` plays its first frame at the first audio frame after it.
+    '''
+    def __init__(self, tracks:List[Tuple[int, StreamDataI]], len_frame:int) -> None:
+        super(PlaylistVibrationStream, self).__init__()
+        self.len_frame = len_frame
+        self.tracks = []
+        self.starts = []
+        self.initialized = False
+        self.pos = 0
+        for start, t in tracks:
+            self.append(t, start)
+
+    def append(self, track:StreamDataI, start:Optional[int]=None) -> None:
+        if self.initialized:
+            track.init_stream()
+        self.tracks.append(track)
+        self.starts.append(start)
+
+    def init_stream(self) -> None:
+        for t in self.tracks:
+            t.init_stream()
+        self.initialized = True
+        self.rewind()
+
+    def getnframes(self) -> int:
+        first = -(-self.starts[-1] // self.len_frame)
+        return first + self.tracks[-1].getnframes()
+
+    def readframe(self, n:int=1):
+        frames = []
+        for _ in range(n):
+            sample = self.pos * self.len_frame
+            k = bisect.bisect_right(self.starts, sample) - 1
+            track = self.tracks[k]
+            local = (sample - self.starts[k]) // self.len_frame
+            if track.tell() != local:
+                track.setpos(local)
+            frames.append(track.readframe())
+            self.pos += 1
+        return frames[0] if n == 1 else np.concatenate(frames)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = max(pos, 0)
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def close(self) -> None:
+        for t in self.tracks:
+            t.close()
+
+def rmse_vibrations(fb:AudioFeatureBundle, num_vib:int=1) -> List[StreamDataI]:
+    return [VibrationStream.from_feature_bundle(fb, 24, 'rmse_mode') for _ in range(num_vib)]
+
+class PlaylistSession(object):
+    '''
+    Gapless playback of `tracks`, (audio, bundle folder or None) pairs, on a
+    `PlayerService`; the drivers stay open and the next track (PCM cache, bundle,
+    rendered vibrations) is prepared by a background thread and appended to the
+    playing streams before the current track ends.
+
+    vibrations: builds the vibration streams of a track from its bundle
+    '''
+    def __init__(self, service, tracks:List[Tuple[str, Optional[str]]], len_frame:int=512,
+        vibrations:Callable[[AudioFeatureBundle], List[StreamDataI]]=rmse_vibrations,
+        recipe:Optional[Dict]=None, cache_dir:Optional[str]=None) -> None:
+        super(PlaylistSession, self).__init__()
+        self.service = service
+        self.tracks = list(tracks)
+        self.len_frame = len_frame
+        self.vibrations = vibrations
+        self.recipe = {'rmse': {}} if recipe is None else recipe
+        self.cache_dir = cache_dir
+
+        self.starts = [] # first sample of each queued track
+        self.num_sample = 0
+        self.header = None
+        self.prefetcher = None
+        self.end_event = threading.Event()
+        self.prepare_time = [] # seconds to prepare each track
+
+    def _prepare(self, i:int) -> Tuple[PCMAudioStream, List[StreamDataI]]:
+        t = time.perf_counter()
+        audio, features = self.tracks[i]
+        pcm = PCMAudioStream(audio, self.len_frame, self.cache_dir)
+        if features is not None:
+            fb = AudioFeatureBundle.from_folder(features)
+        else:
+            fb = FeatureBuilder(audio, None, self.len_frame).build_features(self.recipe)
+        vibrations = self.vibrations(fb)
+        self.prepare_time.append(time.perf_counter() - t)
+        return pcm, vibrations
+
+    def _queue(self, pcm:PCMAudioStream) -> int:
+        start = self.num_sample
+        self.starts.append(start)
+        self.num_sample += pcm.header['num_sample']
+        return start
+
+    def start(self, timeout:Optional[float]=None) -> int:
+        '''load the first track and play, returns its number of frames'''
+        pcm, vibrations = self._prepare(0)
+        self.header = pcm.header
+        start = self._queue(pcm)
+        audio = PlaylistAudioStream([pcm], self.len_frame)
+        vibs = [PlaylistVibrationStream([(start, v)], self.len_frame) for v in vibrations]
+        num_frame = self.service.load_session(audio, vibs, timeout=timeout)
+        if num_frame < 0:
+            return num_frame
+        self.service.play()
+        self.prefetcher = threading.Thread(target=self._prefetch, daemon=True)
+        self.prefetcher.start()
+        return num_frame
+
+    def _prefetch(self) -> None:
+        for i in range(1, len(self.tracks)):
+            pcm, vibrations = self._prepare(i)
+            if any(pcm.header[k] != self.header[k] for k in ('sampwidth', 'channels', 'rate')):
+                print(f'{self.tracks[i][0]} format differs from the playlist, skipped')
+                continue
+            # NOTE: one track ahead, append once the previous track is playing
+            while not self.end_event.is_set() and self.current_track() < len(self.starts) - 1:
+                time.sleep(0.05)
+            if self.end_event.is_set():
+                return
+            # NOTE: prepared too late, the audio process resumes a stream paused at its end by itself
+            start = self._queue(pcm)
+            self.service.commands.put(StreamEvent(StreamEventType.STREAM_APPEND,
+                {'data': pcm, 'vibrations': vibrations, 'start': start}))
+
+    def current_track(self) -> int:
+        return max(bisect.bisect_right(self.starts, self.service.tell() * self.len_frame) - 1, 0)
+
+    def num_frame(self) -> int:
+        '''frames of the tracks queued so far'''
+        return (self.num_sample+self.len_frame-1) // self.len_frame
+
+    def wait(self, poll:float=0.1) -> None:
+        '''block until the last track is played'''
+        while self.service.is_alive():
+            if self.prefetcher is not None and not self.prefetcher.is_alive() and self.service.tell() >= self.num_frame():
+                return
+            time.sleep(poll)
+
+    def stop(self) -> None:
+        self.end_event.set()
+        if self.prefetcher is not None:
+            self.prefetcher.join()
+        self.service.stop()
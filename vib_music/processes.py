@@ -1,23 +1,37 @@
+import time
 from copy import deepcopy
-from multiprocessing import Process, Queue
-from typing import Dict, List, Optional, Tuple
+from multiprocessing import Process, Queue, Value
+from typing import Dict, List, Optional, Tuple, Union
 from queue import Empty
 
 from .streamhandler import AudioStreamEvent, AudioStreamEventType, AudioStreamHandler, StreamEndException, StreamHandler, StreamState
+from .streamhandler import FRAME_STAGES
 from .core import StreamEventType, StreamEvent
 from .core import StreamError
+from .core import StreamChannel, wait_channels
+from .progress import ProgressSampler
+from .realtime import FrameTimer, FrameClock, StageTimer, apply_realtime, freeze_gc
+from .ringbuffer import SharedRingBuffer
+from .trace import TraceRecorder, TRACE_IN, TRACE_END
+
+# NOTE: both have put/get/get_nowait, vibration processes use duplex channels
+EventConn = Union[Queue, StreamChannel]
 
 class StreamProcess(Process):
     def __init__(self, stream_handler:StreamHandler) -> None:
         super(StreamProcess, self).__init__()
 
         self.stream_handler = stream_handler
-        self.send_conn:Optional[Queue] = None
-        self.recv_conn:Optional[Queue] = None
+        self.send_conn:Optional[EventConn] = None
+        self.recv_conn:Optional[EventConn] = None
+
+        # NOTE: latest seek sequence number, shared by audio and vibration processes
+        self.seek_seq = None
 
-        self.frame_ack = False
+        self.realtime = None
+        self.frame_timer:Optional[FrameTimer] = None
 
-    def set_event_queues(self, recv:Queue, send:Queue) -> None:
+    def set_event_queues(self, recv:EventConn, send:EventConn) -> None:
         self.recv_conn = recv
         self.send_conn = send
 
@@ -27,29 +41,101 @@ class StreamProcess(Process):
         self.recv_conn = None
         self.send_conn = None
     
-    def event_queues(self) -> Tuple[Queue, Queue]:
+    def event_queues(self) -> Tuple[EventConn, EventConn]:
         return self.recv_conn, self.send_conn
     
     def get_handler(self) -> StreamHandler:
         return self.stream_handler
     
-    def enable_frame_ack(self) -> None:
-        self.frame_ack = True
+    def set_seek_counter(self, seek_seq) -> None:
+        self.seek_seq = seek_seq
+
+    def enable_realtime(self, cpus:Optional[List[int]]=None, priority:Optional[int]=None,
+        nice:Optional[int]=None, gc_mode:Optional[str]='freeze') -> None:
+        '''see `realtime.apply_realtime`, settings apply when the process runs'''
+        self.realtime = {'cpus': cpus, 'priority': priority, 'nice': nice, 'gc_mode': gc_mode}
+
+    def enable_frame_timer(self, capacity:int=100000) -> FrameTimer:
+        '''record frame timestamps, read the jitter from the returned timer'''
+        self.frame_timer = FrameTimer(capacity)
+        return self.frame_timer
+
+    def enable_stage_timer(self, capacity:int=100000) -> StageTimer:
+        '''record how long each frame spends reading, broadcasting and writing, see `streamhandler.FRAME_STAGES`'''
+        self.stream_handler.stage_timer = StageTimer(FRAME_STAGES, capacity)
+        return self.stream_handler.stage_timer
+
+    def setup_realtime(self) -> None:
+        if self.realtime is None:
+            return
+        report = apply_realtime(**self.realtime)
+        print(f'[{self.name}] realtime settings {report}')
+
+    def after_session_setup(self) -> None:
+        # NOTE: objects of a new session are frozen too, GC stays out of the frame loop
+        if self.realtime is not None:
+            freeze_gc(self.realtime['gc_mode'])
+
+    def receive_tasks(self, block:bool=True, timeout:Optional[float]=None) -> List[StreamEvent]:
+        '''all pending tasks, as received'''
+        try:
+            tasks = [self.recv_conn.get(block=block, timeout=timeout)]
+        except Empty:
+            return []
+
+        while True:
+            try:
+                tasks.append(self.recv_conn.get_nowait())
+            except Empty:
+                break
+        return tasks
+
+    def fetch_tasks(self, block:bool=True, timeout:Optional[float]=None) -> List[StreamEvent]:
+        '''fetch all pending tasks, only the latest seek of them is kept'''
+        return coalesce_seeks(self.receive_tasks(block, timeout))
+
+def coalesce_seeks(tasks:List[StreamEvent]) -> List[StreamEvent]:
+    # NOTE: seeks are absolute, so the last one overrides all previous seeks
+    # and the frames queued before it are out of date
+    last_seek = -1
+    for i, task in enumerate(tasks):
+        if task.head == StreamEventType.STREAM_SEEK:
+            last_seek = i
+    if last_seek < 0:
+        return tasks
+
+    return [task for i, task in enumerate(tasks) if i >= last_seek or \
+        task.head not in (StreamEventType.STREAM_SEEK, StreamEventType.STREAM_NEXT_FRAME)]
     
 class VibrationProcess(StreamProcess):
     def __init__(self, stream_hander:StreamHandler) -> None:
         super(VibrationProcess, self).__init__(stream_hander)
+        self.frame_clock:Optional[FrameClock] = None
+
+    def enable_self_clock(self, rate:Optional[float]=None, len_hop:int=512, sr:int=44100) -> FrameClock:
+        '''
+        pace orphan playback (no audio attached) at `rate` frames per second,
+        defaults to the audio frame rate `sr / len_hop`
+        '''
+        rate = sr / len_hop if rate is None else rate
+        self.frame_clock = FrameClock(rate)
+        return self.frame_clock
 
     def run(self) -> None:
         is_orphan = False # NOTE: vibration without music is an orphan
         if self.recv_conn is None or self.send_conn is None:
             is_orphan = True
         
+        self.setup_realtime()
         if is_orphan:
             self.stream_handler.on_init()
+            self.after_session_setup()
             while True:
+                # NOTE: without a clock, speed depends on how fast the driver accepts data
+                if self.frame_clock is not None: self.frame_clock.wait()
                 try:
                     self.stream_handler.on_next_frame()
+                    if self.frame_timer is not None: self.frame_timer.tick()
                 except StreamEndException:
                     print('Stream Exausted.')
                     break
@@ -57,23 +143,40 @@ class VibrationProcess(StreamProcess):
                     print(f'Stream Error {e}')
                     break
         else:
-            while True:
-                task = self.recv_conn.get(block=True)
-                try:
-                    result = self.stream_handler.handle(task)
-                except StreamEndException:
-                    break # DEBUG: should not happen, music and vib should be aligned
-                except Exception as e:
-                    # NOTE: break 1, cannot hand task
-                    print(f'for task {task}, vibration stream handler exception {e}')
-                    break
-                else:
-                    if result is not None:
-                        self.send_conn.put(result) 
-                finally:
-                    # NOTE: break 2, music process closed
-                    if task.head == StreamEventType.STREAM_CLOSE:
+            seq = 0
+            running = True
+            while running:
+                for task in self.fetch_tasks(block=True):
+                    if task.head == StreamEventType.STREAM_SEEK:
+                        seq = task.what.get('seq', seq)
+                    elif task.head == StreamEventType.STREAM_NEXT_FRAME:
+                        # NOTE: drop frames sent before a seek the audio has already applied
+                        seq = max(seq, self.seek_seq.value) if self.seek_seq is not None else seq
+                        if task.what.get('seq', seq) < seq:
+                            continue
+
+                    try:
+                        result = self.stream_handler.handle(task)
+                    except StreamEndException:
+                        # NOTE: vibration shorter than music, wait for a seek or a new session
+                        continue
+                    except Exception as e:
+                        # NOTE: break 1, cannot hand task
+                        print(f'for task {task}, vibration stream handler exception {e}')
+                        running = False
                         break
+                    else:
+                        if result is not None:
+                            self.send_conn.put(result) 
+                        if task.head == StreamEventType.STREAM_NEXT_FRAME:
+                            if self.frame_timer is not None: self.frame_timer.tick()
+                        elif task.head in (StreamEventType.STREAM_INIT, StreamEventType.STREAM_LOAD):
+                            self.after_session_setup()
+                    finally:
+                        # NOTE: break 2, music process closed
+                        if task.head == StreamEventType.STREAM_CLOSE:
+                            running = False
+                            break
         
         # before exit, check and try to close handler, no exception raised
         if self.stream_handler.is_activate():
@@ -83,26 +186,86 @@ class VibrationProcess(StreamProcess):
                 pass
 
 class AudioProcess(StreamProcess):
+    POSITION_EVENTS = (StreamEventType.STREAM_INIT, StreamEventType.STREAM_LOAD, StreamEventType.STREAM_SEEK)
+    # NOTE: a user taking control after the end keeps the stream paused on append
+    CONTROL_EVENTS = (StreamEventType.STREAM_INIT, StreamEventType.STREAM_LOAD, StreamEventType.STREAM_SEEK,
+        AudioStreamEventType.AUDIO_START, AudioStreamEventType.AUDIO_PULSE, AudioStreamEventType.AUDIO_RESUME)
+
     def __init__(self, stream_handler:AudioStreamHandler) -> None:
         super(AudioProcess, self).__init__(stream_handler)
 
-        # audio process initialize task and result queues for all vibration process
+        # audio process initialize a duplex channel for each vibration process
         self.attached_proc_send_conns = []
         self.attached_proc_recv_conns = []
+        self.attached_proc_conns = {}
 
         self.num_vibration_stream = 0
         # to collect from each stream
         self.received_msgs = []
+        self.pending_recvs = []
         #
         self.auto_init = False
         self.auto_exit = True
+
+        self.seek_seq = Value('q', 0, lock=False)
+        # NOTE: playing position in shared memory, displays sample it at their own rate
+        self.position = Value('q', 0, lock=False)
+        self.audio_tap:Optional[SharedRingBuffer] = None
+        self.tracer:Optional[TraceRecorder] = None
+        # NOTE: NEXT_FRAME events dropped for vibration processes whose pipe was full
+        self.dropped_frames = Value('q', 0, lock=False)
+        self.lagging = set()
+        # NOTE: paused by the end of the stream (not by a user), an append plays on
+        self.paused_at_end = False
     
     def enable_GUI_mode(self) -> None:
         # self.stream_handler.disable_bar()
         self.enable_auto_init()
         self.enable_manual_exit()
-        self.enable_frame_ack()
     
+    def enable_audio_tap(self, slot_bytes:int, num_slot:int=64) -> SharedRingBuffer:
+        '''
+        publish every played PCM frame into a shared ring buffer, live vibration
+        streams read it without pickling (see `LiveStreamHandler`)
+        slot_bytes: max bytes of a frame, e.g. len_frame * sampwidth * channels
+        '''
+        self.audio_tap = SharedRingBuffer(slot_bytes, num_slot)
+        return self.audio_tap
+
+    def enable_trace(self, path:str) -> TraceRecorder:
+        '''record control events and acks into a json lines trace, see `trace.replay_trace`'''
+        self.tracer = TraceRecorder(path)
+        return self.tracer
+
+    def fetch_tasks(self, block:bool=True, timeout:Optional[float]=None) -> List[StreamEvent]:
+        tasks = self.receive_tasks(block, timeout)
+        if self.tracer is not None:
+            # NOTE: traced before coalescing, a replay sends the whole burst of seeks again
+            for task in tasks:
+                self.tracer.record(TRACE_IN, task, self.position.value)
+        return coalesce_seeks(tasks)
+
+    def send_result(self, msg) -> None:
+        if self.tracer is not None:
+            if isinstance(msg, list):
+                self.tracer.record_acks(msg, self.position.value)
+            else:
+                self.tracer.record_acks([msg], self.position.value)
+        self.send_conn.put(msg)
+
+    def publish_frame(self, frame) -> None:
+        # NOTE: live inputs stamp frames with their capture time, tracks with the publish time
+        if self.audio_tap is not None:
+            self.audio_tap.write(frame, getattr(self.stream_handler.stream_data, 'capture_stamp', None))
+        # NOTE: broadcast once the frame is in the tap, a live vibration reading it on NEXT_FRAME finds it
+        self.broadcast_event(StreamEvent(head=StreamEventType.STREAM_NEXT_FRAME))
+
+    def set_tap_format(self) -> None:
+        if self.audio_tap is None:
+            return
+        data = self.stream_handler.stream_data
+        self.audio_tap.set_format(data.getsampwidth(), data.getnchannels(), data.getframerate())
+
     def enable_auto_init(self) -> None:
         self.auto_init = True
 
@@ -110,109 +273,205 @@ class AudioProcess(StreamProcess):
         self.auto_exit = False
     
     def detach_vibration_proc(self, proc:VibrationProcess) -> None:
-        recv, send = proc.event_queues()
-        self.attached_proc_send_conns.remove(recv)
-        self.attached_proc_recv_conns.remove(send)
+        conn = self.attached_proc_conns.pop(proc.name)
+        self.lagging.discard(conn)
+        self.attached_proc_send_conns.remove(conn)
+        self.attached_proc_recv_conns.remove(conn)
         self.num_vibration_stream -= 1
         self.num_vibration_stream = max(self.num_vibration_stream, 0)
         proc.unset_event_queues()
+        proc.set_seek_counter(None)
 
     def attach_vibration_proc(self, proc:VibrationProcess) -> None:
-        # IDEA: use P2P queues, no. attached procs -> 1 to 2
-        recv, send = Queue(), Queue()
-        proc.set_event_queues(recv, send)
-        self.attached_proc_recv_conns.append(send)
-        self.attached_proc_send_conns.append(recv)
+        # NOTE: one duplex pipe per vibration process, events are struct encoded
+        conn, proc_conn = StreamChannel.pair()
+        proc.set_event_queues(proc_conn, proc_conn)
+        proc.set_seek_counter(self.seek_seq)
+        self.attached_proc_recv_conns.append(conn)
+        self.attached_proc_send_conns.append(conn)
+        self.attached_proc_conns[proc.name] = conn
 
         self.num_vibration_stream += 1
 
     def broadcast_event(self, event:StreamEvent) -> None:
-        # NOTE: do not boardcast AUDIO_START and AUDIO_PULSE
+        # NOTE: events are posted without blocking, a stalled vibration process never stalls the audio
         if event.head == AudioStreamEventType.AUDIO_START:
             return
         elif event.head == AudioStreamEventType.AUDIO_PULSE:
             return
+        elif event.head == StreamEventType.STREAM_LOAD:
+            # NOTE: each vibration process loads its own stream data
+            vibrations = event.what.get('vibrations', [])
+            for send, data in zip(self.attached_proc_send_conns, vibrations):
+                send.post(StreamEvent(StreamEventType.STREAM_LOAD, {'data': data}))
+        elif event.head == StreamEventType.STREAM_APPEND:
+            vibrations = event.what.get('vibrations', [])
+            for send, data in zip(self.attached_proc_send_conns, vibrations):
+                send.post(StreamEvent(StreamEventType.STREAM_APPEND, {'data': data, 'start': event.what['start']}))
         elif event.head == AudioStreamEventType.AUDIO_RESUME:
             # NOTE: resume event aligns all vibration stream
-            pos = self.stream_handler.tell()
-            sevent = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': pos})
-            for send in self.attached_proc_send_conns:
-                send.put(sevent)
+            self.broadcast_seek(self.stream_handler.tell())
+        elif event.head == StreamEventType.STREAM_SEEK:
+            self.broadcast_seek(event.what['pos'])
+        elif event.head == StreamEventType.STREAM_NEXT_FRAME:
+            self.broadcast_next_frame()
         else:
             # NOTE: board other events
             for send in self.attached_proc_send_conns:
-                send.put(event)
+                send.post(event)
+
+    def resume_appended(self) -> None:
+        # NOTE: the stream paused at its old end before the append arrived, play on into the new data
+        self.paused_at_end = False
+        resume = AudioStreamEvent(head=AudioStreamEventType.AUDIO_RESUME)
+        self.stream_handler.handle(resume)
+        self.broadcast_event(resume)
+
+    def broadcast_next_frame(self) -> None:
+        # NOTE: called once the frame is read, its position is one before the stream's
+        seq = self.seek_seq.value
+        event = StreamEvent(StreamEventType.STREAM_NEXT_FRAME, {'seq': seq})
+        for send in self.attached_proc_send_conns:
+            if send in self.lagging:
+                # NOTE: frames were dropped, realign the vibration before it plays again
+                if not send.offer(StreamEvent(StreamEventType.STREAM_SEEK, {'pos': self.stream_handler.tell()-1, 'seq': seq})):
+                    self.dropped_frames.value += 1
+                    continue
+                self.lagging.discard(send)
+            if not send.offer(event):
+                self.lagging.add(send)
+                self.dropped_frames.value += 1
+
+    def flush_channels(self) -> bool:
+        '''send pending control events, True when none is left'''
+        done = True
+        for send in self.attached_proc_send_conns:
+            done &= send.flush()
+        return done
+        
+    def broadcast_seek(self, pos:int) -> None:
+        # NOTE: bump the sequence number first, vibration processes drop
+        # the frames tagged before it even if the seek is still queued
+        self.seek_seq.value += 1
+        sevent = StreamEvent(StreamEventType.STREAM_SEEK, {'pos': pos, 'seq': self.seek_seq.value})
+        for send in self.attached_proc_send_conns:
+            send.post(sevent)
+        # NOTE: the seek realigns lagging processes too
+        self.lagging.clear()
         
-    def collect_recvs(self, timeout:float=0.01) -> None:
+    def collect_recvs(self, timeout:float=0.) -> bool:
+        '''collect status replies without blocking the frame loop, True when all sent back'''
         if self.num_vibration_stream == 0:
-            return
+            return True
 
-        timeout /= self.num_vibration_stream
-        for i in range(len(self.received_msgs)):
-            try:
-                recv = self.attached_proc_recv_conns[i].get(block=True, timeout=timeout)
-            except Empty:
+        # NOTE: wait on all channels at once, no per-channel timeout polling
+        deadline = time.perf_counter() + timeout
+        if len(self.received_msgs) == 0:
+            self.pending_recvs = list(self.attached_proc_recv_conns)
+        pending = self.pending_recvs
+        while len(pending) > 0:
+            for conn in wait_channels(pending, max(0., deadline - time.perf_counter())):
+                self.received_msgs.append(conn.get_nowait())
+                pending.remove(conn)
+            if time.perf_counter() >= deadline:
                 break
-            else:
-                self.received_msgs.append(recv)
 
         if len(self.received_msgs) == self.num_vibration_stream:
-            self.send_conn.put(deepcopy(self.received_msgs))
+            self.send_result(deepcopy(self.received_msgs))
             self.received_msgs = []
+            return True
+        return False
     
     def run(self):
+        self.setup_realtime()
+        # NOTE: every read frame is published and broadcast before the (blocking) driver write
+        self.stream_handler.set_frame_tap(self.publish_frame)
+        # NOTE: progress bar is refreshed at display rate, not per frame
+        sampler = ProgressSampler(self.position, self.stream_handler.update_bar)
+        if self.stream_handler.enable_bar:
+            sampler.start()
+
         if self.auto_init:
             self.broadcast_event(StreamEvent(head=StreamEventType.STREAM_INIT))
             msg = self.stream_handler.on_init()
-            self.send_conn.put(msg)
+            self.send_result(msg)
+            self.position.value = self.stream_handler.tell()
+            self.after_session_setup()
+            self.set_tap_format()
 
+        collecting = False
         while True:
-            # IDEA: STEP 1, acquire control messages
-            try:
-                task = self.recv_conn.get(
-                    block=not self.stream_handler.is_activate()
-                ) # when stream is inactive, wait for next control signal
-            except Empty:
-                task = None # no task from main process
-            else:
+            # IDEA: STEP 1, acquire control messages, pending seeks are coalesced
+            # when stream is inactive, wait for next control signal
+            # NOTE: poll while control events wait for room in a vibration pipe
+            flushed = self.flush_channels()
+            tasks = self.fetch_tasks(block=not self.stream_handler.is_activate(), timeout=None if flushed else 0.05)
+            closed, status_acq = False, False
+            for task in tasks:
                 self.broadcast_event(task)
-                self.stream_handler.handle(task)
+                result = self.stream_handler.handle(task)
+                if result is not None:
+                    self.send_result(result) # e.g. num_frame of a new session
                 # NOTE: break 1, music stream close command
                 if task.head == StreamEventType.STREAM_CLOSE:
+                    closed = True
                     break
+                status_acq |= task.head == StreamEventType.STREAM_STATUS_ACQ
+                if task.head == StreamEventType.STREAM_APPEND and self.paused_at_end:
+                    self.resume_appended()
+                elif task.head in self.CONTROL_EVENTS:
+                    self.paused_at_end = False
+            if closed:
+                break
+            if any(t.head in self.POSITION_EVENTS for t in tasks):
+                self.position.value = self.stream_handler.tell()
+            if any(t.head in (StreamEventType.STREAM_INIT, StreamEventType.STREAM_LOAD) for t in tasks):
+                self.after_session_setup()
+                self.set_tap_format()
             
-            # IDEA: STEP 2, handle ack messages
-            if task is not None and task.head == StreamEventType.STREAM_STATUS_ACQ:
-                # TODO: collect stream response
-                self.collect_recvs()
+            # IDEA: STEP 2, handle ack messages, replies are polled once per frame
+            # while playing and only waited for when the stream is inactive
+            collecting |= status_acq
+            if collecting:
+                timeout = 0. if self.stream_handler.is_activate() else 0.1
+                collecting = not self.collect_recvs(timeout)
             
             # IDEA: STEP 3, always procceed with next frame when activate
             if self.stream_handler.is_activate():
-                self.broadcast_event(StreamEvent(head=StreamEventType.STREAM_NEXT_FRAME))
-
                 try:
                     self.stream_handler.on_next_frame()
                 except StreamEndException:
                     # NOTE: break 2, music stream ends
+                    if self.tracer is not None:
+                        self.tracer.record(TRACE_END, StreamEvent(head=StreamEventType.STREAM_NEXT_FRAME), self.position.value)
                     if self.auto_exit:
                         self.broadcast_event(StreamEvent(head=StreamEventType.STREAM_CLOSE))
                         self.stream_handler.on_close()
                         break
                     else:
                         self.stream_handler.on_pulse()
+                        self.paused_at_end = True
                 except Exception as e:
                     # NOTE: break 3, music playing errors
                     print(f'playing error {e}')
                     break
 
-                if self.frame_ack:
-                    try:
-                        self.send_conn.put(AudioStreamEvent(
-                            head=AudioStreamEventType.STREAM_STATUS_ACK, what={'pos': self.stream_handler.tell()}))
-                    except:
-                        pass
+                self.position.value = self.stream_handler.tell()
+                if self.frame_timer is not None: self.frame_timer.tick()
+            elif self.tracer is not None:
+                # NOTE: write the trace only when idle, no file io between frames
+                self.tracer.flush()
         
         # IDEA: STEP 4, before exit, check and try to close handler, no exception raised
+        sampler.stop()
+        for send in self.attached_proc_send_conns:
+            # NOTE: a pending CLOSE must reach a vibration process that was behind
+            try:
+                send.flush(block=True)
+            except OSError:
+                pass
+        if self.tracer is not None:
+            self.tracer.flush()
         if self.stream_handler.is_activate():
             try:
                 self.stream_handler.on_close()
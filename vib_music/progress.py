@@ -0,0 +1,28 @@
+import time
+from threading import Thread, Event
+from typing import Any, Callable
+
+class ProgressSampler(Thread):
+    '''
+    Sample a shared position counter at display rate.
+
+    The frame loop only writes the counter, displays (progress bar, GUI slider)
+    poll it from this thread, so nothing is sent or drawn per frame.
+    '''
+    def __init__(self, position:Any, callback:Callable[[int], None], rate:float=25.0) -> None:
+        super(ProgressSampler, self).__init__(daemon=True)
+        self.position = position # multiprocessing.Value
+        self.callback = callback
+        self.interval = 1. / rate
+        self.end_event = Event()
+
+    def run(self) -> None:
+        last_pos = None
+        while not self.end_event.wait(self.interval):
+            pos = self.position.value
+            if pos != last_pos:
+                self.callback(pos)
+                last_pos = pos
+
+    def stop(self) -> None:
+        self.end_event.set()
@@ -0,0 +1,246 @@
+import os
+import gc
+import time
+import numpy as np
+from multiprocessing import Array, Value
+from typing import Dict, Iterable, Optional, Sequence
+
+def apply_realtime(cpus:Optional[Iterable[int]]=None, priority:Optional[int]=None,
+    nice:Optional[int]=None, gc_mode:Optional[str]='freeze') -> Dict:
+    '''
+    Tune the calling process for playback, each setting is best effort.
+
+    cpus: CPU affinity, e.g. [2] for an isolated core
+    priority: SCHED_FIFO priority (1-99), falls back to `nice` when not permitted
+    nice: nice level, negative values usually need privileges
+    gc_mode: 'freeze' moves setup objects out of GC scans, 'disable' also stops automatic GC
+    returns the achieved settings
+    '''
+    report = {}
+
+    if cpus is not None and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, set(cpus))
+        except OSError as e:
+            report['affinity_error'] = str(e)
+    if hasattr(os, 'sched_getaffinity'):
+        report['affinity'] = sorted(os.sched_getaffinity(0))
+
+    if priority is not None and hasattr(os, 'SCHED_FIFO'):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except (OSError, PermissionError) as e:
+            report['scheduler_error'] = str(e)
+    if hasattr(os, 'sched_getscheduler'):
+        policy = os.sched_getscheduler(0)
+        report['scheduler'] = 'SCHED_FIFO' if policy == getattr(os, 'SCHED_FIFO', None) else 'SCHED_OTHER'
+        report['priority'] = os.sched_getparam(0).sched_priority
+
+    if nice is not None and report.get('scheduler') != 'SCHED_FIFO':
+        try:
+            os.nice(nice - os.nice(0))
+        except (OSError, PermissionError) as e:
+            report['nice_error'] = str(e)
+    if hasattr(os, 'nice'):
+        report['nice'] = os.nice(0)
+
+    report['gc'] = freeze_gc(gc_mode)
+
+    return report
+
+def freeze_gc(gc_mode:Optional[str]='freeze') -> str:
+    # NOTE: call again after a new session is loaded, new objects are not frozen yet
+    if gc_mode is None:
+        return 'enabled'
+
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    if gc_mode == 'disable':
+        gc.disable()
+        return 'disabled'
+    return 'frozen'
+
+def sleep_until(deadline:float, spin:float=0.001) -> None:
+    '''sleep then spin until `deadline` (time.perf_counter), sleep alone overshoots by ~0.1ms'''
+    remain = deadline - time.perf_counter() - spin
+    if remain > 0:
+        time.sleep(remain)
+    while time.perf_counter() < deadline:
+        pass
+
+class FrameTimer(object):
+    '''
+    Record frame timestamps into shared memory, stats can be read by any process.
+    '''
+    def __init__(self, capacity:int=100000) -> None:
+        super(FrameTimer, self).__init__()
+        self.capacity = capacity
+        self.stamps = Array('d', capacity, lock=False)
+        self.count = Value('q', 0, lock=False)
+
+    def tick(self, stamp:Optional[float]=None) -> None:
+        n = self.count.value
+        if n < self.capacity:
+            self.stamps[n] = time.perf_counter() if stamp is None else stamp
+            self.count.value = n + 1
+
+    def reset(self) -> None:
+        self.count.value = 0
+
+    def timestamps(self) -> np.ndarray:
+        return np.frombuffer(self.stamps, dtype=np.float64, count=self.count.value).copy()
+
+    def intervals(self) -> np.ndarray:
+        return np.diff(self.timestamps())
+
+    def stats(self) -> Dict:
+        '''frame interval statistics in ms'''
+        intervals = self.intervals() * 1000.
+        if intervals.shape[0] == 0:
+            return {'num_frame': self.count.value}
+        return {
+            'num_frame': self.count.value,
+            'mean': float(intervals.mean()),
+            'std': float(intervals.std()),
+            'p50': float(np.percentile(intervals, 50)),
+            'p99': float(np.percentile(intervals, 99)),
+            'max': float(intervals.max()),
+        }
+
+class StageTimer(object):
+    '''
+    Per-frame duration of each stage of the frame loop in shared memory, the
+    playing process calls `begin`, `lap` after every stage and `commit`;
+    stages a frame skips stay NaN.
+    '''
+    def __init__(self, stages:Sequence[str], capacity:int=100000) -> None:
+        super(StageTimer, self).__init__()
+        self.stages = list(stages)
+        self.capacity = capacity
+        self.durations = Array('d', capacity * len(self.stages), lock=False)
+        self.count = Value('q', 0, lock=False)
+        self.mark = 0.
+
+    def begin(self) -> None:
+        n = self.count.value
+        if n < self.capacity:
+            k = len(self.stages)
+            self.durations[n*k:(n+1)*k] = [np.nan] * k
+        self.mark = time.perf_counter()
+
+    def lap(self, stage:int) -> None:
+        now = time.perf_counter()
+        n = self.count.value
+        if n < self.capacity:
+            self.durations[n*len(self.stages)+stage] = now - self.mark
+        self.mark = now
+
+    def commit(self) -> None:
+        if self.count.value < self.capacity:
+            self.count.value += 1
+
+    def reset(self) -> None:
+        self.count.value = 0
+
+    def table(self) -> np.ndarray:
+        '''(frame, stage) durations in ms'''
+        n = self.count.value
+        durations = np.frombuffer(self.durations, dtype=np.float64, count=n*len(self.stages))
+        return durations.reshape((n, len(self.stages))) * 1000.
+
+    def stats(self) -> Dict:
+        '''duration statistics of each stage in ms, over the frames that ran it'''
+        table = self.table()
+        stats = {}
+        for i, name in enumerate(self.stages):
+            durations = table[:, i]
+            durations = durations[~np.isnan(durations)]
+            if durations.shape[0] == 0:
+                continue
+            stats[name] = {
+                'num_frame': int(durations.shape[0]),
+                'mean': float(durations.mean()),
+                'p50': float(np.percentile(durations, 50)),
+                'p99': float(np.percentile(durations, 99)),
+                'max': float(durations.max()),
+            }
+        return stats
+
+class LatencyProbe(object):
+    '''
+    Capture to output latency of live frames in shared memory, the output process
+    records the capture stamp of every frame once its driver has written it.
+    '''
+    def __init__(self, capacity:int=100000) -> None:
+        super(LatencyProbe, self).__init__()
+        self.capture = FrameTimer(capacity)
+        self.output = FrameTimer(capacity)
+
+    def record(self, capture_stamp:float) -> None:
+        self.capture.tick(capture_stamp)
+        self.output.tick()
+
+    def reset(self) -> None:
+        self.capture.reset()
+        self.output.reset()
+
+    def latencies(self) -> np.ndarray:
+        '''latency of every recorded frame in ms'''
+        n = min(self.capture.count.value, self.output.count.value)
+        return (self.output.timestamps()[:n] - self.capture.timestamps()[:n]) * 1000.
+
+    def stats(self, budget:Optional[float]=None) -> Dict:
+        '''latency statistics in ms, frames over `budget` ms are counted'''
+        latencies = self.latencies()
+        if latencies.shape[0] == 0:
+            return {'num_frame': 0}
+        stats = {
+            'num_frame': int(latencies.shape[0]),
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()),
+        }
+        if budget is not None:
+            stats['over_budget'] = int((latencies > budget).sum())
+        return stats
+
+class FrameClock(object):
+    '''
+    Monotonic deadline scheduler, sleep then spin until each frame deadline.
+
+    Late frames are counted as missed deadlines, a frame later than a whole
+    period restarts the clock instead of bursting to catch up.
+    '''
+    def __init__(self, rate:float, spin:float=0.001) -> None:
+        super(FrameClock, self).__init__()
+        self.period = 1. / rate
+        self.spin = spin
+        self.deadline:Optional[float] = None
+
+        self.missed = Value('q', 0, lock=False)
+        self.max_late = Value('d', 0., lock=False)
+
+    def reset(self) -> None:
+        self.deadline = None
+
+    def wait(self) -> None:
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+            return
+
+        self.deadline += self.period
+        late = now - self.deadline
+        if late > 0:
+            self.missed.value += 1
+            self.max_late.value = max(self.max_late.value, late)
+            if late > self.period:
+                self.deadline = now
+            return
+
+        sleep_until(self.deadline, self.spin)
+
+    def stats(self) -> Dict:
+        return {'missed': self.missed.value, 'max_late': self.max_late.value * 1000.}
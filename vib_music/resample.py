@@ -0,0 +1,82 @@
+import numpy as np
+
+RESAMPLE_METHODS = ('hold', 'linear', 'polyphase')
+
+def polyphase_table(ratio:float, taps:int=8, phases:int=32) -> np.ndarray:
+    '''
+    windowed-sinc weights for every fractional phase, `(phases, taps)`;
+    `ratio` is device rate / control rate, the cutoff is lowered when decimating
+    '''
+    cutoff = min(1., ratio)
+    taps = int(np.ceil(taps / cutoff / 2)) * 2
+    offsets = np.arange(-taps//2 + 1, taps//2 + 1)
+    frac = np.arange(phases) / phases
+    d = offsets[None, :] - frac[:, None]
+    weights = cutoff * np.sinc(cutoff * d) * np.kaiser(taps + 1, 6.)[1:][None, :].repeat(phases, axis=0)
+    weights /= weights.sum(axis=1, keepdims=True) # NOTE: unit DC gain, a constant stays constant
+    return weights.astype(np.float32)
+
+class RateConverter(object):
+    '''
+    Render a control track `(num_control, num_channel)` sampled at `control_rate`
+    at `device_rate`, any range of device samples on demand.
+    Scratch buffers are preallocated for `max_block` samples and grown if needed.
+    '''
+    def __init__(self, control:np.ndarray, control_rate:float, device_rate:float,
+        method:str='linear', max_block:int=256, taps:int=8, phases:int=32) -> None:
+        super(RateConverter, self).__init__()
+        if method not in RESAMPLE_METHODS:
+            raise ValueError(f'unknown resample method {method}')
+        self.control = np.ascontiguousarray(control, dtype=np.float32)
+        self.step = control_rate / device_rate # NOTE: control samples per device sample
+        self.method = method
+        self.phases = phases
+
+        if method == 'polyphase':
+            self.table = polyphase_table(device_rate / control_rate, taps, phases)
+            self.offsets = np.arange(-self.table.shape[1]//2 + 1, self.table.shape[1]//2 + 1)
+        self._alloc(max_block)
+
+    def _alloc(self, n:int) -> None:
+        self.max_block = n
+        self.x = np.empty(n, dtype=np.float64)
+        self.index = np.empty(n, dtype=np.int64)
+        self.frac = np.empty(n, dtype=np.float32)
+        self.out = np.empty((n, self.control.shape[1]), dtype=np.float32)
+        self.tmp = np.empty_like(self.out)
+
+    def num_device(self) -> int:
+        '''device samples covering the whole control track'''
+        return int(np.ceil(self.control.shape[0] / self.step))
+
+    def render(self, start:int, n:int) -> np.ndarray:
+        '''device samples `[start, start+n)`, a view of a buffer reused by the next call'''
+        if n > self.max_block:
+            self._alloc(n)
+        x, index, frac = self.x[:n], self.index[:n], self.frac[:n]
+        out, tmp = self.out[:n], self.tmp[:n]
+        last = self.control.shape[0] - 1
+
+        np.multiply(np.arange(start, start+n), self.step, out=x)
+        index[:] = x # NOTE: positions are not negative, truncation is floor
+        if self.method == 'hold':
+            np.clip(index, 0, last, out=index)
+            np.take(self.control, index, axis=0, out=out)
+            return out
+
+        np.subtract(x, index, out=frac, casting='unsafe')
+        if self.method == 'linear':
+            np.clip(index, 0, last, out=index)
+            np.take(self.control, index, axis=0, out=out)
+            np.minimum(index + 1, last, out=index)
+            np.take(self.control, index, axis=0, out=tmp)
+            tmp -= out
+            tmp *= frac[:, None]
+            out += tmp
+            return out
+
+        # NOTE: polyphase, the fractional position selects a row of the filter table
+        phase = np.minimum((frac * self.phases).astype(np.int64), self.phases - 1)
+        idx = np.clip(index[:, None] + self.offsets[None, :], 0, last)
+        np.einsum('nt,ntc->nc', self.table[phase], self.control[idx], out=out)
+        return out
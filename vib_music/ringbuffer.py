@@ -0,0 +1,126 @@
+import time
+import numpy as np
+from multiprocessing import RawArray, Value
+from typing import Optional
+
+class SharedRingBuffer(object):
+    '''
+    Single-producer / multi-consumer ring of fixed-size slots in shared memory.
+
+    The producer never waits for consumers, each consumer keeps its own read
+    index (see `RingReader`) and detects overruns by the slot sequence numbers.
+    '''
+    def __init__(self, slot_bytes:int, num_slot:int=64) -> None:
+        super(SharedRingBuffer, self).__init__()
+        self.slot_bytes = slot_bytes
+        self.num_slot = num_slot
+
+        self.data = RawArray('B', slot_bytes*num_slot)
+        self.slot_seq = RawArray('q', num_slot) # sequence number stored in each slot
+        self.slot_len = RawArray('q', num_slot) # valid bytes of each slot
+        self.slot_stamp = RawArray('d', num_slot) # capture or publish time of each slot
+        self.write_seq = Value('q', 0, lock=False) # next sequence number to write
+        # NOTE: sample format of the payload, written by the producer
+        self.meta = RawArray('q', 3) # sample width, channels, rate
+
+        for i in range(num_slot):
+            self.slot_seq[i] = -1
+
+    def set_format(self, sampwidth:int, nchannels:int, rate:int) -> None:
+        self.meta[0], self.meta[1], self.meta[2] = sampwidth, nchannels, rate
+
+    def get_format(self):
+        return tuple(self.meta)
+
+    def write(self, frame, stamp:Optional[float]=None) -> None:
+        '''copy one frame (bytes-like) into the next slot, stamped now if no `stamp`'''
+        frame = memoryview(frame).cast('B')
+        num_bytes = min(len(frame), self.slot_bytes)
+        seq = self.write_seq.value
+        i = seq % self.num_slot
+
+        # NOTE: invalidate the slot first, so a reader never sees half written data as valid
+        self.slot_seq[i] = -1
+        offset = i * self.slot_bytes
+        memoryview(self.data).cast('B')[offset:offset+num_bytes] = frame[:num_bytes]
+        self.slot_len[i] = num_bytes
+        self.slot_stamp[i] = time.perf_counter() if stamp is None else stamp
+        self.slot_seq[i] = seq
+        self.write_seq.value = seq + 1
+
+    def latest(self, dtype:Optional[np.dtype]=np.uint8, retry:int=3) -> Optional[np.ndarray]:
+        '''copy of the newest frame, never waits for the producer'''
+        view = np.frombuffer(self.data, dtype=np.uint8)
+        for _ in range(retry):
+            seq = self.write_seq.value - 1
+            if seq < 0:
+                return None
+            i = seq % self.num_slot
+            offset = i * self.slot_bytes
+            frame = view[offset:offset+self.slot_len[i]].copy()
+            # NOTE: retry if the producer overwrote the slot while copying
+            if self.slot_seq[i] == seq:
+                return frame.view(dtype)
+        return None
+
+    def reader(self, dtype:Optional[np.dtype]=None):
+        return RingReader(self, dtype)
+
+class RingReader(object):
+    '''per-consumer read index of a `SharedRingBuffer`, create it in the consumer process'''
+    def __init__(self, ring:SharedRingBuffer, dtype:Optional[np.dtype]=None) -> None:
+        super(RingReader, self).__init__()
+        self.ring = ring
+        self.dtype = dtype
+        self.read_seq = ring.write_seq.value
+        self.overruns = 0 # number of frames lost because the reader was too slow
+        self.stamp = 0. # stamp of the last read frame
+
+        self.view = np.frombuffer(ring.data, dtype=np.uint8)
+
+    def available(self) -> int:
+        return self.ring.write_seq.value - self.read_seq
+
+    def seek_latest(self) -> None:
+        # NOTE: live consumers drop the backlog after a seek
+        self.read_seq = self.ring.write_seq.value
+
+    def skip_to(self, lag:int) -> int:
+        '''drop the backlog but the newest `lag` frames, returns frames dropped'''
+        dropped = max(self.available() - lag, 0)
+        self.read_seq += dropped
+        return dropped
+
+    def read(self) -> Optional[np.ndarray]:
+        '''zero-copy view of the next frame, None if nothing new'''
+        write_seq = self.ring.write_seq.value
+        if write_seq - self.read_seq > self.ring.num_slot:
+            # NOTE: producer lapped the reader, jump to the oldest frame still in the ring
+            lost = write_seq - self.ring.num_slot - self.read_seq
+            self.overruns += lost
+            self.read_seq += lost
+        if self.read_seq >= write_seq:
+            return None
+
+        seq = self.read_seq
+        i = seq % self.ring.num_slot
+        if self.ring.slot_seq[i] != seq:
+            # NOTE: slot is being overwritten right now
+            self.overruns += 1
+            self.read_seq += 1
+            return None
+
+        offset = i * self.ring.slot_bytes
+        frame = self.view[offset:offset+self.ring.slot_len[i]]
+        self.stamp = self.ring.slot_stamp[i]
+        self.read_seq += 1
+
+        dtype = self.dtype
+        if dtype is None:
+            dtype = {1: np.uint8, 2: np.int16, 4: np.int32}.get(self.ring.meta[0], np.uint8)
+        return frame.view(dtype)
+
+    def is_valid(self, seq:Optional[int]=None) -> bool:
+        '''check the last read frame has not been overwritten while in use'''
+        seq = self.read_seq - 1 if seq is None else seq
+        return self.ring.slot_seq[seq % self.ring.num_slot] == seq
@@ -0,0 +1,145 @@
+from multiprocessing import Queue
+from queue import Empty
+from typing import Dict, List, Optional
+
+from .core import StreamDataI, AudioStreamI, StreamDriverBase
+from .core import StreamEvent, StreamEventType
+from .streamhandler import StreamHandler, AudioStreamHandler
+from .streamhandler import AudioStreamEvent, AudioStreamEventType
+from .processes import AudioProcess, VibrationProcess
+
+class PlayerService(object):
+    '''
+    Long-lived audio and vibration processes.
+
+    The worker processes, their opened drivers and imported modules stay warm
+    between plays, a new track is loaded through `load_session`.
+    '''
+    def __init__(self, audio_proc:AudioProcess, vib_procs:List[VibrationProcess]=[],
+        persistent:bool=True) -> None:
+        super(PlayerService, self).__init__()
+        self.audio_proc = audio_proc
+        self.vib_procs = list(vib_procs)
+        self.persistent = persistent
+
+        self.commands, self.results = Queue(), Queue()
+        self.audio_proc.set_event_queues(self.commands, self.results)
+        for p in self.vib_procs:
+            self.audio_proc.attach_vibration_proc(p)
+        # NOTE: a service never exits at the end of a session
+        self.audio_proc.enable_manual_exit()
+
+        self.is_running = False
+        self.num_frame = 0
+
+    @classmethod
+    def from_drivers(cls, audio_driver:StreamDriverBase, vib_drivers:List[StreamDriverBase]):
+        # NOTE: stream data are empty until the first session is loaded
+        audio_proc = AudioProcess(AudioStreamHandler(None, audio_driver))
+        vib_procs = [VibrationProcess(StreamHandler(None, d)) for d in vib_drivers]
+        return cls(audio_proc, vib_procs, persistent=True)
+
+    def start(self) -> None:
+        if self.is_running: return
+        for p in self.vib_procs:
+            p.start()
+        self.audio_proc.start()
+        self.is_running = True
+
+    def is_alive(self) -> bool:
+        return self.is_running and self.audio_proc.is_alive()
+
+    @property
+    def position(self):
+        '''shared playing position, sample it at display rate'''
+        return self.audio_proc.position
+
+    def tell(self) -> int:
+        return self.audio_proc.position.value
+
+    def _wait_num_frame(self, timeout:Optional[float]=None) -> int:
+        while True:
+            try:
+                msg = self.results.get(block=True, timeout=timeout)
+            except Empty:
+                return -1
+            # NOTE: drop the status acks left from the last session, vibration
+            # acks come as a list of events
+            if isinstance(msg, StreamEvent) and 'num_frame' in msg.what:
+                self.num_frame = msg.what['num_frame']
+                return self.num_frame
+
+    def _drain_results(self) -> None:
+        while True:
+            try:
+                self.results.get_nowait()
+            except Empty:
+                return
+
+    def init_session(self, timeout:Optional[float]=None) -> int:
+        '''initialize the stream data the processes are created with'''
+        self.start()
+        self.commands.put(StreamEvent(head=StreamEventType.STREAM_INIT))
+        return self._wait_num_frame(timeout)
+
+    def load_session(self, audio:AudioStreamI, vibrations:List[StreamDataI],
+        timeout:Optional[float]=None) -> int:
+        '''load a new track and its vibrations, returns the number of audio frames'''
+        if len(vibrations) != len(self.vib_procs):
+            raise ValueError(f'expect {len(self.vib_procs)} vibration streams, got {len(vibrations)}')
+
+        self.start()
+        self.commands.put(StreamEvent(head=StreamEventType.STREAM_LOAD,
+            what={'data': audio, 'vibrations': vibrations}))
+        return self._wait_num_frame(timeout)
+
+    def status(self, timeout:Optional[float]=1.0) -> List[StreamEvent]:
+        '''request status of all devices, audio first then each vibration process'''
+        self.commands.put(StreamEvent(head=StreamEventType.STREAM_STATUS_ACQ))
+        acks = []
+        while True:
+            try:
+                msg = self.results.get(block=True, timeout=timeout)
+            except Empty:
+                return acks
+            if isinstance(msg, list):
+                return acks + msg
+            acks.append(msg)
+
+    def telemetry(self) -> List[Optional[Dict]]:
+        '''latest telemetry of each vibration driver, read from shared memory'''
+        return [p.get_handler().stream_driver.telemetry_snapshot() for p in self.vib_procs]
+
+    def play(self) -> None:
+        self.commands.put(AudioStreamEvent(head=AudioStreamEventType.AUDIO_START))
+
+    def pause(self) -> None:
+        self.commands.put(AudioStreamEvent(head=AudioStreamEventType.AUDIO_PULSE))
+
+    def resume(self) -> None:
+        self.commands.put(AudioStreamEvent(head=AudioStreamEventType.AUDIO_RESUME))
+
+    def seek(self, pos:int) -> None:
+        self.commands.put(AudioStreamEvent(head=AudioStreamEventType.STREAM_SEEK, what={'pos': pos}))
+
+    def stop(self) -> None:
+        '''end a session, a persistent service keeps its processes'''
+        if not self.is_running: return
+        if not self.persistent:
+            self.close()
+            return
+
+        self.pause()
+        self.seek(0)
+
+    def close(self) -> None:
+        if not self.is_running: return
+
+        self.commands.put(StreamEvent(head=StreamEventType.STREAM_CLOSE))
+        while self.audio_proc.is_alive():
+            # NOTE: audio process cannot exit before its results are consumed
+            self._drain_results()
+            self.audio_proc.join(timeout=0.1)
+        for p in self.vib_procs:
+            p.join()
+        self.is_running = False
@@ -0,0 +1,216 @@
+import time
+import threading
+import numpy as np
+from multiprocessing import Array, Value
+from typing import Dict, Optional
+
+from .drivers import AudioDriver, PCF8591Driver, UARTDriver
+from .realtime import sleep_until
+
+class WriteRecorder(object):
+    '''
+    Timestamp and value of every write in shared memory, readable by the
+    process that created the driver after the driver process ran.
+    '''
+    def __init__(self, capacity:int=1000000) -> None:
+        super(WriteRecorder, self).__init__()
+        self.capacity = capacity
+        self.stamps = Array('d', capacity, lock=False)
+        self.values = Array('q', capacity, lock=False)
+        self.count = Value('q', 0, lock=False)
+
+    def record(self, value:int, stamp:Optional[float]=None) -> None:
+        n = self.count.value
+        if n < self.capacity:
+            self.stamps[n] = time.perf_counter() if stamp is None else stamp
+            self.values[n] = value
+            self.count.value = n + 1
+
+    def reset(self) -> None:
+        self.count.value = 0
+
+    def timestamps(self) -> np.ndarray:
+        return np.frombuffer(self.stamps, dtype=np.float64, count=self.count.value).copy()
+
+    def written(self) -> np.ndarray:
+        return np.frombuffer(self.values, dtype=np.int64, count=self.count.value).copy()
+
+    def stats(self) -> Dict:
+        '''number of writes and write interval statistics in ms'''
+        stamps = self.timestamps()
+        if stamps.shape[0] < 2:
+            return {'num_write': stamps.shape[0]}
+        intervals = np.diff(stamps) * 1000.
+        return {
+            'num_write': stamps.shape[0],
+            'duration': (stamps[-1] - stamps[0]) * 1000.,
+            'mean': float(intervals.mean()),
+            'p99': float(np.percentile(intervals, 99)),
+            'max': float(intervals.max()),
+        }
+
+def board_feedback(cmd:bytes) -> bytes:
+    '''
+    7-byte current feedback of the vibration board for a `BC01...DF` command,
+    BC 01 <channels> <voltage> ...: channels driven high draw a current
+    proportional to the voltage
+    '''
+    feedback = bytearray([0xBC, 0, 0, 0, 0, 0xAF, 0xDF])
+    if len(cmd) > 3:
+        channels, volt = cmd[2], cmd[3]
+        for i in range(4):
+            if (channels >> (2*i)) & 0b11 == 0b10:
+                feedback[1+i] = volt
+    return bytes(feedback)
+
+class SimSMBus(object):
+    '''
+    SMBus writes at a given bus clock: start, address and command bytes, then
+    data bytes each with an ack bit, then stop; 29 bit times for a single byte.
+    Every data byte is recorded at the time the DAC would be updated.
+    '''
+    BITS_HEAD = 1 + 2 * 9
+    BITS_BYTE = 9
+
+    def __init__(self, bus_hz:int, recorder:WriteRecorder) -> None:
+        super(SimSMBus, self).__init__()
+        self.bit_time = 1. / bus_hz
+        self.recorder = recorder
+
+    def write_i2c_block_data(self, addr:int, cmd:int, values) -> None:
+        start = time.perf_counter()
+        byte_time = self.BITS_BYTE * self.bit_time
+        end = start + (self.BITS_HEAD + len(values) * self.BITS_BYTE + 1) * self.bit_time
+        sleep_until(end, spin=min(end - start, 0.0005))
+        for k, v in enumerate(values):
+            self.recorder.record(int(v), start + self.BITS_HEAD * self.bit_time + (k+1) * byte_time)
+
+    def write_byte_data(self, addr:int, cmd:int, value:int) -> None:
+        self.write_i2c_block_data(addr, cmd, [value])
+
+    def close(self) -> None:
+        return
+
+class SimSerial(object):
+    '''
+    Serial port at a given baud rate (8N1, 10 bits per byte), every command
+    is answered with a 7-byte current feedback after `response_delay`.
+    '''
+    def __init__(self, baud:int, response_delay:float, recorder:WriteRecorder, timeout:float=0.01) -> None:
+        super(SimSerial, self).__init__()
+        self.byte_time = 10. / baud
+        self.response_delay = response_delay
+        self.recorder = recorder
+        self.timeout = timeout
+        self.is_open = True
+
+        self.lock = threading.Condition()
+        self.responses = [] # (ready time, feedback)
+
+    def write(self, data:bytes) -> int:
+        end = time.perf_counter() + len(data) * self.byte_time
+        sleep_until(end, spin=0.0005)
+        self.recorder.record(len(data))
+
+        feedback = board_feedback(data)
+        ready = end + self.response_delay + len(feedback) * self.byte_time
+        with self.lock:
+            self.responses.append((ready, feedback))
+            self.lock.notify()
+        return len(data)
+
+    def read(self, size:int=1) -> bytes:
+        deadline = time.perf_counter() + self.timeout
+        with self.lock:
+            while True:
+                now = time.perf_counter()
+                if len(self.responses) > 0 and self.responses[0][0] <= now:
+                    return self.responses.pop(0)[1][:size]
+                wait_until = deadline if len(self.responses) == 0 else min(deadline, self.responses[0][0])
+                if now >= deadline:
+                    return b''
+                self.lock.wait(wait_until - now)
+
+    def close(self) -> None:
+        self.is_open = False
+
+class SimAudioStream(object):
+    '''
+    Blocking output stream consuming samples at the stream rate, a write
+    returns once the frame fits into the `latency` seconds device buffer.
+    '''
+    def __init__(self, sampwidth:int, channels:int, rate:int, latency:float, recorder:WriteRecorder,
+        underruns:Optional[Value]=None) -> None:
+        super(SimAudioStream, self).__init__()
+        self.frame_bytes = sampwidth * channels
+        self.rate = rate
+        self.latency = latency
+        self.recorder = recorder
+        self.underruns = underruns
+        self.play_end:Optional[float] = None # time the buffered samples are played out
+        self.stopped = False
+
+    def write(self, frame:bytes) -> None:
+        now = time.perf_counter()
+        if self.play_end is None or self.play_end < now:
+            if self.play_end is not None and self.underruns is not None:
+                self.underruns.value += 1
+            self.play_end = now # NOTE: buffer underrun, the device played silence
+        num_sample = len(frame) // self.frame_bytes
+        self.play_end += num_sample / self.rate
+        sleep_until(self.play_end - self.latency)
+        self.recorder.record(num_sample)
+
+    def is_stopped(self) -> bool:
+        return self.stopped
+
+    def start_stream(self) -> None:
+        self.stopped = False
+        self.play_end = None
+
+    def stop_stream(self) -> None:
+        self.stopped = True
+
+    def close(self) -> None:
+        return
+
+class SimPCF8591Driver(PCF8591Driver):
+    '''`PCF8591Driver` on a simulated I2C bus, 100kHz (standard) or 400kHz (fast mode)'''
+    def __init__(self, bus_hz:int=100000, sample_rate:Optional[float]=None, capacity:int=1000000) -> None:
+        super(SimPCF8591Driver, self).__init__(sample_rate)
+        self.bus_hz = bus_hz
+        self.writes = WriteRecorder(capacity)
+
+    def open_bus(self) -> SimSMBus:
+        return SimSMBus(self.bus_hz, self.writes)
+
+class SimUARTDriver(UARTDriver):
+    '''`UARTDriver` on a simulated serial port and vibration board'''
+    def __init__(self, baud:int=115200, response_delay:float=0.002, capacity:int=1000000) -> None:
+        super(SimUARTDriver, self).__init__(baudrate=baud)
+        self.baud = baud
+        self.response_delay = response_delay
+        self.writes = WriteRecorder(capacity)
+
+    def open_port(self) -> SimSerial:
+        return SimSerial(self.baud, self.response_delay, self.writes)
+
+class SimAudioDriver(AudioDriver):
+    '''`AudioDriver` on a simulated sound card, paces the audio process like real playback'''
+    def __init__(self, latency:float=0.05, capacity:int=1000000) -> None:
+        super(SimAudioDriver, self).__init__()
+        self.latency = latency
+        self.writes = WriteRecorder(capacity)
+        self.underruns = Value('q', 0, lock=False)
+
+    def on_init(self, what:Dict) -> None:
+        stream_format = (what['format'], what['channels'], what['rate'])
+        if self.stream is not None and self.stream_format == stream_format:
+            if self.stream.is_stopped():
+                self.stream.start_stream()
+            return
+        self.stream = SimAudioStream(what['format'], what['channels'], what['rate'], self.latency, self.writes, self.underruns)
+        self.stream_format = stream_format
+
+    def on_close(self, what:Optional[Dict]=None) -> None:
+        self.stream, self.stream_format = None, None
@@ -5,11 +5,21 @@ from vib_music.core import StreamEvent
 
 from .core import AudioStreamI, StreamDriverBase, StreamDataI
 from .core import StreamEvent, StreamEventType
+from .core import register_event_types
 from .drivers import AudioDriver
+from .ringbuffer import SharedRingBuffer, RingReader
+from .realtime import LatencyProbe, StageTimer
 
 class StreamEndException(Exception):
     pass
 
+# NOTE: stages of a frame, see `StreamProcess.enable_stage_timer`
+# read: next frame of the stream data (or the tap and the live mapping)
+# broadcast: audio tap write and NEXT_FRAME to the vibration processes
+# write: driver `on_next_frame`
+FRAME_STAGES = ('read', 'broadcast', 'write')
+STAGE_READ, STAGE_BROADCAST, STAGE_WRITE = range(len(FRAME_STAGES))
+
 @unique
 class AudioStreamEventType(IntEnum):
     # events handled by a stream driver
@@ -18,6 +28,7 @@ class AudioStreamEventType(IntEnum):
     STREAM_CLOSE = StreamEventType.STREAM_CLOSE
     # event handled by a stream data
     STREAM_SEEK = StreamEventType.STREAM_SEEK
+    STREAM_LOAD = StreamEventType.STREAM_LOAD
     # events handled by a stream handler?
     STREAM_STATUS_ACQ = StreamEventType.STREAM_STATUS_ACQ
     STREAM_STATUS_ACK = StreamEventType.STREAM_STATUS_ACK
@@ -26,6 +37,10 @@ class AudioStreamEventType(IntEnum):
     AUDIO_PULSE = auto()
     AUDIO_RESUME = auto()
 
+    STREAM_APPEND = StreamEventType.STREAM_APPEND
+
+register_event_types(AudioStreamEventType)
+
 class AudioStreamEvent(NamedTuple):
     head: AudioStreamEventType
     what: Dict = {}
@@ -42,11 +57,16 @@ class StreamHandler(object):
         self.stream_data = stream_data # inputs
         self.stream_driver = stream_driver # outputs
         self.stream_state = StreamState.STREAM_INACTIVE
+        self.frame_tap:Optional[Callable] = None
+        self.stage_timer:Optional[StageTimer] = None
 
         self.control_handle_funcs = {
             StreamEventType.STREAM_NEXT_FRAME: self.on_next_frame,
             StreamEventType.STREAM_INIT: self.on_init,
             StreamEventType.STREAM_SEEK: self.on_seek,
+            StreamEventType.STREAM_LOAD: self.on_load,
+            StreamEventType.STREAM_APPEND: self.on_append,
+            StreamEventType.STREAM_STATUS_ACQ: self.on_status_acq,
             # MessageT.MSG_STREAM_PULSE: self.on_pulse,
             StreamEventType.STREAM_CLOSE: self.on_close
         }
@@ -59,22 +79,55 @@ class StreamHandler(object):
     def on_seek(self, what:Optional[Dict]=None) -> None:
         self.stream_data.setpos(what['pos'])
 
+    def on_load(self, what:Optional[Dict]=None) -> Optional[StreamEvent]:
+        # NOTE: start a new session on a running handler, the driver stays opened
+        self.swap_stream_data(what['data'])
+        return self.on_init()
+
+    def on_append(self, what:Optional[Dict]=None) -> None:
+        # NOTE: the playing stream continues into the next track, no new session
+        if not hasattr(self.stream_data, 'append'):
+            print(f'{type(self.stream_data).__name__} cannot append a track')
+            return
+        self.stream_data.append(what['data'], what.get('start', None))
+
+    def swap_stream_data(self, stream_data:StreamDataI) -> None:
+        if self.stream_data is not None:
+            try:
+                self.stream_data.close()
+            except:
+                pass # NOTE: the previous session may never be initialized
+        self.stream_data = stream_data
+
     def on_next_frame(self, what:Optional[Dict]=None) -> None:
         if not self.is_activate():
             return
 
+        timer = self.stage_timer
+        if timer is not None: timer.begin()
         if what is not None and 'frame' in what:
             frame = what.get('frame', None)
         else:
-            frame = self.stream_data.readframe()
+            frame = self.read_frame()
         if frame is None or len(frame) == 0:
             raise StreamEndException('no more frames')
+        if timer is not None: timer.lap(STAGE_READ)
+        if self.frame_tap is not None:
+            self.frame_tap(frame)
+            if timer is not None: timer.lap(STAGE_BROADCAST)
         self.stream_driver.on_next_frame({'frame': frame})
+        if timer is not None:
+            timer.lap(STAGE_WRITE)
+            timer.commit()
     
+    def read_frame(self):
+        return self.stream_data.readframe()
+
     def on_close(self, what:Optional[Dict]=None) -> None:
         self.stream_state = StreamState.STREAM_INACTIVE
         self.stream_driver.on_close(what)
-        self.stream_data.close()
+        if self.stream_data is not None:
+            self.stream_data.close()
     
     def on_status_acq(self, what:Optional[Dict]=None) -> StreamEvent:
         return self.stream_driver.on_status_acq(what)
@@ -88,6 +141,10 @@ class StreamHandler(object):
     
     def tell(self) -> int:
         return self.stream_data.tell()
+
+    def set_frame_tap(self, frame_tap:Optional[Callable]) -> None:
+        # NOTE: frames are published before the (blocking) driver write
+        self.frame_tap = frame_tap
     
     def num_frame(self) -> int:
         return self.stream_data.getnframes()
@@ -104,6 +161,9 @@ class AudioStreamHandler(StreamHandler):
 
         self.enable_bar = True
         self.bar = None
+        # NOTE: streams with `readinto` fill this buffer, no allocation per frame
+        self.frame_buf:Optional[bytearray] = None
+        self.frame_view:Optional[memoryview] = None
 
     def disable_bar(self) -> None:
         self.enable_bar = False
@@ -117,7 +177,15 @@ class AudioStreamHandler(StreamHandler):
         what.setdefault('rate', self.stream_data.getframerate())
 
         self.stream_driver.on_init(what)
+        if hasattr(self.stream_data, 'readinto'):
+            num_bytes = self.stream_data.len_frame * self.stream_data.getsampwidth() * self.stream_data.getnchannels()
+            if self.frame_buf is None or len(self.frame_buf) != num_bytes:
+                self.frame_buf = bytearray(num_bytes)
+                self.frame_view = memoryview(self.frame_buf)
+        else:
+            self.frame_buf, self.frame_view = None, None
         num_frame = self.stream_data.getnframes()
+        if self.bar is not None: self.bar.close()
         if self.enable_bar:
             self.bar = tqdm(desc='[audio]', unit=' frame', total=num_frame)
 
@@ -125,6 +193,13 @@ class AudioStreamHandler(StreamHandler):
 
         return StreamEvent(StreamEventType.STREAM_STATUS_ACK, what={'num_frame': num_frame})
 
+    def read_frame(self):
+        if self.frame_view is None:
+            return self.stream_data.readframe()
+        # NOTE: the driver write is blocking, the buffer is free again for the next frame
+        n = self.stream_data.readinto(self.frame_view)
+        return self.frame_view if n == len(self.frame_buf) else self.frame_view[:n]
+
     def on_start(self, what:Optional[Dict]=None) -> None:
         self.stream_state = StreamState.STREAM_ACTIVE
 
@@ -136,39 +211,97 @@ class AudioStreamHandler(StreamHandler):
         self.stream_state = StreamState.STREAM_ACTIVE
         self.stream_driver.on_resume(what)
     
-    def on_seek(self, what: Optional[Dict] = None) -> None:
-        if self.bar is not None:
-            self.bar.n = what['pos']
-            self.bar.last_print_n = what['pos']
-            self.bar.refresh()
-        return super().on_seek(what)
-
-    def on_next_frame(self, what: Optional[Dict] = None) -> None:
-        try:
-            super(AudioStreamHandler, self).on_next_frame(what)
-        except StreamEndException as e:
-            raise e
-        else:
-            if self.bar is not None: self.bar.update()
+    def on_status_acq(self, what:Optional[Dict]=None) -> StreamEvent:
+        ack = super(AudioStreamHandler, self).on_status_acq(what)
+        if ack is not None and hasattr(self.stream_data, 'input_stats'):
+            # NOTE: live inputs report dropped and lost frames
+            ack = StreamEvent(ack.head, dict(ack.what, **self.stream_data.input_stats()))
+        return ack
+
+    def update_bar(self, pos:int) -> None:
+        # NOTE: called by a sampler thread at display rate
+        bar = self.bar
+        if bar is not None:
+            bar.n = pos
+            bar.last_print_n = pos
+            bar.refresh()
    
     def on_close(self, what: Optional[Dict] = None) -> None:
         if self.bar is not None: self.bar.close()
         return super().on_close(what)
 
 class LiveStreamHandler(StreamHandler):
-    def __init__(self, live_data_stream:StreamDataI, stream_driver:StreamDriverBase) -> None:
+    '''
+    Vibration from audio frames as they are played or captured.
+    audio_tap: read frames from the audio process tap instead of the event
+    max_lag: tap frames kept when the handler falls behind, older ones are dropped
+    '''
+    def __init__(self, live_data_stream:StreamDataI, stream_driver:StreamDriverBase,
+        audio_tap:Optional[SharedRingBuffer]=None, max_lag:int=1) -> None:
         super(LiveStreamHandler, self).__init__(live_data_stream, stream_driver)
+        self.audio_tap = audio_tap
+        self.tap_reader:Optional[RingReader] = None
+        self.max_lag = max_lag
+        self.num_skipped = 0
+        self.latency_probe:Optional[LatencyProbe] = None
+
+    def set_audio_tap(self, audio_tap:SharedRingBuffer) -> None:
+        self.audio_tap = audio_tap
+        self.tap_reader = None
+
+    def enable_latency_probe(self, capacity:int=100000) -> LatencyProbe:
+        '''latency from the tap stamp (capture time of live inputs) to the driver write of every frame'''
+        self.latency_probe = LatencyProbe(capacity)
+        return self.latency_probe
+
+    def on_init(self, what:Optional[Dict]=None) -> None:
+        super(LiveStreamHandler, self).on_init(what)
+        if self.audio_tap is not None:
+            # NOTE: reader is created in the vibration process, read index is local
+            self.tap_reader = self.audio_tap.reader()
+
+    def on_seek(self, what:Optional[Dict]=None) -> None:
+        if self.tap_reader is not None:
+            self.tap_reader.seek_latest()
+        super(LiveStreamHandler, self).on_seek(what)
+
+    def read_tap(self):
+        reader = self.tap_reader
+        # NOTE: live output favours latency, a backlog is dropped instead of played late
+        self.num_skipped += reader.skip_to(self.max_lag)
+        return reader.read()
     
     def on_next_frame(self, what:Optional[Dict]=None) -> None:
         if not self.is_activate():
             return
         
-        frame = what.get('frame', None)
-        if frame is None:
-            raise StreamEndException('no more frames')
+        timer = self.stage_timer
+        if timer is not None: timer.begin()
+        if self.tap_reader is not None:
+            frame = self.read_tap()
+            if frame is None:
+                return # NOTE: audio frame not published yet
         else:
-            frame = self.stream_data.readframe(frame)
+            frame = what.get('frame', None)
+            if frame is None:
+                raise StreamEndException('no more frames')
+        frame = self.stream_data.readframe(frame)
         
         if frame is not None:
-            self.stream_driver.on_next_frame(frame)
+            if timer is not None: timer.lap(STAGE_READ)
+            self.stream_driver.on_next_frame({'frame': frame})
+            if timer is not None:
+                timer.lap(STAGE_WRITE)
+                timer.commit()
+            if self.latency_probe is not None and self.tap_reader is not None:
+                self.latency_probe.record(self.tap_reader.stamp)
+
+    def on_status_acq(self, what:Optional[Dict]=None) -> StreamEvent:
+        ack = super(LiveStreamHandler, self).on_status_acq(what)
+        if ack is not None and self.tap_reader is not None:
+            ack = StreamEvent(ack.head, dict(ack.what, tap_overruns=self.tap_reader.overruns, tap_skipped=self.num_skipped))
+        if ack is not None and hasattr(self.stream_data, 'mapping_stats'):
+            # NOTE: live mappings report their processing time, e.g. deadline misses
+            ack = StreamEvent(ack.head, dict(ack.what, mapping=self.stream_data.mapping_stats()))
+        return ack
     
\ No newline at end of file
@@ -1,8 +1,13 @@
 import wave
 import numpy as np
+from typing import Dict, Optional
 
 from .core import StreamDataI, AudioStreamI
 from .core import AudioFeatureBundle
+from .uartcommands import CMD_SIZE, compile_commands, load_commands, save_commands
+from .framecodec import RLEFrame, rle_encode_track
+from .resample import RateConverter
+from .pcmcache import cache_pcm, cache_path
 
 class WaveAudioStream(AudioStreamI):
     def __init__(self, wavefile:str, len_frame:int) -> None:
@@ -46,6 +51,70 @@ class WaveAudioStream(AudioStreamI):
     def getframerate(self) -> int:
         return self.chunks.getframerate()
 
+class PCMAudioStream(AudioStreamI):
+    '''
+    Audio decoded once into a raw PCM cache (`pcmcache.py`, any format librosa reads),
+    frames are zero-copy memoryview slices of the memory-mapped cache.
+    '''
+    def __init__(self, audiofile:str, len_frame:int, cache_dir:Optional[str]=None) -> None:
+        super(PCMAudioStream, self).__init__()
+        self.audiofile = audiofile
+        self.len_frame = len_frame
+        self.cache_dir = cache_dir
+        # NOTE: decoded in the creating process, the playing process only maps the cache
+        self.header = cache_pcm(audiofile, cache_dir)
+        self.frame_bytes = self.header['sampwidth'] * self.header['channels'] * len_frame
+        self.num_frame = (self.header['num_sample']+len_frame-1) // len_frame
+        self.pcm = None
+        self.view = None
+        self.pos = 0
+
+    def init_stream(self) -> None:
+        if self.view is None:
+            num_bytes = self.header['num_sample'] * self.header['sampwidth'] * self.header['channels']
+            if num_bytes > 0:
+                self.pcm = np.memmap(cache_path(self.audiofile, self.cache_dir), dtype=np.uint8, mode='r', shape=(num_bytes,))
+                self.view = memoryview(self.pcm)
+            else:
+                self.view = memoryview(b'') # NOTE: mmap of an empty file fails
+        self.rewind()
+
+    def getnframes(self) -> int:
+        return self.num_frame
+
+    def readframe(self, n:int=1) -> memoryview:
+        start = self.pos * self.frame_bytes
+        self.pos = min(self.num_frame, self.pos+n)
+        return self.view[start:start+n*self.frame_bytes]
+
+    def readinto(self, buf) -> int:
+        '''copy the next frame into a preallocated buffer, returns the number of bytes'''
+        frame = self.readframe()
+        n = len(frame)
+        memoryview(buf)[:n] = frame
+        return n
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = min(self.num_frame, max(pos, 0))
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def close(self) -> None:
+        self.pcm, self.view = None, None # NOTE: unmapped once the last frame slice is gone
+
+    def getsampwidth(self) -> int:
+        return self.header['sampwidth']
+
+    def getnchannels(self) -> int:
+        return self.header['channels']
+
+    def getframerate(self) -> int:
+        return self.header['rate']
+
 class VibrationFormatError(Exception):
     pass
     
@@ -60,18 +129,40 @@ class VibrationStream(StreamDataI):
         self.len_frame = len_frame
         self.pos = 0
 
+        self.rle = False
+        self.runs = None
+
+    def enable_rle(self) -> None:
+        '''emit `RLEFrame`s, drivers only write where the signal changes'''
+        self.rle = True
+
     def init_stream(self) -> None:
+        if self.rle and self.runs is None:
+            # NOTE: encoded once for the whole track in the playing process
+            self.runs = rle_encode_track(self.chunks, self.len_frame)
         self.rewind()
 
     def getnframes(self) -> int:
         return (self.chunks.shape[0]+self.len_frame-1) // self.len_frame
 
-    def readframe(self, n:int=1) -> np.ndarray:
+    def readframe(self, n:int=1):
+        if self.rle:
+            return self.readframe_rle(n)
         frames = self.chunks[self.pos*self.len_frame:(self.pos+n)*self.len_frame]
         self.pos = min(self.getnframes(), self.pos+n)
 
         return frames
 
+    def readframe_rle(self, n:int=1) -> RLEFrame:
+        if self.runs is None:
+            self.runs = rle_encode_track(self.chunks, self.len_frame)
+        values, lengths, frame_runs = self.runs
+        end = min(self.getnframes(), self.pos+n)
+        a, b = frame_runs[self.pos], frame_runs[end]
+        self.pos = end
+
+        return RLEFrame(values[a:b], lengths[a:b])
+
     def rewind(self) -> None:
         self.pos = 0
 
@@ -102,6 +193,155 @@ class VibrationStream(StreamDataI):
         else:
             raise VibrationFormatError(f'vibration mode {mode} not defined.')
 
+class UARTCommandStream(StreamDataI):
+    '''
+    Whole-track UART commands compiled ahead of time, a frame is a zero-copy
+    slice the driver writes as is.
+    '''
+    command_mode_func = {}
+    def __init__(self, cmds:bytes) -> None:
+        super(UARTCommandStream, self).__init__()
+        self.cmds = cmds
+        self.view = None # NOTE: memoryview cannot be pickled, created in the playing process
+        self.pos = 0
+
+    def init_stream(self) -> None:
+        self.view = memoryview(self.cmds)
+        self.rewind()
+
+    def getnframes(self) -> int:
+        return len(self.cmds) // CMD_SIZE
+
+    def readframe(self, n:int=1) -> memoryview:
+        if self.view is None:
+            self.view = memoryview(self.cmds)
+        frames = self.view[self.pos*CMD_SIZE:(self.pos+n)*CMD_SIZE]
+        self.pos = min(self.getnframes(), self.pos+n)
+
+        return frames
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = min(self.getnframes(), pos)
+
+    def close(self) -> None:
+        pass
+
+    @classmethod
+    def command_mode(cls, over_ride=False):
+        '''register a function mapping a feature bundle to a parameter track (`uartcommands.PARAM_DTYPE`)'''
+        def register_command_mode(mode_func):
+            if mode_func.__name__ in cls.command_mode_func and not over_ride:
+                raise KeyError(f"Duplicated command mode {mode_func.__name__}")
+            cls.command_mode_func.update({
+                mode_func.__name__: mode_func
+            })
+            return mode_func
+        return register_command_mode
+
+    @classmethod
+    def from_feature_bundle(cls, fb:AudioFeatureBundle, mode:str, cache_dir:Optional[str]=None):
+        '''compile the commands of `mode`, or load them from `cache_dir` (usually the bundle folder)'''
+        if cache_dir is not None:
+            cmds = load_commands(cache_dir, mode)
+            if cmds is not None:
+                return cls(cmds)
+
+        if mode not in UARTCommandStream.command_mode_func:
+            raise VibrationFormatError(f'command mode {mode} not defined.')
+        cmds = compile_commands(UARTCommandStream.command_mode_func[mode](fb))
+        if cache_dir is not None:
+            save_commands(cache_dir, mode, cmds)
+        return cls(cmds)
+
+class MultiRateVibrationStream(StreamDataI):
+    '''
+    Vibration rendered at its own control rate and converted to the device rate
+    on the fly (hold, linear or polyphase), one frame per audio frame; a frame is
+    the interleaved device samples `(n, num_channel)` of one audio frame.
+    '''
+    NUM_BUFFER = 8
+    def __init__(self, control:np.ndarray, control_rate:float, frame_rate:float,
+        device_rate:float, method:str='linear') -> None:
+        super(MultiRateVibrationStream, self).__init__()
+        self.control = control
+        self.control_rate = control_rate
+        self.frame_rate = frame_rate
+        self.device_rate = device_rate
+        self.method = method
+        self.converter = None # NOTE: scratch buffers are allocated in the playing process
+        self.buffers = None
+        self.num_read = 0
+        self.pos = 0
+
+    def init_stream(self) -> None:
+        self._alloc()
+        self.rewind()
+
+    def _alloc(self) -> None:
+        max_block = int(np.ceil(self.device_rate / self.frame_rate)) + 1
+        self.converter = RateConverter(self.control, self.control_rate, self.device_rate, self.method, max_block)
+        # NOTE: pipelined drivers (paced, fan-out) may still hold the last few frames
+        self.buffers = [np.empty(max_block*self.control.shape[1], dtype=np.uint8) for _ in range(self.NUM_BUFFER)]
+
+    def getnframes(self) -> int:
+        return int(np.ceil(self.control.shape[0] / self.control_rate * self.frame_rate))
+
+    def _bound(self, pos:int) -> int:
+        '''first device sample of frame `pos`'''
+        return int(round(pos * self.device_rate / self.frame_rate))
+
+    def readframe(self, n:int=1) -> np.ndarray:
+        if self.converter is None:
+            self._alloc()
+        end = min(self.getnframes(), self.pos+n)
+        start, stop = self._bound(self.pos), self._bound(end)
+        self.pos = end
+
+        samples = self.converter.render(start, stop-start)
+        size = samples.size
+        buf = self.buffers[self.num_read % self.NUM_BUFFER]
+        if buf.shape[0] < size:
+            buf = self.buffers[self.num_read % self.NUM_BUFFER] = np.empty(size, dtype=np.uint8)
+        self.num_read += 1
+        frame = buf[:size]
+        np.clip(samples.reshape(-1), 0, 255, out=samples.reshape(-1))
+        np.rint(samples.reshape(-1), out=frame, casting='unsafe')
+        return frame
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def tell(self) -> int:
+        return self.pos
+
+    def setpos(self, pos:int) -> None:
+        self.pos = min(self.getnframes(), pos)
+
+    def close(self) -> None:
+        pass
+
+    @classmethod
+    def from_feature_bundle(cls, fb:AudioFeatureBundle, mode:str, device_rate:float,
+        method:str='linear', num_channel:int=8):
+        '''
+        render a vibration mode once as the control track, samples of one feature
+        frame are spread evenly over it (e.g. `rmse_mode`, 3 steps of 8 channels)
+        '''
+        if mode not in VibrationStream.vibration_mode_func:
+            raise VibrationFormatError(f'vibration mode {mode} not defined.')
+        chunks = np.asarray(VibrationStream.vibration_mode_func[mode](fb)).ravel()
+        frame_rate = fb.sample_rate() / fb.frame_len()
+        num_frame = (fb.sample_len() + fb.frame_len() - 1) // fb.frame_len()
+        control = chunks.reshape((-1, num_channel))
+        steps = max(1, int(round(control.shape[0] / num_frame)))
+        return cls(control, frame_rate * steps, frame_rate, device_rate, method)
+
 class LiveVibrationStream(StreamDataI):
     live_vibration_mode_func = {}
     def __init__(self) -> None:
@@ -126,3 +366,44 @@ class LiveVibrationStream(StreamDataI):
     
     def clear_buffer(self) -> None:
         return None
+
+    @classmethod
+    def live_vibration_mode(cls, over_ride=False):
+        '''register `mode(len_frame, **configs)`, it returns the mapping of a PCM frame to a vibration frame'''
+        def register_live_vibration_mode(mode_func):
+            if mode_func.__name__ in cls.live_vibration_mode_func and not over_ride:
+                raise KeyError(f"Duplicated live vibration mode {mode_func.__name__}")
+            cls.live_vibration_mode_func.update({
+                mode_func.__name__: mode_func
+            })
+            return mode_func
+        return register_live_vibration_mode
+
+    @classmethod
+    def from_live_mode(cls, mode:str, len_frame:int, configs:Optional[Dict]=None):
+        if mode in LiveVibrationStream.live_vibration_mode_func:
+            return LiveModeVibrationStream(mode, len_frame, configs)
+        else:
+            raise VibrationFormatError(f'live vibration mode {mode} not defined.')
+
+class LiveModeVibrationStream(LiveVibrationStream):
+    '''
+    A registered live vibration mode applied to every audio frame, only the mode
+    name is kept until `init_stream` so the stream can be sent to a process.
+    '''
+    def __init__(self, mode:str, len_frame:int, configs:Optional[Dict]=None) -> None:
+        super(LiveModeVibrationStream, self).__init__()
+        self.mode = mode
+        self.len_frame = len_frame
+        self.configs = {} if configs is None else configs
+        self.mapping = None
+
+    def init_stream(self) -> None:
+        self.clear_buffer()
+
+    def readframe(self, frame:np.ndarray) -> np.ndarray:
+        return self.mapping(frame)
+
+    def clear_buffer(self) -> None:
+        # NOTE: a new mapping drops the state of the last session, e.g. the level tracking
+        self.mapping = LiveVibrationStream.live_vibration_mode_func[self.mode](self.len_frame, **self.configs)
@@ -0,0 +1,32 @@
+import time
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from .ringbuffer import SharedRingBuffer
+
+class TelemetryRing(SharedRingBuffer):
+    '''
+    Driver telemetry records in a shared ring, one producer per driver.
+
+    Any process holding the ring (audio process, GUI) reads the latest
+    snapshot without messaging or waiting for the driver's frame loop.
+    '''
+    FIELDS = ('time', 'last_write', 'writes', 'errors', 'CH0', 'CH1', 'CH2', 'CH3')
+
+    def __init__(self, num_slot:int=64) -> None:
+        super(TelemetryRing, self).__init__(8*len(self.FIELDS), num_slot)
+        self.record = np.zeros((len(self.FIELDS),), dtype=np.float64)
+
+    def publish(self, last_write:float=0., writes:int=0, errors:int=0,
+        currents:Optional[Sequence[float]]=None) -> None:
+        record = self.record
+        record[0], record[1], record[2], record[3] = time.time(), last_write, writes, errors
+        if currents is not None:
+            record[4:4+len(currents)] = currents
+        self.write(record)
+
+    def snapshot(self) -> Optional[Dict]:
+        record = self.latest(np.float64)
+        if record is None:
+            return None
+        return dict(zip(self.FIELDS, record.tolist()))
@@ -0,0 +1,118 @@
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+from .core import StreamEvent
+from .streamhandler import AudioStreamEvent, AudioStreamEventType
+
+TRACE_IN = 'in' # control event received by the audio process
+TRACE_OUT = 'out' # ack sent back by the audio process
+TRACE_END = 'end' # end of the audio stream
+
+def _plain_what(what:Dict) -> Dict:
+    # NOTE: stream data (new sessions) are not serializable, keep their type only
+    plain = {}
+    for k, v in what.items():
+        if isinstance(v, (int, float, str, bool)) or v is None:
+            plain[k] = v
+        elif isinstance(v, dict):
+            plain[k] = _plain_what(v)
+        elif isinstance(v, (list, tuple)):
+            plain[k] = [type(x).__name__ for x in v]
+        else:
+            plain[k] = type(v).__name__
+    return plain
+
+class TraceRecorder(object):
+    '''
+    Record stream events with a monotonic timestamp, kept in memory while
+    playing and written as json lines when the stream is idle or closed.
+    '''
+    def __init__(self, path:str) -> None:
+        super(TraceRecorder, self).__init__()
+        self.path = path
+        self.records:List[Dict] = []
+        self.start_time:Optional[float] = None
+
+        # NOTE: truncate the trace of the last run
+        with open(self.path, 'w'):
+            pass
+
+    def record(self, direction:str, event:StreamEvent, pos:int=0) -> None:
+        now = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = now
+        self.records.append({
+            't': now - self.start_time, 'dir': direction, 'pos': pos,
+            'head': event.head.name, 'what': _plain_what(event.what)})
+
+    def record_acks(self, acks:List[StreamEvent], pos:int=0) -> None:
+        for ack in acks:
+            self.record(TRACE_OUT, ack, pos)
+
+    def flush(self) -> None:
+        if len(self.records) == 0:
+            return
+        with open(self.path, 'a') as f:
+            for r in self.records:
+                f.write(json.dumps(r) + '\n')
+        self.records = []
+
+def load_trace(path:str) -> List[Dict]:
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def replay_trace(trace:List[Dict], service, speed:Optional[float]=1.0,
+    loader:Optional[Callable[[Dict], int]]=None) -> Dict:
+    '''
+    Feed the recorded control events into a headless `PlayerService`.
+
+    trace: records from `load_trace`, only events received by the audio process are replayed
+    service: a started (or startable) `PlayerService`
+    speed: 1.0 keeps the original timing, 2.0 is twice as fast, None or 0 as fast as possible
+    loader: called with the record of a STREAM_LOAD, loads a session and returns num_frame;
+        without it the loads are skipped (counted in `skipped_loads`), the service keeps its current session
+    returns replay statistics in ms
+    '''
+    events = [r for r in trace if r['dir'] == TRACE_IN]
+    lags, status_rtts = [], []
+    skipped_loads = 0
+
+    start = time.perf_counter()
+    for r in events:
+        if speed:
+            target = start + r['t'] / speed
+            remain = target - time.perf_counter()
+            if remain > 0:
+                time.sleep(remain)
+            lags.append(max(0., time.perf_counter() - target))
+
+        head = AudioStreamEventType[r['head']]
+        if head == AudioStreamEventType.STREAM_CLOSE:
+            # NOTE: the service is owned by the caller, end the session only
+            service.stop()
+            break
+        elif head == AudioStreamEventType.STREAM_LOAD:
+            if loader is None:
+                # NOTE: a service from drivers only has no session to re-initialize
+                skipped_loads += 1
+                continue
+            loader(r)
+        elif head == AudioStreamEventType.STREAM_INIT:
+            service.init_session()
+        elif head == AudioStreamEventType.STREAM_APPEND:
+            continue # NOTE: playlist tracks are not in the trace
+        elif head == AudioStreamEventType.STREAM_STATUS_ACQ:
+            t = time.perf_counter()
+            service.status()
+            status_rtts.append(time.perf_counter() - t)
+        else:
+            service.commands.put(AudioStreamEvent(head=head, what=dict(r['what'])))
+    duration = time.perf_counter() - start
+
+    report = {'num_event': len(events), 'duration': duration * 1000., 'skipped_loads': skipped_loads}
+    if len(lags) > 0:
+        report['max_lag'] = max(lags) * 1000.
+    if len(status_rtts) > 0:
+        report['status_rtt'] = sum(status_rtts) / len(status_rtts) * 1000.
+    return report
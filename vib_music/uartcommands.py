@@ -0,0 +1,62 @@
+import os
+import numpy as np
+from typing import Optional
+
+# NOTE: vibration parameters of one frame, channels is the encoded channel byte
+PARAM_DTYPE = np.dtype([('channels', 'u1'), ('voltage', 'u1'), ('duty', 'u1'), ('freq', 'u2')])
+
+# NOTE: binary `BC 01 <channels> <voltage> <duty> <freq> AF AA FF DF` command of `UARTDriver`
+CMD_DTYPE = np.dtype([
+    ('head', 'u1'), ('enable', 'u1'), ('channels', 'u1'), ('voltage', 'u1'),
+    ('duty', 'u1'), ('freq', '>u2'), ('tail', 'u1', (4,))])
+CMD_SIZE = CMD_DTYPE.itemsize
+CMD_TAIL = (0xAF, 0xAA, 0xFF, 0xDF)
+
+CHANNEL_MAP = {'Z': 0b01, '0': 0b00, '1': 0b10}
+
+def encode_channels(CH:str) -> int:
+    '''channel byte of a `CH0 CH1 CH2 CH3` string, e.g. "1 0 Z Z"'''
+    channel_control = 0
+    for c in reversed(CH.split(' ')):
+        channel_control = (channel_control << 2) | CHANNEL_MAP[c]
+    return channel_control
+
+def make_params(num_frame:int, CH:str='1 0 Z Z', voltage=180, duty=50, freq=1000) -> np.ndarray:
+    '''parameter track, each field is a scalar or an array of `num_frame` values'''
+    params = np.zeros(num_frame, dtype=PARAM_DTYPE)
+    params['channels'] = encode_channels(CH)
+    params['voltage'] = np.clip(voltage, 0, 255)
+    params['duty'] = np.clip(duty, 0, 100)
+    params['freq'] = np.clip(freq, 0, 0xFFFF)
+    return params
+
+def compile_commands(params:np.ndarray) -> bytes:
+    '''compile a whole parameter track into contiguous commands, `CMD_SIZE` bytes per frame'''
+    cmds = np.zeros(params.shape[0], dtype=CMD_DTYPE)
+    cmds['head'] = 0xBC
+    cmds['enable'] = 0x01
+    cmds['channels'] = params['channels']
+    cmds['voltage'] = params['voltage']
+    cmds['duty'] = params['duty'].astype(np.uint16) * 2 + 1
+    cmds['freq'] = params['freq']
+    cmds['tail'] = CMD_TAIL
+    return cmds.tobytes()
+
+def cache_path(folder:str, mode:str) -> str:
+    return os.path.join(folder, f'{mode}.uart')
+
+def load_commands(folder:str, mode:str) -> Optional[bytes]:
+    path = cache_path(folder, mode)
+    if not os.path.exists(path):
+        return None
+    meta = os.path.join(folder, 'meta.pkl')
+    if os.path.exists(meta) and os.path.getmtime(meta) > os.path.getmtime(path):
+        return None # NOTE: bundle rebuilt after the commands were compiled
+    with open(path, 'rb') as f:
+        return f.read()
+
+def save_commands(folder:str, mode:str, cmds:bytes) -> None:
+    # NOTE: next to the bundle pickles, `AudioFeatureBundle.from_folder` ignores it
+    os.makedirs(folder, exist_ok=True)
+    with open(cache_path(folder, mode), 'wb') as f:
+        f.write(cmds)
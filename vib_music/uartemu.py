@@ -0,0 +1,127 @@
+import os
+import tty
+import time
+import select
+import argparse
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+from .simdrivers import WriteRecorder, board_feedback
+
+# NOTE: BC 01 <channels> <voltage> <duty> <freq 2 bytes> + 4 (driver) or 6 (control.py) tail bytes
+CMD_HEAD = b'\xbc\x01'
+CMD_TAIL = 0xDF
+CMD_LENS = (11, 13)
+
+def parse_commands(buf:bytearray) -> List[bytes]:
+    '''pop complete commands from `buf`, garbage before a command head is dropped'''
+    cmds = []
+    while True:
+        start = buf.find(CMD_HEAD)
+        if start < 0:
+            del buf[:max(len(buf)-1, 0)] # NOTE: keep a trailing 0xBC, head may be split
+            return cmds
+        del buf[:start]
+
+        for n in CMD_LENS:
+            if len(buf) >= n and buf[n-1] == CMD_TAIL:
+                cmds.append(bytes(buf[:n]))
+                del buf[:n]
+                break
+        else:
+            if len(buf) < CMD_LENS[-1]:
+                return cmds # NOTE: wait for the rest of the command
+            del buf[:1] # NOTE: not a command, resync on the next head
+
+def decode_command(cmd:bytes) -> Dict:
+    channels = ''
+    for i in range(4):
+        channels += {0b01: 'Z', 0b00: '0', 0b10: '1'}.get((cmd[2] >> (2*i)) & 0b11, '?')
+    return {'CH': ' '.join(channels), 'voltage': cmd[3],
+        'duty': (cmd[4]-1)//2, 'freq': (cmd[5] << 8) | cmd[6]}
+
+class UARTBoardEmulator(threading.Thread):
+    '''
+    Vibration board behind a pseudo-terminal: parse `BC01...DF` commands written
+    to `port` through pyserial and answer each with a 7-byte current feedback.
+    '''
+    def __init__(self, response_delay:float=0.002, verbose:bool=False, capacity:int=1000000) -> None:
+        super(UARTBoardEmulator, self).__init__(daemon=True)
+        self.response_delay = response_delay
+        self.verbose = verbose
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave) # NOTE: pass it to UARTDriver(port=...)
+
+        self.commands = WriteRecorder(capacity) # timestamp and length of every command
+        self.num_bad = 0 # bytes dropped while resyncing
+        self.last_cmd:Optional[bytes] = None
+        self.end_event = threading.Event()
+
+    def run(self) -> None:
+        buf = bytearray()
+        while not self.end_event.is_set():
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if len(ready) == 0:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break # NOTE: pty closed
+            buf += data
+
+            before = len(buf)
+            cmds = parse_commands(buf)
+            self.num_bad += max(before - len(buf) - sum(len(c) for c in cmds), 0)
+            for cmd in cmds:
+                self.commands.record(len(cmd))
+                self.last_cmd = cmd
+                if self.verbose:
+                    print(cmd.hex().upper(), decode_command(cmd))
+                if self.response_delay > 0:
+                    time.sleep(self.response_delay)
+                os.write(self.master, board_feedback(cmd))
+
+    def stats(self) -> Dict:
+        '''command rate (per second) and inter-command gaps (ms)'''
+        stamps = self.commands.timestamps()
+        report = {'num_cmd': stamps.shape[0], 'num_bad': self.num_bad}
+        if stamps.shape[0] < 2:
+            return report
+        gaps = np.diff(stamps) * 1000.
+        report.update({
+            'rate': float((stamps.shape[0]-1) / (stamps[-1]-stamps[0])),
+            'gap_mean': float(gaps.mean()),
+            'gap_p50': float(np.percentile(gaps, 50)),
+            'gap_p99': float(np.percentile(gaps, 99)),
+            'gap_max': float(gaps.max()),
+        })
+        return report
+
+    def stop(self) -> None:
+        self.end_event.set()
+        if self.is_alive():
+            self.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+def main() -> None:
+    p = argparse.ArgumentParser(prog='python -m vib_music.uartemu', description='virtual UART vibration board')
+    p.add_argument('--delay', type=float, default=0.002, help='response delay in seconds')
+    p.add_argument('--verbose', action='store_true', help='print every command')
+    opt = p.parse_args()
+
+    emu = UARTBoardEmulator(opt.delay, opt.verbose)
+    emu.start()
+    print(f'vibration board at {emu.port}, use Ctrl+C to exit')
+    try:
+        while True:
+            time.sleep(1.)
+            print(emu.stats())
+    except KeyboardInterrupt:
+        emu.stop()
+
+if __name__ == '__main__':
+    main()
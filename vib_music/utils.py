@@ -23,9 +23,8 @@ from .streams import VibrationStream
 from .processes import VibrationProcess
 from .drivers import PCF8591Driver
 
-def get_vib_process(features:str, len_frame:int, mode:str):
+def _bundle_vib_process(fb:AudioFeatureBundle, len_frame:int, mode:str):
     try:
-        fb = AudioFeatureBundle.from_folder(features)
         vibStream = VibrationStream.from_feature_bundle(fb, len_frame, mode)
         vibHandler = StreamHandler(vibStream, PCF8591Driver())
     except:
@@ -34,6 +33,31 @@ def get_vib_process(features:str, len_frame:int, mode:str):
     else:
         return VibrationProcess(vibHandler)
 
+def _load_bundle(features:str) -> Optional[AudioFeatureBundle]:
+    try:
+        return AudioFeatureBundle.from_folder(features)
+    except:
+        print('cannot create vibration handler')
+        return None
+
+def get_vib_process(features:str, len_frame:int, mode:str):
+    fb = _load_bundle(features)
+    if fb is None:
+        return None
+    return _bundle_vib_process(fb, len_frame, mode)
+
+def get_standalone_vib_process(features:str, len_frame:int, mode:str):
+    # NOTE: no audio attached, the process paces itself at the feature frame rate
+    fb = _load_bundle(features)
+    if fb is None:
+        return None
+    vib_proc = _bundle_vib_process(fb, len_frame, mode)
+    if vib_proc is None:
+        return None
+
+    vib_proc.enable_self_clock(len_hop=fb.frame_len(), sr=fb.sample_rate())
+    return vib_proc
+
 from multiprocessing import Queue
 
 def launch_vibration(audio:str, len_audio_frame:int,
@@ -1,7 +1,9 @@
 import numpy as np
+from typing import Callable
 
 from .core import AudioFeatureBundle
-from .streams import VibrationStream
+from .streams import VibrationStream, UARTCommandStream, LiveVibrationStream
+from .uartcommands import make_params, encode_channels
 
 @VibrationStream.vibration_mode(over_ride=False)
 def rmse_mode(fb:AudioFeatureBundle) -> np.ndarray:
@@ -20,4 +22,38 @@ def rmse_mode(fb:AudioFeatureBundle) -> np.ndarray:
 
     print(f'vibration shape {vibrations.shape}')
 
-    return vibrations
\ No newline at end of file
+    return vibrations
+
+@LiveVibrationStream.live_vibration_mode(over_ride=False)
+def live_rmse_mode(len_frame:int, decay:float=0.999, floor:float=1e-3) -> Callable[[np.ndarray], np.ndarray]:
+    # NOTE: rmse_mode normalizes by the whole track, live audio by a decaying peak
+    bins = np.linspace(0., 1., 150, endpoint=True)
+    pattern = np.resize(np.array([1]*4 + [0]*4, dtype=np.uint8), len_frame)
+    state = {'peak': floor}
+
+    def mapping(pcm:np.ndarray) -> np.ndarray:
+        x = pcm.astype(np.float32)
+        if pcm.dtype == np.uint8:
+            x = (x - 128.) / 128.
+        elif np.issubdtype(pcm.dtype, np.integer):
+            x /= np.iinfo(pcm.dtype).max
+        rmse = float(np.sqrt(np.mean(x*x))) if x.shape[0] > 0 else 0.
+        state['peak'] = max(rmse, state['peak'] * decay, floor)
+        voltage = np.digitize((rmse / state['peak']) ** 2, bins)
+        return pattern * np.uint8(voltage)
+
+    return mapping
+
+@UARTCommandStream.command_mode(over_ride=False)
+def rmse_uart_mode(fb:AudioFeatureBundle) -> np.ndarray:
+    rmse = fb.feature_data('rmse').ravel()
+
+    rmse = (rmse-rmse.min()) / (rmse.max()-rmse.min())
+    rmse = rmse ** 2
+
+    voltage = (rmse * 255).astype(np.uint8)
+    params = make_params(voltage.shape[0], voltage=voltage)
+    # NOTE: release all channels on silent frames
+    params['channels'][voltage < 8] = encode_channels('Z Z Z Z')
+
+    return params